@@ -82,6 +82,8 @@ class ActivePurchaseOrderModel(QAbstractTableModel):
         if new_po is not True and new_po is not False:
             raise ValueError("Parameter new_po was neither True nor False.")
         self.new_po = new_po
+        # True while the totals are being written to the purchase order model.
+        self._writing_totals = False
         self._po_model = PurchaseOrderModel(app_config, session, parent)
         self._po_model.connect(self._po_model, 
                                SIGNAL("dataChanged(QModelIndex,QModelIndex)"),
@@ -155,6 +157,8 @@ class ActivePurchaseOrderModel(QAbstractTableModel):
         :raises: IndexError if the active purchase order model row indicates a
             row outside the limits of the purchase order model.
         '''
+        # The purchase order model loads its rows a page at a time.
+        self._po_model.fetch_to_row(self._active_po_model_row)
         if self._active_po_model_row >= self._po_model.rowCount():
             raise IndexError(("The self._active_po_model_row parameter was "
                               "out of bounds. "
@@ -229,8 +233,22 @@ class ActivePurchaseOrderModel(QAbstractTableModel):
         
     def do_post_rollback_processing(self):
         '''Perform any processing required after a rollback.
+        
+        The rollback restores the saved values of the purchase order and its 
+        line items, so the totals are recalculated and the data is displayed 
+        again.
         '''
+        self.line_item_model.do_post_rollback_processing()
+        self._po_model.refresh_display()
+        self._calculate_totals()
         self.dirty = False
+        
+    def refresh_display(self):
+        '''Format the purchase order and its line items again, e.g., after the 
+        products, projects or suppliers have been edited.
+        '''
+        self._po_model.refresh_display()
+        self.line_item_model.refresh_display()
     
     def set_project(self, project_code):
         '''Set the project of the active purchase order. 
@@ -417,24 +435,32 @@ class ActivePurchaseOrderModel(QAbstractTableModel):
         The totals that are calculated are the total excluding tax, the total
         tax, and the total including tax.
         
+        The line item model keeps a running total of its line prices, so this
+        does not loop over the line items. Writing the totals to the purchase 
+        order model emits its dataChanged signal, which must not calculate the
+        totals again.
+        
         Emits the totals_calculated signal to allow the main form to update its
         widgets.
         '''
         # Total excluding tax
         self.total_price = self.line_item_model.calculate_total_excluding_tax()
-        index = self.createIndex(0,
-                                 PurchaseOrderModel.TOTAL_EXCLUDING_TAX_COLUMN)
-        self.setData(index, self.total_price, Qt.EditRole)
         # Total tax
-        self.total_tax = self.line_item_model.calculate_total_tax()
-        index = self.createIndex(0, 
-                                 PurchaseOrderModel.TOTAL_TAX_COLUMN)
-        self.setData(index, self.total_tax, Qt.EditRole)
+        self.total_tax = self.line_item_model.calculate_total_tax(
+                                                            self.total_price)
         # Total including tax
         self.total = self.total_price + self.total_tax
-        index = self.createIndex(0, 
-                                 PurchaseOrderModel.TOTAL_INCLUDING_TAX_COLUMN)
-        self.setData(index, self.total, Qt.EditRole)
+        self._writing_totals = True
+        try:
+            for column, value in (
+                    (PurchaseOrderModel.TOTAL_EXCLUDING_TAX_COLUMN, 
+                     self.total_price),
+                    (PurchaseOrderModel.TOTAL_TAX_COLUMN, self.total_tax),
+                    (PurchaseOrderModel.TOTAL_INCLUDING_TAX_COLUMN, 
+                     self.total)):
+                self.setData(self.createIndex(0, column), value, Qt.EditRole)
+        finally:
+            self._writing_totals = False
         self.emit(SIGNAL("totals_calculated()"))
 
     def _handle_change_in_po_data(self, top_left_index, 
@@ -442,14 +468,16 @@ class ActivePurchaseOrderModel(QAbstractTableModel):
         '''Slot for the dataChanged signal of the purchase order model.
         
         Sets the dirty indicator to True and re-calculates the total values 
-        of the active purchase order.
+        of the active purchase order, unless the change is the totals 
+        themselves being written.
         
         Args:
             Refer to QAbstractItemModel.dataChanged.
         '''
         logging.debug("_handle_change_in_po_data")
         self.dirty = True
-        self._calculate_totals()
+        if not self._writing_totals:
+            self._calculate_totals()
         self.emit(SIGNAL("dataChanged(QModelIndex,QModelIndex)"),
                   top_left_index, bottom_right_index)
             
@@ -17,11 +17,9 @@ this program. If not, see <http://www.gnu.org/licenses/>.
 Contact: paulosvnleal@gmail.com
 '''
 
+import logging
 import os
-from PyQt4.QtCore import *
-from PyQt4.QtGui import *
 from configparser import ConfigParser
-from messagebox import execute_critical_msg_box 
 
 
 class AppConfigStructureError(Exception):
@@ -48,6 +46,20 @@ def _verify_setting_is_not_blank(section_name, setting_name, setting_var):
     if setting_var.isspace():
         _raise_config_setting_error(section_name, setting_name, "blank")
 
+def _verify_setting_is_one_of(section_name, setting_name, setting_var, 
+                              valid_values):
+    if setting_var not in valid_values:
+        _raise_config_setting_error(section_name, setting_name, setting_var)
+        
+def _verify_setting_is_integer(section_name, setting_name, setting_var, 
+                               minimum=None):
+    try:
+        value = int(setting_var)
+    except ValueError:
+        _raise_config_setting_error(section_name, setting_name, setting_var)
+    if minimum is not None and value < minimum:
+        _raise_config_setting_error(section_name, setting_name, setting_var)
+
 def _raise_config_setting_error(section_name, setting_name, value):
     raise AppConfigError(("Invalid config setting: "
                            "{} {} was: {}.").format(section_name, 
@@ -99,6 +111,70 @@ class DatabaseSection(object):
         OPTION_NAMES_IN_FILE[PORT]: ""
         }
     
+    # The tuning options. Unlike the options above, these may be left out of 
+    # the file, so that config files written before they were added remain 
+    # valid. Missing tuning options take their default values, and are added 
+    # to the file when it is next written.
+    NUM_TUNING_OPTIONS = 11
+    (   SQLITE_JOURNAL_MODE,
+        SQLITE_SYNCHRONOUS,
+        SQLITE_CACHE_SIZE,
+        SQLITE_MMAP_SIZE,
+        SQLITE_TEMP_STORE,
+        SQLITE_BUSY_TIMEOUT,
+        MYSQL_POOL_SIZE,
+        MYSQL_MAX_OVERFLOW,
+        MYSQL_POOL_TIMEOUT,
+        MYSQL_POOL_RECYCLE,
+        MYSQL_POOL_PRE_PING
+        ) = range(NUM_OPTIONS, NUM_OPTIONS + NUM_TUNING_OPTIONS)
+    
+    TUNING_OPTION_NAMES_IN_FILE = {
+        SQLITE_JOURNAL_MODE: "sqlite_journal_mode",
+        SQLITE_SYNCHRONOUS: "sqlite_synchronous",
+        SQLITE_CACHE_SIZE: "sqlite_cache_size",
+        SQLITE_MMAP_SIZE: "sqlite_mmap_size",
+        SQLITE_TEMP_STORE: "sqlite_temp_store",
+        SQLITE_BUSY_TIMEOUT: "sqlite_busy_timeout",
+        MYSQL_POOL_SIZE: "mysql_pool_size",
+        MYSQL_MAX_OVERFLOW: "mysql_max_overflow",
+        MYSQL_POOL_TIMEOUT: "mysql_pool_timeout",
+        MYSQL_POOL_RECYCLE: "mysql_pool_recycle",
+        MYSQL_POOL_PRE_PING: "mysql_pool_pre_ping"
+        }
+    
+    # The SQLite defaults use write-ahead logging, so that readers are not 
+    # blocked while a save is committed, and only sync the log at checkpoints. 
+    # A negative cache size is in KiB, i.e., the cache is 16 MiB. The memory 
+    # map is 256 MiB and the busy timeout is in milliseconds. Set the journal 
+    # mode to delete if the database file is on a network share, where 
+    # write-ahead logging does not work.
+    # The MySQL defaults keep up to 5 pooled connections, plus 10 more under 
+    # load, and wait up to 30 seconds for one to be returned. Connections are 
+    # replaced after an hour, well within the server's wait_timeout, and are 
+    # pinged when checked out so that connections dropped by the server are 
+    # replaced rather than causing errors.
+    TUNING_DEFAULT = {
+        TUNING_OPTION_NAMES_IN_FILE[SQLITE_JOURNAL_MODE]: "wal",
+        TUNING_OPTION_NAMES_IN_FILE[SQLITE_SYNCHRONOUS]: "normal",
+        TUNING_OPTION_NAMES_IN_FILE[SQLITE_CACHE_SIZE]: "-16000",
+        TUNING_OPTION_NAMES_IN_FILE[SQLITE_MMAP_SIZE]: "268435456",
+        TUNING_OPTION_NAMES_IN_FILE[SQLITE_TEMP_STORE]: "memory",
+        TUNING_OPTION_NAMES_IN_FILE[SQLITE_BUSY_TIMEOUT]: "5000",
+        TUNING_OPTION_NAMES_IN_FILE[MYSQL_POOL_SIZE]: "5",
+        TUNING_OPTION_NAMES_IN_FILE[MYSQL_MAX_OVERFLOW]: "10",
+        TUNING_OPTION_NAMES_IN_FILE[MYSQL_POOL_TIMEOUT]: "30",
+        TUNING_OPTION_NAMES_IN_FILE[MYSQL_POOL_RECYCLE]: "3600",
+        TUNING_OPTION_NAMES_IN_FILE[MYSQL_POOL_PRE_PING]: "true"
+        }
+    
+    VALID_SQLITE_JOURNAL_MODES = ["delete", "truncate", "persist", "memory", 
+                                  "wal", "off"]
+    VALID_SQLITE_SYNCHRONOUS = ["off", "normal", "full", "extra"]
+    VALID_SQLITE_TEMP_STORES = ["default", "file", "memory"]
+    VALID_MYSQL_POOL_PRE_PING = ["true", "false"]
+    MAX_PORT = 65535
+    
     def __init__(self, section_dict):
         self.type = section_dict[self.OPTION_NAMES_IN_FILE[self.TYPE]]
         self.driver = section_dict[self.OPTION_NAMES_IN_FILE[self.DRIVER]]
@@ -108,6 +184,32 @@ class DatabaseSection(object):
         self.password = section_dict[self.OPTION_NAMES_IN_FILE[self.PASSWORD]]
         self.host = section_dict[self.OPTION_NAMES_IN_FILE[self.HOST]]
         self.port = section_dict[self.OPTION_NAMES_IN_FILE[self.PORT]]
+        self.sqlite_journal_mode = self._get_tuning_option(
+                                        section_dict, self.SQLITE_JOURNAL_MODE)
+        self.sqlite_synchronous = self._get_tuning_option(
+                                        section_dict, self.SQLITE_SYNCHRONOUS)
+        self.sqlite_cache_size = self._get_tuning_option(
+                                        section_dict, self.SQLITE_CACHE_SIZE)
+        self.sqlite_mmap_size = self._get_tuning_option(
+                                        section_dict, self.SQLITE_MMAP_SIZE)
+        self.sqlite_temp_store = self._get_tuning_option(
+                                        section_dict, self.SQLITE_TEMP_STORE)
+        self.sqlite_busy_timeout = self._get_tuning_option(
+                                        section_dict, self.SQLITE_BUSY_TIMEOUT)
+        self.mysql_pool_size = self._get_tuning_option(
+                                        section_dict, self.MYSQL_POOL_SIZE)
+        self.mysql_max_overflow = self._get_tuning_option(
+                                        section_dict, self.MYSQL_MAX_OVERFLOW)
+        self.mysql_pool_timeout = self._get_tuning_option(
+                                        section_dict, self.MYSQL_POOL_TIMEOUT)
+        self.mysql_pool_recycle = self._get_tuning_option(
+                                        section_dict, self.MYSQL_POOL_RECYCLE)
+        self.mysql_pool_pre_ping = self._get_tuning_option(
+                                        section_dict, self.MYSQL_POOL_PRE_PING)
+        
+    def _get_tuning_option(self, section_dict, option):
+        name = self.TUNING_OPTION_NAMES_IN_FILE[option]
+        return section_dict.get(name, self.TUNING_DEFAULT[name])
         
     def validate(self):
         if self.type == self.TYPE_MYSQL:
@@ -128,6 +230,17 @@ class DatabaseSection(object):
             _verify_setting_is_not_blank(self.NAME_IN_FILE, 
                                        self.OPTION_NAMES_IN_FILE[self.HOST], 
                                        self.host)
+            if self.port != "":
+                _verify_setting_is_integer(self.NAME_IN_FILE, 
+                                           self.OPTION_NAMES_IN_FILE[
+                                                                self.PORT], 
+                                           self.port, minimum=1)
+                if int(self.port) > self.MAX_PORT:
+                    _raise_config_setting_error(self.NAME_IN_FILE,
+                                                self.OPTION_NAMES_IN_FILE[
+                                                                self.PORT],
+                                                self.port)
+            self._validate_mysql_tuning()
         elif self.type == self.TYPE_SQLITE:
             _verify_setting_is_value(self.NAME_IN_FILE, 
                                    self.OPTION_NAMES_IN_FILE[self.DRIVER], 
@@ -147,8 +260,120 @@ class DatabaseSection(object):
             _verify_setting_is_value(self.NAME_IN_FILE, 
                                    self.OPTION_NAMES_IN_FILE[self.PORT], 
                                    self.port, "")
+            self._validate_sqlite_tuning()
         else:
             _raise_config_setting_error(self.NAME_IN_FILE, self.TYPE, self.type)
+            
+    def _check_tuning_option(self, option, verify, *args, **kwargs):
+        '''Check a tuning option, resetting it to its default value if it is 
+        invalid.
+        
+        An invalid tuning option is not an error, because the config wizard 
+        does not show the tuning options and so could not be used to correct
+        it. The default value replaces it in the file when the file is next 
+        written.
+        
+        Args:
+        :param option: The tuning option, e.g., SQLITE_JOURNAL_MODE.
+        :type option: Integer
+        :param verify: The verification function, e.g., 
+            _verify_setting_is_integer, which is passed the remaining 
+            arguments.
+        :type verify: Function
+        '''
+        # The attribute of each tuning option has the option's name.
+        name = self.TUNING_OPTION_NAMES_IN_FILE[option]
+        try:
+            verify(self.NAME_IN_FILE, name, getattr(self, name), *args, 
+                   **kwargs)
+        except AppConfigError as e:
+            default = self.TUNING_DEFAULT[name]
+            logging.warning("{} Using the default value, {}, instead.".format(
+                                                                    e, default))
+            setattr(self, name, default)
+            
+    def _validate_sqlite_tuning(self):
+        self._check_tuning_option(self.SQLITE_JOURNAL_MODE, 
+                                  _verify_setting_is_one_of,
+                                  self.VALID_SQLITE_JOURNAL_MODES)
+        self._check_tuning_option(self.SQLITE_SYNCHRONOUS, 
+                                  _verify_setting_is_one_of,
+                                  self.VALID_SQLITE_SYNCHRONOUS)
+        self._check_tuning_option(self.SQLITE_CACHE_SIZE, 
+                                  _verify_setting_is_integer)
+        self._check_tuning_option(self.SQLITE_MMAP_SIZE, 
+                                  _verify_setting_is_integer, minimum=0)
+        self._check_tuning_option(self.SQLITE_TEMP_STORE, 
+                                  _verify_setting_is_one_of,
+                                  self.VALID_SQLITE_TEMP_STORES)
+        self._check_tuning_option(self.SQLITE_BUSY_TIMEOUT, 
+                                  _verify_setting_is_integer, minimum=0)
+        
+    def _validate_mysql_tuning(self):
+        self._check_tuning_option(self.MYSQL_POOL_SIZE, 
+                                  _verify_setting_is_integer, minimum=1)
+        self._check_tuning_option(self.MYSQL_MAX_OVERFLOW, 
+                                  _verify_setting_is_integer, minimum=0)
+        self._check_tuning_option(self.MYSQL_POOL_TIMEOUT, 
+                                  _verify_setting_is_integer, minimum=0)
+        # A pool recycle time of -1 disables recycling.
+        self._check_tuning_option(self.MYSQL_POOL_RECYCLE, 
+                                  _verify_setting_is_integer, minimum=-1)
+        self._check_tuning_option(self.MYSQL_POOL_PRE_PING, 
+                                  _verify_setting_is_one_of,
+                                  self.VALID_MYSQL_POOL_PRE_PING)
+        
+    def get_engine_string(self):
+        '''Get the database URL to pass to create_engine.
+        
+        Returns:
+        :return: The database URL, or an empty string if the database type is
+            not recognised.
+        :rtype: String
+        '''
+        engine_string = ""
+        if self.type == self.TYPE_SQLITE:
+            engine_string = r"{}:///{}".format(self.type, self.filename)
+        elif self.type == self.TYPE_MYSQL:
+            host = self.host
+            if self.port:
+                host = "{}:{}".format(host, self.port)
+            engine_string = "{}+{}://{}:{}@{}/{}".format(self.type,
+                                                         self.driver,
+                                                         self.username,
+                                                         self.password,
+                                                         host,
+                                                         self.name)
+        return engine_string
+        
+    def get_mysql_pool_options(self):
+        '''Get the connection pool options of the MySQL engine.
+        
+        Returns:
+        :return: The keyword arguments to pass to create_engine.
+        :rtype: Dictionary
+        '''
+        return {"pool_size": int(self.mysql_pool_size),
+                "max_overflow": int(self.mysql_max_overflow),
+                "pool_timeout": int(self.mysql_pool_timeout),
+                "pool_recycle": int(self.mysql_pool_recycle),
+                "pool_pre_ping": self.mysql_pool_pre_ping == "true"}
+        
+    def get_sqlite_pragmas(self):
+        '''Get the SQLite pragmas to apply to each new database connection.
+        
+        Returns:
+        :return: The pragma names and values, in the order in which they must
+            be applied. The busy timeout comes first, so that changing the 
+            journal mode waits for other connections.
+        :rtype: List of (String, String) tuples
+        '''
+        return [("busy_timeout", self.sqlite_busy_timeout),
+                ("journal_mode", self.sqlite_journal_mode),
+                ("synchronous", self.sqlite_synchronous),
+                ("cache_size", self.sqlite_cache_size),
+                ("mmap_size", self.sqlite_mmap_size),
+                ("temp_store", self.sqlite_temp_store)]
 
     def get_dict(self):
         return {
@@ -159,7 +384,29 @@ class DatabaseSection(object):
             self.OPTION_NAMES_IN_FILE[self.USERNAME]: self.username,
             self.OPTION_NAMES_IN_FILE[self.PASSWORD]: self.password,
             self.OPTION_NAMES_IN_FILE[self.HOST]: self.host,
-            self.OPTION_NAMES_IN_FILE[self.PORT]: self.port
+            self.OPTION_NAMES_IN_FILE[self.PORT]: self.port,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.SQLITE_JOURNAL_MODE]: \
+                                                    self.sqlite_journal_mode,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.SQLITE_SYNCHRONOUS]: \
+                                                    self.sqlite_synchronous,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.SQLITE_CACHE_SIZE]: \
+                                                    self.sqlite_cache_size,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.SQLITE_MMAP_SIZE]: \
+                                                    self.sqlite_mmap_size,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.SQLITE_TEMP_STORE]: \
+                                                    self.sqlite_temp_store,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.SQLITE_BUSY_TIMEOUT]: \
+                                                    self.sqlite_busy_timeout,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.MYSQL_POOL_SIZE]: \
+                                                    self.mysql_pool_size,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.MYSQL_MAX_OVERFLOW]: \
+                                                    self.mysql_max_overflow,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.MYSQL_POOL_TIMEOUT]: \
+                                                    self.mysql_pool_timeout,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.MYSQL_POOL_RECYCLE]: \
+                                                    self.mysql_pool_recycle,
+            self.TUNING_OPTION_NAMES_IN_FILE[self.MYSQL_POOL_PRE_PING]: \
+                                                    self.mysql_pool_pre_ping
             }
 
 
@@ -294,6 +541,98 @@ class LocaleSection(object):
             } 
    
 
+class PdfSection(object):
+    '''A class containing the data in the PDF section of the application 
+    config file.
+    
+    The section is optional, so that config files written before it was 
+    added are still valid. Missing options take their default values.
+    '''
+    
+    NAME_IN_FILE = "PDF"
+    
+    NUM_OPTIONS = 3
+    (   PAGE_COMPRESSION,
+        IMAGE_DPI,
+        RENDER_CACHE_SIZE_MB
+        ) = range(NUM_OPTIONS)
+    
+    OPTION_NAMES_IN_FILE = {
+        PAGE_COMPRESSION: "page_compression",
+        IMAGE_DPI: "image_dpi",
+        RENDER_CACHE_SIZE_MB: "render_cache_size_mb"
+        }
+    
+    # An image DPI of 0 embeds images at their full resolution, and a render 
+    # cache size of 0 disables the render cache.
+    DEFAULT = {
+        OPTION_NAMES_IN_FILE[PAGE_COMPRESSION]: "true",
+        OPTION_NAMES_IN_FILE[IMAGE_DPI]: "300",
+        OPTION_NAMES_IN_FILE[RENDER_CACHE_SIZE_MB]: "50"
+        }
+    
+    VALID_PAGE_COMPRESSION = ["true", "false"]
+    
+    def __init__(self, section_dict):
+        self.page_compression = section_dict.get(
+                                self.OPTION_NAMES_IN_FILE[self.PAGE_COMPRESSION],
+                                self.DEFAULT[self.OPTION_NAMES_IN_FILE[
+                                                    self.PAGE_COMPRESSION]])
+        self.image_dpi = section_dict.get(
+                                self.OPTION_NAMES_IN_FILE[self.IMAGE_DPI],
+                                self.DEFAULT[self.OPTION_NAMES_IN_FILE[
+                                                    self.IMAGE_DPI]])
+        self.render_cache_size_mb = section_dict.get(
+                        self.OPTION_NAMES_IN_FILE[self.RENDER_CACHE_SIZE_MB],
+                        self.DEFAULT[self.OPTION_NAMES_IN_FILE[
+                                                self.RENDER_CACHE_SIZE_MB]])
+        
+    def validate(self):
+        _verify_setting_is_one_of(self.NAME_IN_FILE, 
+                                  self.OPTION_NAMES_IN_FILE[
+                                                    self.PAGE_COMPRESSION],
+                                  self.page_compression,
+                                  self.VALID_PAGE_COMPRESSION)
+        _verify_setting_is_integer(self.NAME_IN_FILE, 
+                                   self.OPTION_NAMES_IN_FILE[self.IMAGE_DPI],
+                                   self.image_dpi,
+                                   minimum=0)
+        _verify_setting_is_integer(self.NAME_IN_FILE, 
+                                   self.OPTION_NAMES_IN_FILE[
+                                                self.RENDER_CACHE_SIZE_MB],
+                                   self.render_cache_size_mb,
+                                   minimum=0)
+        
+    def get_pdf_options(self):
+        '''Get the options of the PDF reports.
+        
+        Returns:
+        :return: The keyword arguments to pass to pdfreports.PoPdf and 
+            pdfreports.ReportPdf.
+        :rtype: Dictionary
+        '''
+        return {"page_compression": self.page_compression == "true",
+                "image_dpi": int(self.image_dpi) or None}
+    
+    def get_render_cache_size(self):
+        '''Get the size limit of the PDF render cache.
+        
+        Returns:
+        :return: The size limit in bytes, or 0 if the cache is disabled.
+        :rtype: Integer
+        '''
+        return int(self.render_cache_size_mb) * 2**20
+        
+    def get_dict(self):
+        return {
+            self.OPTION_NAMES_IN_FILE[self.PAGE_COMPRESSION]: \
+                                                    self.page_compression,
+            self.OPTION_NAMES_IN_FILE[self.IMAGE_DPI]: self.image_dpi,
+            self.OPTION_NAMES_IN_FILE[self.RENDER_CACHE_SIZE_MB]: \
+                                                    self.render_cache_size_mb
+            }
+   
+
 class ConfigFile(object):
     '''A class that provides access to the application config file, including 
     functionality for validating and writing to the config file.
@@ -354,12 +693,19 @@ class ConfigFile(object):
                                             PurchaseOrderSection.NAME_IN_FILE])
         self.locale = LocaleSection(self._config_parser[
                                             LocaleSection.NAME_IN_FILE])
+        # The PDF section is optional, so it is not in _DEFAULT_CONFIG.
+        if self._config_parser.has_section(PdfSection.NAME_IN_FILE):
+            self.pdf = PdfSection(self._config_parser[
+                                            PdfSection.NAME_IN_FILE])
+        else:
+            self.pdf = PdfSection({})
         
     def validate(self):
         self.database.validate()
         self.company.validate()
         self.purchaseorder.validate()
         self.locale.validate()
+        self.pdf.validate()
         
     def write(self):
         self._config_parser[DatabaseSection.NAME_IN_FILE] = \
@@ -370,11 +716,14 @@ class ConfigFile(object):
                                                 self.purchaseorder.get_dict()
         self._config_parser[LocaleSection.NAME_IN_FILE] = \
                                                 self.locale.get_dict()
+        self._config_parser[PdfSection.NAME_IN_FILE] = self.pdf.get_dict()
         with open(self._CONFIG_FILE_NAME, "w") as app_config:
             self._config_parser.write(app_config)
         
         
 def show_error_config_file_structure(exception):
+    from PyQt4.QtGui import QMessageBox
+    from messagebox import execute_critical_msg_box
     execute_critical_msg_box("Config Validation Error", 
                              ("There were errors in the structure of the "
                               "config file. The file has been reset to "
@@ -383,20 +732,42 @@ def show_error_config_file_structure(exception):
                              QMessageBox.Ok)
     
 def show_error_config_file_setting():
+    from PyQt4.QtGui import QMessageBox
+    from messagebox import execute_critical_msg_box
     execute_critical_msg_box("Config Validation Error", 
                              ("There are errors in the config file. "
                               "The configuration wizard must now be run."), 
                              QMessageBox.Ok)
 
 def show_error_no_config_file():
+    from PyQt4.QtGui import QMessageBox
+    from messagebox import execute_critical_msg_box
     execute_critical_msg_box("Config Validation Error", 
                              ("A config file was not found. "
                               "The configuration wizard must now be run."), 
                              QMessageBox.Ok)
     
-# Read and validate the configuration file.
+def show_app_config_error():
+    '''Show a message box explaining why the config file could not be used,
+    if it could not.
+    
+    The errors are not shown when the file is read, so that the command line 
+    tools can import this module without Qt.
+    '''
+    if app_config_ok:
+        return
+    if isinstance(app_config_error, AppConfigStructureError):
+        show_error_config_file_structure(app_config_error)
+    elif isinstance(app_config_error, AppConfigError):
+        show_error_config_file_setting()
+    else:
+        show_error_no_config_file()
+    
+# Read and validate the configuration file. Any error is kept in 
+# app_config_error, and is shown by show_app_config_error.
 app_config = ConfigFile()
 app_config_ok = False
+app_config_error = None
 if app_config.exists():
     try:
         app_config.load()
@@ -404,16 +775,15 @@ if app_config.exists():
         # The config file is valid. The main window may be started.
         app_config_ok = True
     except AppConfigStructureError as e:
-        show_error_config_file_structure(e)
+        app_config_error = e
         app_config.set_to_defaults()
         # The config file structure was invalid and was set to defaults.
         # The config dialog must be run.
     except AppConfigError as e:
-        show_error_config_file_setting()
+        app_config_error = e
         # The config file had an invalid setting.
         # The config dialog must be run. 
 else:
-    show_error_no_config_file()
     app_config.set_to_defaults()
     # The config file was not found. A default config file has been created.
-    # The config dialog must be run.
\ No newline at end of file
+    # The config dialog must be run.
@@ -0,0 +1,436 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# The file in the output directory that records the fingerprint of each 
+# exported purchase order, for incremental exports.
+MANIFEST_FILENAME = "batchexport.json"
+
+
+def load_purchase_orders(session, start_date=None, end_date=None, 
+                         order_status=None, supplier=None, project=None):
+    '''Load the purchase orders to export, together with their supplier and 
+    line items, with a single query.
+    
+    Args:
+    :param session: The SQLAlchemny session in use. 
+    :type session: Session object (the class created by the call to  
+        :func:`sessionmaker` in :mod:`sqlasession`).
+    :param start_date: The earliest order date, or None.
+    :type start_date: datetime.date
+    :param end_date: The latest order date, or None.
+    :type end_date: datetime.date
+    :param order_status: The order status, or None for all statuses.
+    :type order_status: String
+    :param supplier: The supplier company name, or None for all suppliers.
+    :type supplier: String
+    :param project: The project code, or None for all projects.
+    :type project: String
+    
+    Returns:
+    :return: The purchase orders, in order number order.
+    :rtype: List of purchaseorder.PurchaseOrder
+    '''
+    from sqlalchemy.orm import contains_eager, joinedload
+    from project import Project
+    from purchaseorder import PurchaseOrder
+    from purchaseorderproduct import PurchaseOrderProduct
+    from supplier import Supplier
+    query = session.query(PurchaseOrder).\
+                join(PurchaseOrder.supplier).\
+                outerjoin(PurchaseOrder.project).\
+                options(contains_eager(PurchaseOrder.supplier),
+                        contains_eager(PurchaseOrder.project),
+                        joinedload(PurchaseOrder.products).\
+                            joinedload(PurchaseOrderProduct.product))
+    if start_date:
+        query = query.filter(PurchaseOrder.order_date >= start_date)
+    if end_date:
+        query = query.filter(PurchaseOrder.order_date <= end_date)
+    if order_status:
+        query = query.filter(PurchaseOrder.order_status == order_status)
+    if supplier:
+        query = query.filter(Supplier.company_name == supplier)
+    if project:
+        query = query.filter(Project.code == project)
+    return query.order_by(PurchaseOrder.order_number).all()
+
+def _format_monetary_value(value, app_config):
+    '''Format an integer monetary value the way the main window does.
+    '''
+    from conversions import get_money
+    return get_money(app_config).format_int(value)
+
+def _get_pdf_filename(output_dir, order_number):
+    '''Get the PDF filename of a purchase order, replacing any characters that
+    are not allowed in filenames.
+    '''
+    safe_order_number = re.sub(r"[^A-Za-z0-9_.-]", "_", order_number)
+    return os.path.join(output_dir, safe_order_number + ".pdf")
+
+def make_export_job(purchase_order, company_name, user_config, app_config, 
+                    output_dir):
+    '''Snapshot a purchase order into the plain data needed to render it, so 
+    that it can be sent to a worker process.
+    
+    Args:
+    :param purchase_order: The purchase order, with its supplier and line 
+        items loaded.
+    :type purchase_order: purchaseorder.PurchaseOrder
+    :param company_name: The company name, from the application config.
+    :type company_name: String
+    :param user_config: The latest user config.
+    :type user_config: userconfigmodel.UserConfigReader
+    :param app_config: The application configuration in use.
+    :type app_config: appconfig.ConfigFile
+    :param output_dir: The directory to write the PDF to.
+    :type output_dir: String
+    
+    Returns:
+    :return: The job, which only contains strings, numbers and lists.
+    :rtype: Dictionary
+    '''
+    from conversions import get_money, percentage_int_to_decimal
+    from lineitemtotals import line_price_int
+    logo_filename = user_config.company.logo_filename
+    if logo_filename and not os.path.exists(logo_filename):
+        # The GUI warns about this in a message box.
+        logging.warning(("The configured company logo file {} could not be "
+                         "found. The PDFs will be generated without "
+                         "it.").format(logo_filename))
+        logo_filename = None
+    supplier = purchase_order.supplier
+    line_items = []
+    for po_product in sorted(purchase_order.products, key=lambda p: p.id):
+        line_price = line_price_int(po_product.unit_price, 
+                                    po_product.discount, 
+                                    po_product.quantity)
+        line_items.append([
+            po_product.product.part_number,
+            po_product.product.product_description,
+            _format_monetary_value(po_product.unit_price, app_config),
+            "{:2.0%}".format(percentage_int_to_decimal(po_product.discount)),
+            po_product.quantity,
+            get_money(app_config).format_scaled_int(line_price)])
+    return {
+        "filename": _get_pdf_filename(output_dir, purchase_order.order_number),
+        "company": [company_name,
+                    user_config.company.postal_address,
+                    user_config.company.phone_number,
+                    user_config.company.fax_number,
+                    user_config.company.email_address,
+                    user_config.company.web_address,
+                    logo_filename],
+        "order": [purchase_order.order_number,
+                  str(purchase_order.order_date),
+                  purchase_order.payment_terms],
+        "supplier": [supplier.company_name,
+                     supplier.address,
+                     supplier.phone_number or "",
+                     supplier.fax_number or "",
+                     supplier.email_address or "",
+                     supplier.contact_person_name or ""],
+        "delivery": [str(purchase_order.delivery_date),
+                     purchase_order.delivery_address,
+                     purchase_order.delivery_address_gps_coordinates or ""],
+        "line_items": line_items,
+        "totals": [_format_monetary_value(purchase_order.total_excluding_tax,
+                                          app_config),
+                   _format_monetary_value(purchase_order.total_tax, 
+                                          app_config),
+                   _format_monetary_value(purchase_order.total_including_tax,
+                                          app_config),
+                   app_config.locale.tax_name],
+        "notes": purchase_order.notes or "",
+        "signature": [user_config.company.signatory_name,
+                      user_config.company.signature_filename],
+        "pdf_options": app_config.pdf.get_pdf_options()
+        }
+
+def get_job_fingerprint(job):
+    '''Get a fingerprint of everything that is rendered for a job.
+    
+    The job only holds the filenames of the logo and signature images, so the
+    modification times and sizes of the images are included as well, as in 
+    pdfreports.PoPdf.get_fingerprint. An image that is replaced at the same 
+    path then gives a different fingerprint.
+    
+    Args:
+    :param job: The job. Refer to :func:`make_export_job`.
+    :type job: Dictionary
+    
+    Returns:
+    :return: The SHA-256 hex digest of the job and its images.
+    :rtype: String
+    '''
+    image_stats = []
+    for image_filename in (job["company"][-1], job["signature"][1]):
+        if image_filename and os.path.exists(image_filename):
+            stat = os.stat(image_filename)
+            image_stats.append([stat.st_mtime_ns, stat.st_size])
+        else:
+            image_stats.append(None)
+    encoded_job = json.dumps([job, image_stats], 
+                             sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded_job).hexdigest()
+
+def render_purchase_order(job):
+    '''Render the PDF of a purchase order. This runs in a worker process.
+    
+    Args:
+    :param job: The job. Refer to :func:`make_export_job`.
+    :type job: Dictionary
+    
+    Returns:
+    :return: The PDF filename.
+    :rtype: String
+    '''
+    # Imported here, so that reportlab is only imported by the workers. Each 
+    # worker keeps its own image and letterhead caches in pdfreports, which 
+    # are reused for all of the jobs that it renders.
+    from pdfreports import (PoPdf, PoPdfCompanyDetails, PoPdfOrderDetails, 
+                            PoPdfSupplierDetails, PoPdfLineItemDetails, 
+                            PoPdfDeliveryDetails, PoPdfSignatureDetails)
+    (name, address, phone, fax, email, web, logo_filename) = job["company"]
+    company_details = PoPdfCompanyDetails(name, address, phone, fax=fax, 
+                                          email=email, web=web,
+                                          logo_filename=logo_filename)
+    order_details = PoPdfOrderDetails(*job["order"])
+    supplier_details = PoPdfSupplierDetails(*job["supplier"])
+    delivery_details = PoPdfDeliveryDetails(*job["delivery"])
+    line_item_details = PoPdfLineItemDetails(job["line_items"], *job["totals"])
+    signatory_name, signature_filename = job["signature"]
+    signature_details = PoPdfSignatureDetails(signatory_name, 
+                                              signature_filename, 
+                                              draft=True)
+    pdf_report = PoPdf(job["filename"],
+                       company_details,
+                       order_details,
+                       supplier_details,
+                       delivery_details,
+                       line_item_details,
+                       job["notes"],
+                       signature_details,
+                       show_all_grids=False,
+                       **job["pdf_options"])
+    pdf_report.build()
+    return job["filename"]
+
+def _load_manifest(output_dir):
+    manifest_filename = os.path.join(output_dir, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_filename):
+        return {}
+    with open(manifest_filename, "r") as manifest_file:
+        return json.load(manifest_file)
+
+def _save_manifest(output_dir, manifest):
+    manifest_filename = os.path.join(output_dir, MANIFEST_FILENAME)
+    temp_filename = manifest_filename + ".tmp"
+    with open(temp_filename, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.replace(temp_filename, manifest_filename)
+
+def export_jobs(jobs, output_dir, processes=None, incremental=False):
+    '''Render the PDFs of a list of jobs across a pool of worker processes.
+    
+    Args:
+    :param jobs: The jobs. Refer to :func:`make_export_job`.
+    :type jobs: List of dictionaries
+    :param output_dir: The directory that the PDFs are written to, which 
+        also holds the manifest of the exported purchase orders.
+    :type output_dir: String
+    :param processes: The number of worker processes, or None for one per 
+        CPU.
+    :type processes: Integer
+    :param incremental: If True, jobs whose PDF exists and whose fingerprint 
+        is unchanged since the last export are skipped.
+    :type incremental: Boolean
+    
+    A job that fails is logged and counted, and the other jobs carry on. The
+    manifest records each job that is rendered, even if the export is 
+    interrupted, so that an incremental export only repeats the jobs that 
+    were not rendered.
+    
+    Returns:
+    :return: The number of PDFs rendered, the number skipped, the number that
+        failed and the elapsed time in seconds.
+    :rtype: Tuple of (Integer, Integer, Integer, Float)
+    '''
+    start_time = time.perf_counter()
+    manifest = _load_manifest(output_dir)
+    pending_jobs = []
+    fingerprints = []
+    for job in jobs:
+        fingerprint = get_job_fingerprint(job)
+        if incremental and \
+           manifest.get(job["filename"]) == fingerprint and \
+           os.path.exists(job["filename"]):
+            continue
+        pending_jobs.append(job)
+        fingerprints.append(fingerprint)
+    rendered = 0
+    failed = 0
+    if pending_jobs:
+        processes = processes or os.cpu_count() or 1
+        try:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = {executor.submit(render_purchase_order, job): 
+                               (job, fingerprint)
+                           for job, fingerprint in zip(pending_jobs, 
+                                                       fingerprints)}
+                for future in as_completed(futures):
+                    job, fingerprint = futures[future]
+                    try:
+                        future.result()
+                    except Exception:
+                        logging.exception("Could not export {}".format(
+                                                            job["filename"]))
+                        # The PDF may be partly written, so it must not be 
+                        # skipped by the next incremental export.
+                        manifest.pop(job["filename"], None)
+                        failed += 1
+                    else:
+                        manifest[job["filename"]] = fingerprint
+                        rendered += 1
+        finally:
+            _save_manifest(output_dir, manifest)
+    elapsed = time.perf_counter() - start_time
+    return rendered, len(jobs) - len(pending_jobs), failed, elapsed
+
+def _parse_date(value):
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+                        description="Export the PDFs of many purchase orders.")
+    parser.add_argument("output_dir", 
+                        help="the directory to write the PDFs to")
+    parser.add_argument("--start-date", type=_parse_date, 
+                        help="the earliest order date, as YYYY-MM-DD")
+    parser.add_argument("--end-date", type=_parse_date, 
+                        help="the latest order date, as YYYY-MM-DD")
+    parser.add_argument("--status", help="the order status, e.g., Draft")
+    parser.add_argument("--supplier", help="the supplier company name")
+    parser.add_argument("--project", help="the project code")
+    parser.add_argument("--processes", type=int, 
+                        help="the number of worker processes (default: one "
+                             "per CPU)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip purchase orders that have not changed "
+                             "since the last export to the directory")
+    parser.add_argument("--scaling", action="store_true",
+                        help="measure the throughput with 1, 2, 4, ... "
+                             "worker processes instead of exporting")
+    return parser.parse_args(argv)
+
+def _measure_scaling(jobs):
+    '''Render the jobs into temporary directories with increasing numbers of 
+    worker processes, and print the throughput of each.
+    '''
+    process_counts = []
+    count = 1
+    while count < (os.cpu_count() or 1):
+        process_counts.append(count)
+        count *= 2
+    process_counts.append(os.cpu_count() or 1)
+    for processes in process_counts:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            scaling_jobs = [dict(job, filename=_get_pdf_filename(
+                                    temp_dir, 
+                                    os.path.basename(job["filename"])[:-4]))
+                            for job in jobs]
+            rendered, _, _, elapsed = export_jobs(scaling_jobs, temp_dir, 
+                                                  processes=processes)
+            print("{:>3} processes: {:,.1f} PDFs/s".format(processes, 
+                                                           rendered / elapsed))
+        finally:
+            shutil.rmtree(temp_dir)
+
+def main(argv=None):
+    '''Run the batch export from the command line.
+    
+    Returns:
+    :return: The exit code.
+    :rtype: Integer
+    '''
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO, 
+                        format="-> %(asctime)s - %(levelname)s - %(message)s")
+    # Importing the config module reads the config file, without Qt.
+    from appconfig import app_config, app_config_ok, app_config_error
+    if not app_config_ok:
+        logging.error("The config file could not be used ({}). Run POdB to "
+                      "fix it.".format(app_config_error or "it was not found"))
+        return 1
+    from sqlasession import session_scope
+    from userconfigmodel import UserConfigReader
+    os.makedirs(args.output_dir, exist_ok=True)
+    with session_scope() as session:
+        user_config = UserConfigReader(session)
+        if not user_config.config_valid:
+            logging.error("The user config is invalid. Run POdB to fix it.")
+            return 1
+        purchase_orders = load_purchase_orders(session, 
+                                               start_date=args.start_date,
+                                               end_date=args.end_date,
+                                               order_status=args.status,
+                                               supplier=args.supplier,
+                                               project=args.project)
+        jobs = [make_export_job(purchase_order, 
+                                app_config.company.name,
+                                user_config,
+                                app_config,
+                                args.output_dir)
+                for purchase_order in purchase_orders]
+    logging.info("Selected {} purchase orders".format(len(jobs)))
+    if args.scaling:
+        _measure_scaling(jobs)
+        return 0
+    rendered, skipped, failed, elapsed = export_jobs(
+                                                jobs, 
+                                                args.output_dir,
+                                                processes=args.processes,
+                                                incremental=args.incremental)
+    logging.info(("Rendered {} PDFs and skipped {} unchanged ones in {:.1f} s "
+                  "({:,.1f} PDFs/s)").format(rendered, 
+                                             skipped, 
+                                             elapsed,
+                                             rendered / elapsed if elapsed 
+                                             else 0))
+    if failed:
+        logging.error("{} PDFs could not be exported".format(failed))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
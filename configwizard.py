@@ -36,6 +36,7 @@ from dbaccess import (sqlite_connection_is_ok, mysql_database_exists,
 from userconfigmodel import (UserConfigError, UserConfigEditor, CompanySettings, 
                              PurchaseOrderSettings, LocaleSettings)
 from purchaseorder import PO_ORDER_STATUSUS, PO_PAYMENT_TERMS
+from schemamigrations import prepare_schema
 
 
 class StartUpConfigWizard(QWizard, ui_configwizard.Ui_Wizard):
@@ -101,17 +102,18 @@ class StartUpConfigWizard(QWizard, ui_configwizard.Ui_Wizard):
             self.user_config is None:
             # Import all the database class definitions so that SQL Alchemy
             # knows what they are. (Ignore the "unused import" warnings in the
-            # following six lines.)
+            # following lines.)
             from product import Product
             from project import Project
             from purchaseorder import PurchaseOrder
+            from purchaseordernumbersequence import \
+                PurchaseOrderNumberSequence
             from purchaseorderproduct import PurchaseOrderProduct
             from supplier import Supplier
             from userconfig import UserConfig
             # Create a session object, now that we know the database settings.
             from sqlaengine import engine
-            from sqlabase import Base
-            Base.metadata.create_all(engine)
+            prepare_schema(engine)
             Session = sessionmaker(bind=engine, autoflush=True)
             self.session = Session()
             self.user_config = UserConfigEditor(self.session)
@@ -214,8 +216,7 @@ class InAppConfigWizard(QWizard, ui_configwizard.Ui_Wizard):
             self.user_config is None:
             # Create a session object, now that we know the database settings.
             from sqlaengine import engine
-            from sqlabase import Base
-            Base.metadata.create_all(engine)
+            prepare_schema(engine)
             Session = sessionmaker(bind=engine, autoflush=True)
             self.session = Session()
             self.user_config = UserConfigEditor(self.session)
@@ -411,13 +412,15 @@ class ConfigWizardPage2(QWizardPage, ui_configwizardp2.Ui_wizardPage2):
                                           self.app_config.database.username, 
                                           self.app_config.database.password, 
                                           self.app_config.database.host, 
-                                          self.app_config.database.name)
+                                          self.app_config.database.name,
+                                          self.app_config.database.port)
             if db_exists:
                 self.db_connection_ok = mysql_connection_is_ok(
                                           self.app_config.database.username, 
                                           self.app_config.database.password, 
                                           self.app_config.database.host, 
-                                          self.app_config.database.name)
+                                          self.app_config.database.name,
+                                          self.app_config.database.port)
         result = []
         if db_exists and self.db_connection_ok:
             result.append("Database connection test passed.")
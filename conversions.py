@@ -20,6 +20,235 @@ Contact: paulosvnleal@gmail.com
 from decimal import Decimal
 
 
+# The decimal values of the integer percentages 0 to 99, so that they are not 
+# divided out on every conversion.
+_PERCENTAGE_DECIMALS = tuple(Decimal(value) / Decimal("100.0") 
+                             for value in range(100))
+
+
+class Money(object):
+    '''Converts and formats monetary quantities for a currency with a fixed 
+    number of decimal places.
+    
+    Monetary quantities are stored, and should be added and multiplied, as 
+    integers in the currency's minor unit. They are only converted to Decimal
+    types, and rounded, for presentation. The factor, the quantizer and the 
+    format string used by the conversions are calculated once, when the object
+    is created. Use :func:`get_money` rather than creating Money objects 
+    directly.
+    '''
+    
+    def __init__(self, decimal_places, currency_symbol=""):
+        '''Initialise the Money object.
+        
+        Args:
+        :param decimal_places: The number of decimal places used by the 
+            currency.
+        :type decimal_places: Integer
+        :param currency_symbol: The currency symbol used when formatting 
+            monetary values.
+        :type currency_symbol: String
+        '''
+        self.decimal_places = decimal_places
+        self.currency_symbol = currency_symbol
+        self.factor = 10 ** decimal_places
+        self._decimal_factor = Decimal(self.factor)
+        # Line prices are in minor units multiplied by 100. Refer to 
+        # lineitemtotals.line_price_int.
+        self._scaled_decimal_factor = Decimal(self.factor * 100)
+        self._quantizer = Decimal(1).scaleb(-decimal_places)
+        # The format string for display, e.g., "R {:,.2f}". Braces in the 
+        # symbol are escaped so that they are not taken as replacement fields.
+        escaped_symbol = currency_symbol.replace("{", "{{").replace("}", "}}")
+        self.currency_format = "{} {{:,.{}f}}".format(escaped_symbol, 
+                                                       decimal_places).lstrip()
+        
+    def int_to_decimal(self, value):
+        '''Convert an integer monetary value in minor units to a decimal type.
+        
+        Refer to :func:`monetary_int_to_decimal`.
+        
+        Args:
+        :param value: The monetary value to convert to decimal.
+        :type value: Integer
+        
+        Returns:
+        :return: The monetary value as a decimal.
+        :rtype: Decimal
+        '''
+        return Decimal(value) / self._decimal_factor
+    
+    def scaled_int_to_decimal(self, value):
+        '''Convert an integer monetary value in minor units multiplied by 100, 
+        e.g., a line price, to a decimal type.
+        
+        Args:
+        :param value: The monetary value to convert to decimal.
+        :type value: Integer
+        
+        Returns:
+        :return: The monetary value as a decimal.
+        :rtype: Decimal
+        '''
+        return Decimal(value) / self._scaled_decimal_factor
+    
+    def decimal_to_int(self, value):
+        '''Round a decimal monetary value to the currency's decimal places and
+        convert it to an integer in minor units.
+        
+        Refer to :func:`monetary_decimal_to_int`.
+        
+        Args:
+        :param value: The monetary value to convert to integer.
+        :type value: Decimal
+        
+        Returns:
+        :return: The monetary value as an integer.
+        :rtype: Integer
+        '''
+        return int(value.quantize(self._quantizer).scaleb(self.decimal_places))
+    
+    def float_to_int(self, value):
+        '''Round a float monetary value to the currency's decimal places and
+        convert it to an integer in minor units.
+        
+        Refer to :func:`monetary_float_to_int`.
+        
+        Args:
+        :param value: The monetary value to convert to integer.
+        :type value: Float
+        
+        Returns:
+        :return: The monetary value as an integer.
+        :rtype: Integer
+        '''
+        return self.decimal_to_int(Decimal(value))
+    
+    def ints_to_decimals(self, values):
+        '''Convert a list of integer monetary values to decimal types.
+        
+        Args:
+        :param values: The monetary values in minor units.
+        :type values: Iterable of Integers
+        
+        Returns:
+        :return: The monetary values as decimals.
+        :rtype: List of Decimals
+        '''
+        decimal_factor = self._decimal_factor
+        return [Decimal(value) / decimal_factor for value in values]
+    
+    def scaled_ints_to_decimals(self, values):
+        '''Convert a list of integer monetary values in minor units multiplied
+        by 100, e.g., line prices, to decimal types.
+        
+        Args:
+        :param values: The monetary values in minor units multiplied by 100.
+        :type values: Iterable of Integers
+        
+        Returns:
+        :return: The monetary values as decimals.
+        :rtype: List of Decimals
+        '''
+        scaled_decimal_factor = self._scaled_decimal_factor
+        return [Decimal(value) / scaled_decimal_factor for value in values]
+    
+    def decimals_to_ints(self, values):
+        '''Convert a list of decimal monetary values to integers in minor 
+        units, rounding each to the currency's decimal places.
+        
+        Args:
+        :param values: The monetary values.
+        :type values: Iterable of Decimals
+        
+        Returns:
+        :return: The monetary values as integers.
+        :rtype: List of Integers
+        '''
+        quantizer = self._quantizer
+        decimal_places = self.decimal_places
+        return [int(value.quantize(quantizer).scaleb(decimal_places)) 
+                for value in values]
+    
+    def format_decimal(self, value):
+        '''Format a decimal monetary value for display, with the currency 
+        symbol and thousands separators, rounded to the currency's decimal 
+        places.
+        
+        Args:
+        :param value: The monetary value.
+        :type value: Decimal
+        
+        Returns:
+        :return: The display string, e.g., "R 1,234.50".
+        :rtype: String
+        '''
+        return self.currency_format.format(value)
+    
+    def format_int(self, value):
+        '''Format an integer monetary value in minor units for display.
+        
+        Refer to :meth:`format_decimal`.
+        
+        Args:
+        :param value: The monetary value in minor units.
+        :type value: Integer
+        
+        Returns:
+        :return: The display string.
+        :rtype: String
+        '''
+        return self.currency_format.format(Decimal(value) / 
+                                           self._decimal_factor)
+    
+    def format_scaled_int(self, value):
+        '''Format an integer monetary value in minor units multiplied by 100, 
+        e.g., a line price, for display.
+        
+        Refer to :meth:`format_decimal`.
+        
+        Args:
+        :param value: The monetary value in minor units multiplied by 100.
+        :type value: Integer
+        
+        Returns:
+        :return: The display string.
+        :rtype: String
+        '''
+        return self.currency_format.format(Decimal(value) / 
+                                           self._scaled_decimal_factor)
+    
+
+# The Money objects created so far, by the configured number of decimal 
+# places, and then by the configured currency symbol.
+_money_contexts = {}
+
+def get_money(app_config):
+    '''Get the Money object for the configured currency.
+    
+    The object is created the first time it is needed, and reused after that.
+    The configuration is checked on every call, so a change to the number of 
+    decimal places or to the currency symbol takes effect immediately.
+    
+    Args:
+    :param app_config: The application configuration in use.
+    :type app_confg: appconfig.ConfigFile
+    
+    Returns:
+    :return: The Money object.
+    :rtype: Money
+    '''
+    locale = app_config.locale
+    try:
+        return _money_contexts[locale.currency_decimal_places][
+                                                    locale.currency_symbol]
+    except KeyError:
+        money = Money(int(locale.currency_decimal_places), 
+                      locale.currency_symbol)
+        _money_contexts.setdefault(locale.currency_decimal_places, {})[
+                                                locale.currency_symbol] = money
+        return money
+
 def percentage_int_to_decimal(value):
     '''Convert an integer representation of a percentage to a decimal type.
     
@@ -46,7 +275,7 @@ def percentage_int_to_decimal(value):
                           "percentage_int_to_decimal. The valid "
                           "range is 0 to 99, inclusive. "
                           "The parameter value was {}.").format(str(value)))
-    return Decimal(value) / Decimal("100.0")
+    return _PERCENTAGE_DECIMALS[value]
 
 def percentage_decimal_to_int(value):
     '''Convert a decimal representation of a percentage to an integer.
@@ -104,10 +333,7 @@ def monetary_int_to_decimal(value, app_config):
     :raises: AssertionError if value is not an integer.
     '''
     assert type(value) == int
-    # Calculate the factor from the configured decimal places.
-    decimal_places = int(app_config.locale.currency_decimal_places)
-    factor = 10 ** decimal_places
-    return Decimal(value) / Decimal(factor)
+    return get_money(app_config).int_to_decimal(value)
 
 def monetary_decimal_to_int(value, app_config):
     '''Convert a decimal representation of a monetary quantity, e.g., a price 
@@ -134,17 +360,7 @@ def monetary_decimal_to_int(value, app_config):
     :raises: AssertionError if value is not a Decimal.
     '''
     assert type(value) == Decimal
-    # Calculate the factor from the configured decimal places.
-    decimal_places = int(app_config.locale.currency_decimal_places)
-    factor = 10 ** decimal_places
-    # Round the value the correct number of decimal places before converting to 
-    # integer.
-    quantize_spec_list = ["1."]
-    for d in range(decimal_places):
-        quantize_spec_list.append("0")
-    quantize_spec_string = "".join(quantize_spec_list)
-    quantized_value = value.quantize(Decimal(quantize_spec_string))
-    return int(quantized_value * Decimal(factor))
+    return get_money(app_config).decimal_to_int(value)
 
 def monetary_float_to_int(value, app_config):
     '''Convert a float representation of a monetary quantity, e.g., a price 
@@ -172,17 +388,7 @@ def monetary_float_to_int(value, app_config):
     :raises: AssertionError if value is not a Decimal.
     '''
     assert type(value) == float
-    # Calculate the factor from the configured decimal places.
-    decimal_places = int(app_config.locale.currency_decimal_places)
-    factor = 10 ** decimal_places
-    # Round the value the correct number of decimal places before converting to 
-    # integer.
-    quantize_spec_list = ["1."]
-    for d in range(decimal_places):
-        quantize_spec_list.append("0")
-    quantize_spec_string = "".join(quantize_spec_list)
-    quantized_value = Decimal(value).quantize(Decimal(quantize_spec_string))
-    return int(quantized_value * Decimal(factor))
+    return get_money(app_config).float_to_int(value)
 
 if __name__ == '__main__':
     # Test percentage_int_to_decimal
@@ -250,4 +456,72 @@ if __name__ == '__main__':
     print("Testing that monetary_decimal_to_int converts 1.2345 to 12345 when "
           "currency decimal places is 4...")
     assert monetary_decimal_to_int(Decimal("1.2345"), test_app_config) == 12345 
-    print("Pass")
\ No newline at end of file
+    print("Pass")
+    
+    # Test the batched conversions
+    test_app_config.locale.currency_decimal_places = 2
+    print("Testing that the batched conversions match the single value "
+          "conversions...")
+    money = get_money(test_app_config)
+    int_values = list(range(-1000, 1000, 7))
+    decimal_values = money.ints_to_decimals(int_values)
+    assert decimal_values == [monetary_int_to_decimal(value, test_app_config)
+                              for value in int_values]
+    assert money.decimals_to_ints(decimal_values) == int_values
+    assert money.scaled_ints_to_decimals([123456]) == [Decimal("12.3456")]
+    print("Pass")
+    
+    # Test the formatting
+    print("Testing that format_int formats 123456789 as \"R 1,234,567.89\" "
+          "when the currency symbol is R...")
+    assert Money(2, "R").format_int(123456789) == "R 1,234,567.89"
+    print("Pass")
+    print("Testing that format_scaled_int formats 1234560 as \"{$} 12.346\" "
+          "when the currency symbol is {$} and decimal places is 3...")
+    assert Money(3, "{$}").format_scaled_int(1234560) == "{$} 12.346"
+    print("Pass")
+    
+    # Compare the cost per value of the conversions before and after the 
+    # factor and quantizer were calculated once per currency.
+    import timeit
+    
+    def legacy_monetary_int_to_decimal(value, app_config):
+        decimal_places = int(app_config.locale.currency_decimal_places)
+        factor = 10 ** decimal_places
+        return Decimal(value) / Decimal(factor)
+    
+    def legacy_monetary_decimal_to_int(value, app_config):
+        decimal_places = int(app_config.locale.currency_decimal_places)
+        factor = 10 ** decimal_places
+        quantize_spec_list = ["1."]
+        for d in range(decimal_places):
+            quantize_spec_list.append("0")
+        quantize_spec_string = "".join(quantize_spec_list)
+        quantized_value = value.quantize(Decimal(quantize_spec_string))
+        return int(quantized_value * Decimal(factor))
+    
+    num_values = 100000
+    int_values = [(value * 7919) % 10000000 for value in range(num_values)]
+    decimal_values = money.ints_to_decimals(int_values)
+    print("Cost per value of {} conversions:".format(num_values))
+    for name, function in (
+            ("int to decimal, before",
+             lambda: [legacy_monetary_int_to_decimal(value, test_app_config) 
+                      for value in int_values]),
+            ("int to decimal, after", 
+             lambda: [monetary_int_to_decimal(value, test_app_config) 
+                      for value in int_values]),
+            ("int to decimal, after, batched", 
+             lambda: get_money(test_app_config).ints_to_decimals(int_values)),
+            ("decimal to int, before", 
+             lambda: [legacy_monetary_decimal_to_int(value, test_app_config) 
+                      for value in decimal_values]),
+            ("decimal to int, after", 
+             lambda: [monetary_decimal_to_int(value, test_app_config) 
+                      for value in decimal_values]),
+            ("decimal to int, after, batched", 
+             lambda: get_money(test_app_config).decimals_to_ints(
+                                                            decimal_values))):
+        seconds = min(timeit.repeat(function, number=1, repeat=5))
+        print("    {:32} {:6.0f} ns".format(name + ":", 
+                                            seconds / num_values * 1e9))
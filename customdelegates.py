@@ -20,7 +20,7 @@ Contact: paulosvnleal@gmail.com
 from decimal import Decimal
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
-from product import Product
+from referencedata import get_reference_data
 from datavalidation import MAX_ADDRESS_LINES
 
 # The string that is added to the list of products to allow the user to request 
@@ -38,9 +38,9 @@ class ProductPartNumberEditDelegate(QItemDelegate):
         
     def createEditor(self, parent, option, index):
         self.product_part_numbers.clear()
-        with self.session.no_autoflush:
-            products = self.session.query(Product).\
-            filter(Product.supplier_id == self.purchase_order.supplier.id).all()
+        reference_data = get_reference_data(self.session)
+        products = reference_data.get_products_for_supplier(
+                                            self.purchase_order.supplier.id)
         self.product_part_numbers.append(ADD_NEW_PRODUCT_COMBO_STRING)
         for product in products:
             self.product_part_numbers.append(product.part_number)
@@ -86,9 +86,9 @@ class ProductDescriptionEditDelegate(QItemDelegate):
         
     def createEditor(self, parent, option, index):
         self.product_descriptions.clear()
-        with self.session.no_autoflush:
-            products = self.session.query(Product).\
-            filter(Product.supplier_id == self.purchase_order.supplier.id).all()
+        reference_data = get_reference_data(self.session)
+        products = reference_data.get_products_for_supplier(
+                                            self.purchase_order.supplier.id)
         self.product_descriptions.append(ADD_NEW_PRODUCT_COMBO_STRING)
         for product in products:
             self.product_descriptions.append(product.product_description)
@@ -94,7 +94,8 @@ def _table_is_in_sqlite_database(cursor, table_name):
             return True
     return False
     
-def mysql_database_exists(username, password, host, db_name):
+def mysql_database_exists(username, password, host, db_name, 
+                          port=""):
     '''Determine if a MySQL database exists.
     
     Args:
@@ -106,14 +107,15 @@ def mysql_database_exists(username, password, host, db_name):
     :type host: String
     :param db_name: The name of the MySQL database.
     :type db_name: String
+    :param port: The MySQL server port, or a blank string for the default 
+        port.
+    :type port: String
     
     Returns:
     :return: True if the database file exists. False otherwise.
     '''
     try:
-        conn = mysql.connector.connect(user=username, 
-                                       password=password, 
-                                       host=host)
+        conn = _connect_to_mysql(username, password, host, port)
         cursor = conn.cursor()
     except mysql.connector.Error as e:
         _print_mysql_connection_error(db_name, e.msg)
@@ -129,11 +131,39 @@ def mysql_database_exists(username, password, host, db_name):
     conn.close()
     return True
 
+def _connect_to_mysql(username, password, host, port):
+    '''Connect to a MySQL server.
+    
+    Args:
+    :param username: The MySQL database user name.
+    :type username: String
+    :param password: The MySQL database password.
+    :type password: String
+    :param host: The MySQL database host.
+    :type host: String
+    :param port: The MySQL server port, or a blank string for the default 
+        port.
+    :type port: String
+    
+    Returns:
+    :return: The connection.
+    :rtype: mysql.connector.connection.MySQLConnection
+    '''
+    if port:
+        return mysql.connector.connect(user=username, 
+                                       password=password, 
+                                       host=host, 
+                                       port=int(port))
+    return mysql.connector.connect(user=username, 
+                                   password=password, 
+                                   host=host)
+
 def _print_mysql_connection_error(db_name, error_message):
     logging.debug("Error connecting to MySQL database {}: {}".format(db_name, 
                                                              error_message))
 
-def mysql_connection_is_ok(username, password, host, db_name):
+def mysql_connection_is_ok(username, password, host, db_name, 
+                           port=""):
     '''Test the connection to the MySQL database.
     
     The test steps are as follows: 
@@ -150,14 +180,15 @@ def mysql_connection_is_ok(username, password, host, db_name):
     :type host: String
     :param db_name: The name of the MySQL database.
     :type db_name: String
+    :param port: The MySQL server port, or a blank string for the default 
+        port.
+    :type port: String
     
     Returns:
     :return: True if the connection test passes. False otherwise.
     '''
     try:
-        conn = mysql.connector.connect(user=username, 
-                                       password=password, 
-                                       host=host)
+        conn = _connect_to_mysql(username, password, host, port)
         cursor = conn.cursor()
     except mysql.connector.Error as e:
         _print_mysql_connection_error(db_name, e.msg)
@@ -202,7 +233,8 @@ def _table_is_in_mysql_database(cursor, table_name):
             return True
     return False
 
-def create_mysql_database_if_required(username, password, host, db_name):
+def create_mysql_database_if_required(username, password, host, db_name, 
+                                      port=""):
     '''Create a MySQL database if it does not yet exist.
     
     Args:
@@ -214,14 +246,15 @@ def create_mysql_database_if_required(username, password, host, db_name):
     :type host: String
     :param db_name: The name of the MySQL database.
     :type db_name: String
+    :param port: The MySQL server port, or a blank string for the default 
+        port.
+    :type port: String
     
     Returns:
     :return: True if processing successful. False if an error occurs. 
     '''
     try:
-        conn = mysql.connector.connect(user=username, 
-                                       password=password, 
-                                       host=host)
+        conn = _connect_to_mysql(username, password, host, port)
         cursor = conn.cursor()
     except mysql.connector.Error as e:
         _print_mysql_connection_error(db_name, e.msg)
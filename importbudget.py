@@ -0,0 +1,144 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import os
+import subprocess
+import sys
+
+
+# The modules that must not be imported before the main window is shown. 
+# Refer to the comment on the imports in mainwindow.py.
+DEFERRED_MODULES = ["reportlab", "pdfreports", "reportsdialog", "configwizard"]
+
+# The budget for importing everything the main window needs, in milliseconds.
+DEFAULT_BUDGET_MS = 1500
+
+# The statement that is timed. A QApplication is created first, as in main.py,
+# since importing the modules that read the config file may show message 
+# boxes.
+_IMPORT_STATEMENT = ("import sys; "
+                     "from PyQt4.QtGui import QApplication; "
+                     "app = QApplication(sys.argv); "
+                     "import mainwindow")
+
+
+def parse_import_times(importtime_output):
+    '''Parse the output of ``python -X importtime``.
+    
+    Args:
+    :param importtime_output: The output written to stderr.
+    :type importtime_output: String
+    
+    Returns:
+    :return: The module name, self time and cumulative time of each top level 
+        import, in microseconds, and the names of all the modules imported.
+    :rtype: Tuple of a list of (String, Integer, Integer) tuples and a set of
+        strings
+    '''
+    top_level_imports = []
+    imported_modules = set()
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # The header line.
+            continue
+        name = fields[2].rstrip()
+        module_name = name.strip()
+        imported_modules.add(module_name)
+        # Nested imports are indented under the module that imported them.
+        if name.startswith(" ") and not name.startswith("  "):
+            top_level_imports.append((module_name, 
+                                      int(fields[0]), 
+                                      int(fields[1])))
+    return top_level_imports, imported_modules
+
+def measure_main_window_imports():
+    '''Measure the imports of the main window in a new interpreter.
+    
+    Returns:
+    :return: The top level imports and the names of all the modules imported.
+        Refer to :func:`parse_import_times`.
+    :rtype: Tuple of a list of (String, Integer, Integer) tuples and a set of
+        strings
+    
+    Raises:
+    :raises: subprocess.CalledProcessError if the imports fail.
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", 
+                             _IMPORT_STATEMENT],
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True,
+                            check=True)
+    return parse_import_times(result.stderr)
+
+def check_import_budget(budget_ms=DEFAULT_BUDGET_MS):
+    '''Check that the main window imports within the budget, and that the 
+    deferred modules are not imported.
+    
+    Args:
+    :param budget_ms: The budget in milliseconds.
+    :type budget_ms: Integer
+    
+    Returns:
+    :return: The problems found, which is empty if the check passed, and a 
+        report of the slowest imports.
+    :rtype: Tuple of a list of strings and a string
+    '''
+    top_level_imports, imported_modules = measure_main_window_imports()
+    total_ms = sum(cumulative for (_, _, cumulative) in top_level_imports) / \
+               1000
+    problems = []
+    if total_ms > budget_ms:
+        problems.append(("Importing the main window took {:.0f} ms, which is "
+                         "over the budget of {} ms.").format(total_ms, 
+                                                            budget_ms))
+    for module_name in DEFERRED_MODULES:
+        if module_name in imported_modules:
+            problems.append(("{} was imported before the main window was "
+                             "shown.").format(module_name))
+    slowest_imports = sorted(top_level_imports, key=lambda i: i[2], 
+                             reverse=True)[:10]
+    report_lines = ["Importing the main window took {:.0f} ms. Slowest top "
+                    "level imports:".format(total_ms)]
+    for module_name, _, cumulative in slowest_imports:
+        report_lines.append("  {:>8.1f} ms  {}".format(cumulative / 1000, 
+                                                      module_name))
+    return problems, "\n".join(report_lines)
+
+if __name__ == '__main__':
+    # Run the check, optionally with the budget in milliseconds as the first
+    # argument. The exit code is 1 if the check fails.
+    if len(sys.argv) > 1:
+        budget_ms = int(sys.argv[1])
+    else:
+        budget_ms = DEFAULT_BUDGET_MS
+    print("Testing that the main window imports within {} ms without "
+          "importing {}...".format(budget_ms, ", ".join(DEFERRED_MODULES)))
+    problems, report = check_import_budget(budget_ms)
+    print(report)
+    if problems:
+        for problem in problems:
+            print(problem)
+        print("Fail")
+        sys.exit(1)
+    print("Pass")
@@ -0,0 +1,264 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+from PyQt4.QtCore import *
+from PyQt4.QtGui import *
+
+
+class IncrementalTableModel(QAbstractTableModel):
+    '''Base data model for tables whose rows are loaded from the database in
+    pages.
+    
+    Rows are loaded in primary key order, PAGE_SIZE rows at a time, using 
+    keyset pagination, i.e., each page is queried for the rows with a primary 
+    key greater than the last one loaded. Views request further pages through 
+    :meth:`canFetchMore` and :meth:`fetchMore` as they are scrolled. The 
+    number of rows in the database is counted once, when the model is 
+    created.
+    
+    Subclasses provide the mapped class and, if the rows must be filtered, 
+    override :meth:`_base_query`. Subclasses that display related objects 
+    override :meth:`_apply_loader_options` so that they are loaded with the 
+    page. New rows must be added using :meth:`_append_new_row`.
+    '''
+    
+    # Number of rows loaded per page.
+    PAGE_SIZE = 256
+    
+    def __init__(self, session, mapped_class, parent=None):
+        '''Initialise the IncrementalTableModel object.
+        
+        Counts the rows in the database and loads the first page.
+        
+        Args:
+        :param session: The SQLAlchemny session in use. 
+        :type session: Session object (the class created by the call to  
+            :func:`sessionmaker` in :mod:`sqlasession`).
+        :param mapped_class: The SQLAlchemy class of the rows. It must have an
+            integer primary key called id.
+        :type mapped_class: Subclass of sqlabase.Base
+        :param parent: The model's parent.
+        :type parent: QObject
+        '''
+        super().__init__(parent=parent)
+        self.session = session
+        self._mapped_class = mapped_class
+        # The loaded rows, followed by any rows added using the model.
+        self._rows = []
+        # The loaded and added rows, used to avoid loading an added row again 
+        # once it has been flushed to the database.
+        self._row_set = set()
+        # Primary key of the last row loaded from the database.
+        self._last_key = None
+        # True when all the rows in the database have been loaded.
+        self._exhausted = False
+        self._num_added_rows = 0
+        with self.session.no_autoflush:
+            self._num_database_rows = self._base_query().\
+                                        order_by(None).count()
+        self.fetchMore()
+        
+    def _base_query(self):
+        '''Get the query for all the rows of the model.
+        
+        Subclasses override this method to filter the rows. The query must not 
+        be ordered, because the pages are ordered by primary key.
+        
+        Returns:
+        :return: The query for all the rows of the model.
+        :rtype: sqlalchemy.orm.query.Query
+        '''
+        return self.session.query(self._mapped_class)
+    
+    def _apply_loader_options(self, query):
+        '''Apply loader options for the relationships read by :meth:`data`.
+        
+        The options are only applied to the queries that load pages of rows.
+        
+        Args:
+        :param query: The query that loads a page of rows.
+        :type query: sqlalchemy.orm.query.Query
+        
+        Returns:
+        :return: The query with the loader options applied.
+        :rtype: sqlalchemy.orm.query.Query
+        '''
+        return query
+    
+    def _remaining_rows_query(self):
+        '''Get the query for the rows not loaded yet, in primary key order.
+        
+        Returns:
+        :return: The query for the rows not loaded yet.
+        :rtype: sqlalchemy.orm.query.Query
+        '''
+        key = self._mapped_class.id
+        query = self._base_query()
+        if self._last_key is not None:
+            query = query.filter(key > self._last_key)
+        return query.order_by(key)
+        
+    def rowCount(self, index=QModelIndex()):
+        '''Refer to QAbstractItemModel.rowCount.
+        
+        Only the rows loaded so far are counted. Refer to 
+        :meth:`total_row_count`.
+        '''
+        return len(self._rows)
+    
+    def total_row_count(self):
+        '''Get the number of rows in the model, including those not loaded yet.
+        
+        The count of the rows in the database is the one taken when the model 
+        was created.
+        
+        Returns:
+        :return: The number of rows in the model.
+        :rtype: Integer
+        '''
+        return max(self._num_database_rows + self._num_added_rows, 
+                   self.rowCount())
+    
+    def canFetchMore(self, index=QModelIndex()):
+        '''Refer to QAbstractItemModel.canFetchMore.
+        '''
+        if index.isValid():
+            return False
+        return not self._exhausted
+    
+    def fetchMore(self, index=QModelIndex()):
+        '''Refer to QAbstractItemModel.fetchMore.
+        
+        Loads the next page of rows.
+        '''
+        if index.isValid() or self._exhausted:
+            return
+        with self.session.no_autoflush:
+            query = self._apply_loader_options(self._remaining_rows_query())
+            page = query.limit(self.PAGE_SIZE).all()
+        if len(page) < self.PAGE_SIZE:
+            self._exhausted = True
+        if page:
+            self._last_key = page[-1].id
+        new_rows = [row for row in page if row not in self._row_set]
+        if new_rows:
+            position = self.rowCount()
+            self.beginInsertRows(QModelIndex(), position, 
+                                 position + len(new_rows) - 1)
+            self._rows.extend(new_rows)
+            self._row_set.update(new_rows)
+            self.endInsertRows()
+            
+    def fetch_to_row(self, row):
+        '''Load pages until the specified row is loaded, or all rows are.
+        
+        Args:
+        :param row: The row that must be loaded.
+        :type row: Integer
+        '''
+        while row >= self.rowCount() and not self._exhausted:
+            self.fetchMore()
+    
+    def fetch_all(self):
+        '''Load all the rows not loaded yet.
+        '''
+        while not self._exhausted:
+            self.fetchMore()
+            
+    def _append_new_row(self, row):
+        '''Append a row added using the model to the local list of rows.
+        
+        Must be called between beginInsertRows and endInsertRows.
+        
+        Args:
+        :param row: The new row.
+        :type row: The model's mapped class.
+        '''
+        self._rows.append(row)
+        self._row_set.add(row)
+        self._num_added_rows += 1
+        
+    def _get_column_values(self, column):
+        '''Get the values of a column for all the rows in the model.
+        
+        The values of loaded rows are taken from the local list, so that 
+        changes not saved yet are included. The values of the rows not loaded 
+        yet are queried without loading the rows.
+        
+        Args:
+        :param column: The column, e.g., Supplier.company_name.
+        :type column: sqlalchemy.orm.attributes.InstrumentedAttribute
+        
+        Returns:
+        :return: The column values.
+        :rtype: List
+        '''
+        values = [getattr(row, column.key) for row in self._rows]
+        if not self._exhausted:
+            key = self._mapped_class.id
+            # Rows added using the model may have been flushed already, in 
+            # which case their values have been taken from the local list.
+            added_keys = [row.id for row in self._rows 
+                          if row.id is not None and \
+                             (self._last_key is None or \
+                              row.id > self._last_key)]
+            with self.session.no_autoflush:
+                query = self._remaining_rows_query()
+                if added_keys:
+                    query = query.filter(~key.in_(added_keys))
+                query = query.with_entities(column)
+                values.extend(value for (value,) in query)
+        return values
+
+if __name__ == '__main__':
+    # Show that creating a model takes time bounded by the page size rather 
+    # than by the table size, using an in-memory SQLite database.
+    import time
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlabase import Base
+    from project import Project
+    
+    print("Rows in table | Load all (s) | Create model (s) | Fetch all (s)")
+    for num_rows in (2000, 20000, 200000):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        engine.execute(Project.__table__.insert(), 
+                       [{"code": "P{:05d}".format(i % 100000), 
+                         "description": "Project {}".format(i),
+                         "completed": False} for i in range(num_rows)])
+        session = sessionmaker(bind=engine)()
+        start = time.perf_counter()
+        session.query(Project).all()
+        load_all_time = time.perf_counter() - start
+        session.expunge_all()
+        start = time.perf_counter()
+        model = IncrementalTableModel(session, Project)
+        create_time = time.perf_counter() - start
+        assert model.rowCount() == IncrementalTableModel.PAGE_SIZE
+        assert model.total_row_count() == num_rows
+        start = time.perf_counter()
+        model.fetch_all()
+        fetch_all_time = time.perf_counter() - start
+        assert model.rowCount() == num_rows
+        print("{:13d} | {:12.3f} | {:16.4f} | {:13.3f}".format(num_rows,
+                                                              load_all_time,
+                                                              create_time,
+                                                              fetch_all_time))
+        session.close()
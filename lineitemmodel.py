@@ -18,26 +18,35 @@ Contact: paulosvnleal@gmail.com
 '''
 
 import logging
-from decimal import Decimal
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
-from conversions import (monetary_int_to_decimal, monetary_decimal_to_int,
+from conversions import (get_money, monetary_decimal_to_int,
                          monetary_float_to_int, percentage_int_to_decimal, 
                          percentage_decimal_to_int)
 from customdelegates import ADD_NEW_PRODUCT_COMBO_STRING
 from datavalidation import show_error_product_already_on_po
+from lineitemtotals import line_price_int, line_price_sum_to_decimal
 from product import Product
 from purchaseorderproduct import PurchaseOrderProduct
+from rowcache import RowDisplayCache
 from userconfigmodel import UserConfigReader
 
 
+# Set to True while working on this model to check the running total of the 
+# line prices against a full recalculation after every change. The check 
+# loops over all of the line items, so it is off by default.
+CHECK_RUNNING_TOTAL = False
+
+
 class ValidPurchaseOrderProduct(object):
-    '''Groups a PurchaseOrderProduct object with a validity.
+    '''Groups a PurchaseOrderProduct object with a validity, and with its
+    integer line price as last added to the model's running total.
     '''
     
     def __init__(self, po_product, valid):
         self.po_product = po_product
         self.valid = valid
+        self.line_price = 0
         
     def __repr__(self):
         return ("<ValidPurchaseOrderProduct(valid=%s,"
@@ -77,6 +86,13 @@ class LineItemModel(QAbstractTableModel):
         self.app_config = app_config
         self._po = None
         self._po_prod_buffer = []
+        # The sum of the integer line prices of the local list of products, 
+        # kept up to date as line items change. Refer to 
+        # lineitemtotals.line_price_int.
+        self._total_line_price = 0
+        # The display values of the rows, which are formatted once and reused
+        # until the row changes.
+        self._display_cache = RowDisplayCache(self, self._format_row)
         self.reset_model(purchase_order)
         self.add_new_product_requested = pyqtSignal()
             
@@ -106,6 +122,7 @@ class LineItemModel(QAbstractTableModel):
         for entry in self._po.products:
             self._po_prod_buffer.append(ValidPurchaseOrderProduct(entry,
                                                                   True))
+        self._recalculate_running_total()
         # Always have one (empty) line item at the end.
         self.restore_empty_row()
         self.endResetModel()
@@ -116,13 +133,43 @@ class LineItemModel(QAbstractTableModel):
         The method clears the active purchase order's list of products, and 
         then loops through the local list of products and adds each of the 
         valid products to the purchase order's list of products.
+        
+        Line items that were removed are deleted from the database first. A 
+        flush does its inserts before its deletes, so a product that was 
+        removed and added again would otherwise violate the unique 
+        (purchase_order_id, product_id) index.
         '''
         if self._po:
+            kept_po_products = set(entry.po_product for entry in 
+                                   self._po_prod_buffer if entry.valid is True)
+            removed_po_products = [po_product for po_product in 
+                                   self._po.products 
+                                   if po_product not in kept_po_products]
+            if removed_po_products:
+                for po_product in removed_po_products:
+                    self._po.products.remove(po_product)
+                self.session.flush()
             self._po.products.clear()
             for entry in self._po_prod_buffer:
                 if entry.valid is True:
                     self._po.products.append(entry.po_product)
     
+    def do_post_rollback_processing(self):
+        '''Perform all processing required after a session rollback.
+        
+        The rollback expires the line items and restores the saved list of 
+        them, so the local list of products is reloaded from the purchase 
+        order. This loads the line items with one query, rather than one per
+        line item when the running total is recalculated, and also brings 
+        back line items that were removed.
+        '''
+        self.reset_model(self._po)
+        
+    def refresh_display(self):
+        '''Format all of the rows again, e.g., after products have been edited.
+        '''
+        self._display_cache.refresh()
+    
     def prepare_for_supplier_change(self):
         pass
             
@@ -142,38 +189,12 @@ class LineItemModel(QAbstractTableModel):
         if not index.isValid() or \
         not (0 <= index.row() < self.rowCount()):
             return None
-        po_product = self._po_prod_buffer[index.row()].po_product
+        entry = self._po_prod_buffer[index.row()]
+        po_product = entry.po_product
         column = index.column()
         if role == Qt.DisplayRole:
-            if column == self.PART_NUMBER_COLUMN:
-                if po_product.product:
-                    return po_product.product.part_number
-                else:
-                    return None
-            elif column == self.DESCRIPTION_COLUMN:
-                if po_product.product:
-                    return po_product.product.product_description
-                else:
-                    return None
-            elif column == self.UNIT_PRICE_COLUMN:
-                converted_value = monetary_int_to_decimal(po_product.unit_price, 
-                                                          self.app_config)
-                return "R {:,.2f}".format(converted_value)
-            elif column == self.DISCOUNT_COLUMN:
-                converted_value = percentage_int_to_decimal(po_product.discount)
-                return "{:2.0%}".format(converted_value)
-            elif column == self.QUANTITY_COLUMN:
-                return po_product.quantity
-            elif column == self.LINE_PRICE_COLUMN:
-                converted_unit_price = monetary_int_to_decimal(
-                                                        po_product.unit_price,
-                                                        self.app_config)
-                converted_discount = percentage_int_to_decimal(
-                                                        po_product.discount)
-                line_price = self._calculate_line_price(converted_unit_price, 
-                                                        converted_discount, 
-                                                        po_product.quantity)
-                return "R {:,.2f}".format(line_price)
+            if 0 <= column < self.LINE_ITEM_NUM_COLUMNS:
+                return self._display_cache.get(index.row())[column]
             else:
                 return None
         elif role == Qt.EditRole:
@@ -188,8 +209,8 @@ class LineItemModel(QAbstractTableModel):
                 else:
                     return None
             elif column == self.UNIT_PRICE_COLUMN:
-                converted_value = monetary_int_to_decimal(po_product.unit_price, 
-                                                          self.app_config)
+                converted_value = get_money(self.app_config).int_to_decimal(
+                                                        po_product.unit_price)
                 return float(converted_value)
             elif column == self.DISCOUNT_COLUMN:
                 converted_value = percentage_int_to_decimal(po_product.discount)
@@ -197,15 +218,8 @@ class LineItemModel(QAbstractTableModel):
             elif column == self.QUANTITY_COLUMN:
                 return po_product.quantity
             elif column == self.LINE_PRICE_COLUMN:
-                converted_unit_price = monetary_int_to_decimal(
-                                                        po_product.unit_price,
-                                                        self.app_config)
-                converted_discount = percentage_int_to_decimal(
-                                                        po_product.discount)
-                line_price = self._calculate_line_price(converted_unit_price, 
-                                                        converted_discount, 
-                                                        po_product.quantity)
-                return line_price
+                return get_money(self.app_config).scaled_int_to_decimal(
+                                                            entry.line_price)
             else:
                 return None
         elif role == Qt.TextAlignmentRole:
@@ -222,6 +236,37 @@ class LineItemModel(QAbstractTableModel):
         else:
             return None
         
+    def _format_row(self, row):
+        '''Format the display values of a row, for the display cache.
+        
+        Args:
+        :param row: The row.
+        :type row: Integer
+        
+        Returns:
+        :return: The part number, description, unit price, discount, quantity
+            and line price.
+        :rtype: Tuple
+        '''
+        entry = self._po_prod_buffer[row]
+        po_product = entry.po_product
+        money = get_money(self.app_config)
+        discount = percentage_int_to_decimal(po_product.discount)
+        if po_product.product:
+            part_number = po_product.product.part_number
+            description = po_product.product.product_description
+        else:
+            part_number = None
+            description = None
+        # The integer line price is kept up to date with the running total, 
+        # and is only converted to decimal for display.
+        return (part_number,
+                description,
+                money.format_int(po_product.unit_price),
+                "{:2.0%}".format(discount),
+                po_product.quantity,
+                money.format_scaled_int(entry.line_price))
+
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         '''Refer to QAbstractItemModel.headerData.
         '''
@@ -346,6 +391,7 @@ class LineItemModel(QAbstractTableModel):
             self._po_prod_buffer[row].po_product.discount = \
                 product.current_discount
             self._po_prod_buffer[row].valid = True
+            self._update_line_price(row)
             # If a valid part  number has been selected in the last row then 
             # add another row.
             if row == self.rowCount() - 1:
@@ -491,6 +537,7 @@ class LineItemModel(QAbstractTableModel):
             self._po_prod_buffer[row].po_product.discount = \
                 product.current_discount
             self._po_prod_buffer[row].valid = True
+            self._update_line_price(row)
             # If a valid part number has been selected in the last 
             # row then add another row.
             if row == self.rowCount() - 1:
@@ -653,6 +700,7 @@ class LineItemModel(QAbstractTableModel):
             elif column == self.QUANTITY_COLUMN:
                 self._po_prod_buffer[row].po_product.quantity = \
                                                     converted_requested_value
+            self._update_line_price(row)
             # Emit the data changed signal.
             self.emit(SIGNAL("dataChanged(QModelIndex,QModelIndex)"),
                       index, index)
@@ -675,6 +723,7 @@ class LineItemModel(QAbstractTableModel):
                                        quantity=1)
         # Inserted purchase order product starts out invalid.
         self._po_prod_buffer.append(ValidPurchaseOrderProduct(po_prod, False))
+        self._update_line_price(position)
         self.endInsertRows()
         return True
     
@@ -682,8 +731,12 @@ class LineItemModel(QAbstractTableModel):
         '''Refer to QAbstractItemModel.removeRows.
         '''
         self.beginRemoveRows(QModelIndex(), position, position + rows - 1)
+        removed_entries = self._po_prod_buffer[position:position + rows]
         self._po_prod_buffer = self._po_prod_buffer[:position] + \
                                 self._po_prod_buffer[position + rows:]
+        for entry in removed_entries:
+            self._total_line_price -= entry.line_price
+        self._check_running_total()
         self.endRemoveRows()
         return True
     
@@ -699,6 +752,7 @@ class LineItemModel(QAbstractTableModel):
         if self.rowCount() > 0:
             self.beginRemoveRows(QModelIndex(), 0, self.rowCount() - 1)
             self._po_prod_buffer.clear()
+            self._total_line_price = 0
             self._po.products.clear()
             self.endRemoveRows()
     
@@ -713,54 +767,81 @@ class LineItemModel(QAbstractTableModel):
         '''
         self.insertRows(self.rowCount())
     
-    def _calculate_line_price(self, unit_price, discount, quantity):
-        '''Calculate the line total of a line item.
+    def _recalculate_running_total(self):
+        '''Recalculate the integer line price of every line item, and the 
+        running total, from the line items' current values.
+        '''
+        self._total_line_price = 0
+        for entry in self._po_prod_buffer:
+            entry.line_price = line_price_int(entry.po_product.unit_price,
+                                              entry.po_product.discount,
+                                              entry.po_product.quantity)
+            self._total_line_price += entry.line_price
+        
+    def _update_line_price(self, row):
+        '''Recalculate the integer line price of a line item after it has 
+        changed, and apply the difference to the running total.
         
         Args:
-        :param unit_price: Line item product's unit price.
-        :type unit_price: Decimal
-        :param discount: Line item product's discount.
-        :type discount: Decimal 
-        :param quantity: Line item quantity.
-        :type quantity: Integer
+        :param row: The row of the line item.
+        :type row: Integer
+        '''
+        entry = self._po_prod_buffer[row]
+        line_price = line_price_int(entry.po_product.unit_price,
+                                    entry.po_product.discount,
+                                    entry.po_product.quantity)
+        self._total_line_price += line_price - entry.line_price
+        entry.line_price = line_price
+        self._check_running_total()
+        
+    def _check_running_total(self):
+        '''Check the running total against a full recalculation, if 
+        CHECK_RUNNING_TOTAL is set.
         
-        Returns:
-        :return: The line total value.
-        :rtype: Decimal
+        Raises:
+        :raises: AssertionError if the running total is wrong.
         '''
-        line_price = (unit_price - (unit_price * discount)) * Decimal(quantity)
-        return line_price
+        if not CHECK_RUNNING_TOTAL:
+            return
+        total_price = 0
+        for entry in self._po_prod_buffer:
+            total_price += line_price_int(entry.po_product.unit_price,
+                                          entry.po_product.discount,
+                                          entry.po_product.quantity)
+        assert total_price == self._total_line_price, \
+            ("The running total of the line prices is {}, but they add up to "
+             "{}.").format(self._total_line_price, total_price)
 
     def calculate_total_excluding_tax(self):
         '''Calculate the total price of the active purchase order's line items
         excluding tax. 
         
+        The line items in the local list may not have been saved yet, so they
+        are totalled here rather than by the database. The total is kept up to
+        date in integers as line items change, and converted to decimal here.
+        
         Returns:
         :return: Total price of the active purchase order's line items 
             excluding tax
         :rtype: Decimal
         '''
-        total_price = Decimal("0.0")
-        for entry in self._po_prod_buffer:
-            converted_unit_price = monetary_int_to_decimal(
-                                                entry.po_product.unit_price,
-                                                self.app_config)
-            converted_discount = percentage_int_to_decimal(
-                                                entry.po_product.discount)
-            total_price += self._calculate_line_price(
-                                                converted_unit_price, 
-                                                converted_discount, 
-                                                entry.po_product.quantity)
-        return total_price
+        return line_price_sum_to_decimal(self._total_line_price, 
+                                         self.app_config)
     
-    def calculate_total_tax(self):
+    def calculate_total_tax(self, total_price=None):
         '''Calculate the total tax of the active purchase order's line items.
         
+        Args:
+        :param total_price: The total price excluding tax, if it has already
+            been calculated, or None.
+        :type total_price: Decimal
+        
         Returns:
         :return: Total tax of the active purchase order's line items.
         :rtype: Decimal
         '''
-        total_price = self.calculate_total_excluding_tax()
+        if total_price is None:
+            total_price = self.calculate_total_excluding_tax()
         # Create a reader to access the latest user config.
         user_config = UserConfigReader(self.session)
         total_tax = total_price * user_config.locale.tax_rate
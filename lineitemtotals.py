@@ -0,0 +1,127 @@
+'''
+POdB: A purchase order management system for small businesses
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+from decimal import Decimal
+from sqlalchemy import func
+from conversions import get_money
+from purchaseorderproduct import PurchaseOrderProduct
+
+# The line price of a line item as an integer expression. Unit prices are stored
+# as integers in the currency's minor unit and discounts as integer
+# percentages, so the result is the line price in minor units multiplied by 100.
+# Keeping the calculation in integers allows the database to sum the line
+# prices exactly.
+LINE_PRICE_EXPRESSION = PurchaseOrderProduct.unit_price * \
+                        (100 - PurchaseOrderProduct.discount) * \
+                        PurchaseOrderProduct.quantity
+
+
+def line_price_int(unit_price, discount, quantity):
+    '''Calculate the integer line price of a single line item.
+
+    This is the Python counterpart of LINE_PRICE_EXPRESSION, for line items
+    that have not been saved to the database yet.
+
+    Args:
+    :param unit_price: The unit price, as stored in the database.
+    :type unit_price: Integer
+    :param discount: The discount, as stored in the database.
+    :type discount: Integer
+    :param quantity: The quantity.
+    :type quantity: Integer
+
+    Returns:
+    :return: The line price in minor units multiplied by 100.
+    :rtype: Integer
+    '''
+    return unit_price * (100 - discount) * quantity
+
+def sum_line_prices(query):
+    '''Sum the integer line prices of the line items selected by a query.
+
+    The sum is calculated by the database. The query's entities are replaced
+    by the sum, but its joins and filters are kept, so any query that selects
+    PurchaseOrderProduct objects can be used, e.g., a report query. The query
+    must not have loader options applied.
+
+    Args:
+    :param query: A query that selects PurchaseOrderProduct objects.
+    :type query: sqlalchemy.orm.query.Query
+
+    Returns:
+    :return: The sum of the line prices in minor units multiplied by 100.
+    :rtype: Integer
+    '''
+    total = query.order_by(None).\
+                with_entities(func.coalesce(func.sum(LINE_PRICE_EXPRESSION),
+                                            0)).\
+                scalar()
+    return int(total)
+
+def sum_purchase_order_line_prices(session, purchase_order_id):
+    '''Sum the integer line prices of the line items saved on a purchase order.
+
+    Args:
+    :param session: The SQLAlchemny session in use.
+    :type session: Session object (the class created by the call to
+        :func:`sessionmaker` in :mod:`sqlasession`).
+    :param purchase_order_id: The id of the purchase order.
+    :type purchase_order_id: Integer
+
+    Returns:
+    :return: The sum of the line prices in minor units multiplied by 100.
+    :rtype: Integer
+    '''
+    query = session.query(PurchaseOrderProduct).\
+                filter(PurchaseOrderProduct.purchase_order_id == \
+                       purchase_order_id)
+    return sum_line_prices(query)
+
+def line_price_sum_to_decimal(value, app_config):
+    '''Convert an integer line price, or a sum of them, to a decimal type.
+
+    Args:
+    :param value: The line price in minor units multiplied by 100.
+    :type value: Integer
+    :param app_config: The application configuration in use.
+    :type app_confg: appconfig.ConfigFile
+
+    Returns:
+    :return: The line price as a decimal.
+    :rtype: Decimal
+    '''
+    return get_money(app_config).scaled_int_to_decimal(value)
+
+if __name__ == '__main__':
+    # Check that the integer line price matches the Decimal calculation used by
+    # the models.
+    from conversions import percentage_int_to_decimal
+    print("Testing that line_price_int matches the Decimal line price...")
+    for unit_price, discount, quantity in ((12345, 0, 1),
+                                           (12345, 15, 3),
+                                           (99, 99, 7),
+                                           (1, 33, 1000)):
+        converted_unit_price = Decimal(unit_price) / Decimal(100)
+        converted_discount = percentage_int_to_decimal(discount)
+        decimal_line_price = (converted_unit_price - \
+                              (converted_unit_price * converted_discount)) * \
+                             Decimal(quantity)
+        int_line_price = line_price_int(unit_price, discount, quantity)
+        assert Decimal(int_line_price) / Decimal(10000) == decimal_line_price
+    print("Pass")
@@ -23,71 +23,101 @@ import logging
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
-from dbaccess import (sqlite_database_exists, sqlite_connection_is_ok, 
-                      mysql_database_exists, mysql_connection_is_ok)
+from dbaccess import sqlite_database_exists, mysql_database_exists
+from startup import StartupTimer, probe_database
 
 
 RETURN_CODE_UNDEFINED = -1
 RETURN_CODE_INVALID_APP_CONFIG = 1
 RETURN_CODE_INVALID_USER_CONFIG = 2
+RETURN_CODE_SCHEMA_MIGRATION_FAILED = 3
 
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     logging.basicConfig(level=logging.DEBUG, 
                         format="-> %(asctime)s - %(levelname)s - %(message)s")
+    startup_timer = StartupTimer()
     start_main_window = False
-    from appconfig import app_config, app_config_ok, DatabaseSection
+    db_exists = False
+    db_connection_ok = False
+    user_config = None
+    with startup_timer.phase("config file"):
+        from appconfig import (app_config, app_config_ok, DatabaseSection,
+                               show_app_config_error)
     # Note that importing the appconfig module in the previous line created  
-    # global variables called app_config and app_config_ok.
+    # global variables called app_config and app_config_ok. Any error in the 
+    # config file is shown here.
+    show_app_config_error()
     if app_config_ok:
-        # Test the connection to the database.
-        if app_config.database.type == DatabaseSection.TYPE_SQLITE:
-            db_exists = sqlite_database_exists(
+        # Check that the database exists before creating the engine, so that 
+        # the engine is only created for a database that the config wizard 
+        # does not need to change. Neither check writes to the database.
+        with startup_timer.phase("database exists"):
+            if app_config.database.type == DatabaseSection.TYPE_SQLITE:
+                db_exists = sqlite_database_exists(
                                             app_config.database.filename)
-            if db_exists:
-                db_connection_ok = sqlite_connection_is_ok(
-                                            app_config.database.filename) 
-        elif app_config.database.type == DatabaseSection.TYPE_MYSQL:
-            db_exists = mysql_database_exists(
+            elif app_config.database.type == DatabaseSection.TYPE_MYSQL:
+                db_exists = mysql_database_exists(
                                             app_config.database.username,
                                             app_config.database.password,
                                             app_config.database.host,
-                                            app_config.database.name)
-            if db_exists:
-                db_connection_ok = mysql_connection_is_ok(
-                                            app_config.database.username,
-                                            app_config.database.password,
-                                            app_config.database.host,
-                                            app_config.database.name)
+                                            app_config.database.name,
+                                            app_config.database.port)
+        if db_exists:
+            # Test the connection to the database with a throwaway engine. The
+            # application's engine is created from the settings when the 
+            # sqlaengine module is first imported, so it must not be imported
+            # until the connection is known to work. Otherwise the config 
+            # wizard would get an engine for the settings it is replacing.
+            with startup_timer.phase("database probe"):
+                from sqlalchemy import create_engine
+                from sqlalchemy.pool import NullPool
+                probe_engine = create_engine(
+                                    app_config.database.get_engine_string(),
+                                    poolclass=NullPool)
+                db_connection_ok = probe_database(probe_engine)
+                probe_engine.dispose()
+        if db_connection_ok:
+            # Bring the database up to the current schema version, creating 
+            # the tables if required. This only reads the schema version if 
+            # the database is up to date.
+            with startup_timer.phase("schema"):
+                from sqlalchemy.exc import DBAPIError
+                from sqlaengine import engine
+                from schemamigrations import (prepare_schema, 
+                                              SchemaMigrationError)
+                try:
+                    prepare_schema(engine)
+                except DBAPIError:
+                    # The database could be reached but not used, e.g., the 
+                    # connection was lost or permission was denied. Treat it 
+                    # like a failed connection test.
+                    logging.exception("The database schema could not be "
+                                      "prepared.")
+                    db_connection_ok = False
+                except SchemaMigrationError as err:
+                    from messagebox import execute_critical_msg_box
+                    execute_critical_msg_box(
+                                        "Database Upgrade Error", 
+                                        "The database could not be upgraded.",
+                                        QMessageBox.Ok,
+                                        str(err))
+                    sys.exit(RETURN_CODE_SCHEMA_MIGRATION_FAILED)
         # Validate the configuration record in the database.
-        if db_exists and db_connection_ok:
-            # Import all the database class definitions so that SQL Alchemy
-            # knows what they are. (Ignore the "unused import" warnings in the
-            # following six lines.)
-            from product import Product
-            from project import Project
-            from purchaseorder import PurchaseOrder
-            from purchaseorderproduct import PurchaseOrderProduct
-            from supplier import Supplier
-            from userconfig import UserConfig
-            
-            from userconfigmodel import UserConfigReader
-            from sqlaengine import engine
-            from sqlabase import Base
-            Base.metadata.create_all(engine)
-            from sqlasession import session_scope
-            with session_scope() as session:
-                user_config = UserConfigReader(session)
-                if user_config.config_valid:
-                    start_main_window = True
+        if db_connection_ok:
+            with startup_timer.phase("user config"):
+                from userconfigmodel import UserConfigReader
+                from sqlasession import session_scope
+                with session_scope() as session:
+                    user_config = UserConfigReader(session)
     # In case of errors, run the configuration wizard (which will include 
     # testing the connection to the database and validating the configuration 
     # record in the database).
     return_code = RETURN_CODE_UNDEFINED
-    from configwizard import StartUpConfigWizard
     if not app_config_ok or not db_exists or not db_connection_ok \
     or not user_config.config_valid:
+        from configwizard import StartUpConfigWizard
         config_wizard = StartUpConfigWizard(app_config)
         result = config_wizard.exec_()
         if result == QWizard.Accepted:
@@ -101,15 +131,22 @@ if __name__ == '__main__':
         start_main_window = True
     if start_main_window:
         import ctypes
-        from mainwindow import MainWindow, __version__
+        with startup_timer.phase("main window imports"):
+            from mainwindow import MainWindow, __version__
         myappid = u"POdB.{}".format(__version__)
         ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
-        from sqlaengine import engine
-        from sqlabase import Base
-        Base.metadata.create_all(engine)
+        # The schema was prepared above, or by the config wizard.
         from sqlasession import session_scope
         with session_scope() as session:
-            form = MainWindow(app_config, session)
-            form.show()
+            with startup_timer.phase("main window"):
+                form = MainWindow(app_config, session)
+                form.show()
+            startup_timer.log_summary()
             return_code = app.exec_()
-    sys.exit(return_code)
\ No newline at end of file
+        from sqlaengine import pool_metrics
+        if pool_metrics:
+            pool_metrics.log_summary()
+        import pdfcache
+        if pdfcache.render_cache:
+            pdfcache.render_cache.log_summary()
+    sys.exit(return_code)
@@ -31,27 +31,24 @@ from customdelegates import (LimitedLinePlainTextEdit,
                              PercentageEditDelegate)
 
 from activepurchaseordermodel import ActivePurchaseOrderModel
+from conversions import get_money
 from lineitemmodel import LineItemModel
-from projectmodel import ProjectModel
 from purchaseorder import PO_ORDER_STATUSUS, PO_PAYMENT_TERMS
 from purchaseordermodel import PurchaseOrderModel
-from suppliermodel import SupplierModel
+from referencedata import get_reference_data
 
-from configwizard import InAppConfigWizard
-from messagebox import (execute_info_msg_box, execute_warning_msg_box, 
-                        execute_critical_msg_box)
+from messagebox import execute_info_msg_box, execute_warning_msg_box
+from pdfexportworker import PdfExport
 from productsdialog import ProductsDialog
 from projectsdialog import ProjectsDialog
 from purchaseordersdialog import PurchaseOrdersDialog
-from reportsdialog import ReportsDialog
 from suppliersdialog import SuppliersDialog
-
-from pdfreports import (PoPdf, PoPdfCompanyDetails, PoPdfOrderDetails, 
-                        PoPdfSupplierDetails, PoPdfLineItemDetails, 
-                        PoPdfDeliveryDetails, PoPdfSignatureDetails)
 from userconfigmodel import UserConfigReader
 import sqlalchemy
-import reportlab
+# The config wizard, the reports dialog and the PDF classes, which import 
+# reportlab, are imported by the methods that use them, since most sessions do 
+# not use them and importing them slows down the start-up. Refer to 
+# importbudget.py.
 
 
 __version__ = "0.1"
@@ -67,6 +64,7 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
         self.app_config = app_config
         self.active_po_model = None     
         self.po_mapper = None
+        self.pdf_export = None
         self.setupUi(self)
         self.additional_ui_setup()
         assert type(self.deliveryAddressPlainTextEdit) is QPlainTextEdit  
@@ -165,8 +163,8 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
         # signals.
         self.supplierComboBox.blockSignals(True)
         self.supplierComboBox.clear()
-        supplier_model = SupplierModel(self.app_config, self.session)
-        supplier_list = supplier_model.get_supplier_list()
+        reference_data = get_reference_data(self.session)
+        supplier_list = reference_data.suppliers.names()
         if len(supplier_list) > 0:
             for supplier in supplier_list:
                 self.supplierComboBox.addItem(supplier)
@@ -179,8 +177,8 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
         # signals.
         self.projectComboBox.blockSignals(True)
         self.projectComboBox.clear()
-        project_model = ProjectModel(self.session)
-        project_list = project_model.get_project_list()
+        reference_data = get_reference_data(self.session)
+        project_list = reference_data.projects.names()
         if len(project_list) > 0:
             for project in project_list:
                 self.projectComboBox.addItem(project)
@@ -253,34 +251,18 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
         self.po_mapper.toLast()
         
     def update_supplier_info(self):
-        # TODO: Move access to this stuff to inside the supplier model.
-        supplier_model = SupplierModel(self.app_config, self.session)
+        # The combo box lists the suppliers in the same order as the reference
+        # data.
+        suppliers = get_reference_data(self.session).suppliers.records()
         supplier_row = self.supplierComboBox.currentIndex()
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.ADDRESS_COLUMN)
-        self.supplierAddressLabel.setText(
-                                    supplier_model.data(supplier_model_index))
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.CONTACT_PERSON_NAME_COLUMN)
-        self.supplierContactLabel.setText(
-                                    supplier_model.data(supplier_model_index))
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.PHONE_NUMBER_COLUMN)
-        self.supplierPhoneLabel.setText(
-                                    supplier_model.data(supplier_model_index))
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.FAX_NUMBER_COLUMN)
-        self.supplierFaxLabel.setText(
-                                    supplier_model.data(supplier_model_index))
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.EMAIL_ADDRESS_COLUMN)
-        self.supplierEmailLabel.setText(
-                                    supplier_model.data(supplier_model_index))
+        if supplier_row < 0 or supplier_row >= len(suppliers):
+            return
+        supplier = suppliers[supplier_row]
+        self.supplierAddressLabel.setText(supplier.address)
+        self.supplierContactLabel.setText(supplier.contact_person_name)
+        self.supplierPhoneLabel.setText(supplier.phone_number)
+        self.supplierFaxLabel.setText(supplier.fax_number)
+        self.supplierEmailLabel.setText(supplier.email_address)
         
     # How the columns divide up the product table view.
     _PART_NUMBER_COLUMN_SHARE = 0.15
@@ -358,25 +340,23 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
                 self.active_po_model.line_item_model.removeRows(index.row(), 1)
             
     def update_totals(self):
+        money = get_money(self.app_config)
         self.totalExcludingTaxResultLabel.setText(
-                                    "R {:,.2f}".format(
-                                            self.active_po_model.total_price))
+                        money.format_decimal(self.active_po_model.total_price))
         self.totalTaxResultLabel.setText(
-                                    "R {:,.2f}".format(
-                                            self.active_po_model.total_tax))
+                        money.format_decimal(self.active_po_model.total_tax))
         self.totalResultLabel.setText(
-                                    "R {:,.2f}".format(
-                                            self.active_po_model.total))
+                        money.format_decimal(self.active_po_model.total))
         
     def at_least_one_supplier(self):
-        supplier_model = SupplierModel(self.app_config, self.session)
-        if supplier_model.rowCount() > 0:
+        reference_data = get_reference_data(self.session)
+        if reference_data.suppliers.count() > 0:
             return True
         return False
     
     def at_least_one_project(self):
-        project_model = ProjectModel(self.session)
-        if project_model.rowCount() > 0:
+        reference_data = get_reference_data(self.session)
+        if reference_data.projects.count() > 0:
             return True
         return False
     
@@ -649,6 +629,10 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
             self.save_all()
         else:
             self.session.rollback()
+        # The dialog may have changed the products, projects or suppliers shown
+        # by the active purchase order.
+        if self.active_po_model:
+            self.active_po_model.refresh_display()
     
     @pyqtSignature("")
     def on_clearPurchaseOrderAction_triggered(self):
@@ -708,6 +692,7 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
         self.show_save_before_editing_message_box(
                                             self.EDITABLE_STRING_CONFIG)
         # The InAppConfigWizard does not allow editing the application settings.
+        from configwizard import InAppConfigWizard
         config_wizard = InAppConfigWizard(self.app_config)
         result = config_wizard.exec_()
         
@@ -768,6 +753,10 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
                 # pressed Cancel in the file dialog. Just return.
                 return
             # The file name is valid.
+            from pdfreports import (PoPdf, PoPdfCompanyDetails, 
+                                    PoPdfOrderDetails, PoPdfSupplierDetails, 
+                                    PoPdfLineItemDetails, PoPdfDeliveryDetails,
+                                    PoPdfSignatureDetails)
             # Create a reader to access the latest user config.
             user_config = UserConfigReader(self.session)
             company_details = PoPdfCompanyDetails(
@@ -825,23 +814,31 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
                                self.notesPlainTextEdit.document().\
                                     toPlainText(),
                                signature_details,
-                               show_all_grids=False)
-            # TODO: Wrap with try except, since will raise, e.g., 
-            # FileNotFoundError.
-            try:
-                pdf_report.build()
-            except PermissionError as e:
-                execute_critical_msg_box("Permission Error", 
-                                         ("Could not open the PDF file. Make "
-                                          "sure that it is not open and the "
-                                          "try again."), 
-                                          QMessageBox.Ok,
-                                          info_text=str(e))
+                               show_all_grids=False,
+                               **self.app_config.pdf.get_pdf_options())
+            # An unchanged purchase order is copied from the render cache. The 
+            # user config version is part of the key, so the cached PDFs are 
+            # not used after the user config is edited.
+            from pdfcache import get_render_cache
+            render_cache = get_render_cache(self.app_config)
+            cache_key = None
+            if render_cache is not None:
+                cache_key = pdf_report.get_fingerprint(user_config.record_id)
+            # Build the PDF on a worker thread, so that the window stays 
+            # responsive. The details above are plain data, so the build does 
+            # not touch the models or the session.
+            self.pdf_export = PdfExport(pdf_report, 
+                                        "Export Purchase Order", 
+                                        parent=self,
+                                        render_cache=render_cache,
+                                        cache_key=cache_key)
+            self.pdf_export.start()
             
     @pyqtSignature("")
     def on_viewReportsAction_triggered(self):
         if self.prerequisites_for_reports_met() is True:
             self.show_save_before_report_access()
+            from reportsdialog import ReportsDialog
             reports_dialog = ReportsDialog(self.app_config, self.session, 
                                            self.app_config.company.name,
                                            parent=self)
@@ -857,6 +854,7 @@ class MainWindow(QMainWindow, ui_mainwindow.Ui_MainWindow):
         qt_ver = "Qt: {}".format(QT_VERSION_STR)
         pyqt_ver = "PyQt: {}".format(PYQT_VERSION_STR)
         sqla_ver = "SQL Alchemy: {}".format(sqlalchemy.__version__)
+        import reportlab
         reportlab_ver = "Reportlab: {}".format(reportlab.Version)
         warranty_line = "This program comes with ABSOLUTELY NO WARRANTY."
         license_par_1 = ("This is free software, and you are welcome to " 
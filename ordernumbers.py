@@ -0,0 +1,433 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import logging
+from collections import deque
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from purchaseorder import PurchaseOrder
+from purchaseordernumbersequence import PurchaseOrderNumberSequence
+
+
+_sequence_table = PurchaseOrderNumberSequence.__table__
+
+
+def format_order_number(prefix, number):
+    '''Format a purchase order number.
+    
+    Args:
+    :param prefix: The purchase order number prefix.
+    :type prefix: String
+    :param number: The allocated number.
+    :type number: Integer
+    
+    Returns:
+    :return: The order number in the form <Prefix>XXXXX.
+    :rtype: String
+    '''
+    return "{}{:05d}".format(prefix, number)
+
+def _get_first_unused_number(connection, prefix):
+    '''Get the number following the highest one used with a prefix.
+    
+    This is only required once per prefix, when its sequence record is 
+    created, so that databases with purchase orders numbered before the 
+    sequence table existed carry on from where they left off.
+    
+    Args:
+    :param connection: The connection to the database.
+    :type connection: sqlalchemy.engine.Connection
+    :param prefix: The purchase order number prefix.
+    :type prefix: String
+    
+    Returns:
+    :return: The first unused number.
+    :rtype: Integer
+    '''
+    po_table = PurchaseOrder.__table__
+    highest_number = 0
+    query = select([po_table.c.order_number]).\
+                where(po_table.c.order_number.startswith(prefix))
+    for (order_number,) in connection.execute(query):
+        # The prefix may contain characters that are wildcards in a LIKE 
+        # pattern, so check the match again here.
+        suffix = order_number[len(prefix):]
+        if order_number.startswith(prefix) and suffix.isdigit():
+            highest_number = max(highest_number, int(suffix))
+    return highest_number + 1
+
+def _insert_sequence(connection, prefix):
+    '''Insert the sequence record for a prefix.
+    
+    Args:
+    :param connection: The connection to the database.
+    :type connection: sqlalchemy.engine.Connection
+    :param prefix: The purchase order number prefix.
+    :type prefix: String
+    '''
+    connection.execute(_sequence_table.insert().values(
+                    prefix=prefix,
+                    next_number=_get_first_unused_number(connection, prefix)))
+
+def _allocate_sqlite(connection, prefix, count):
+    '''Allocate numbers from a prefix's sequence in a SQLite database.
+    
+    The sequence is incremented before it is read. The connection must hold 
+    SQLite's write lock, e.g., from BEGIN IMMEDIATE, or take it with the 
+    update, so that no other connection can allocate until the transaction 
+    ends.
+    
+    Args:
+    :param connection: The connection to the database, in a transaction.
+    :type connection: sqlalchemy.engine.Connection
+    :param prefix: The purchase order number prefix.
+    :type prefix: String
+    :param count: The number of numbers to allocate.
+    :type count: Integer
+    
+    Returns:
+    :return: The first allocated number.
+    :rtype: Integer
+    '''
+    increment = update(_sequence_table).\
+                    where(_sequence_table.c.prefix == prefix).\
+                    values(next_number=_sequence_table.c.next_number + count)
+    if connection.execute(increment).rowcount == 0:
+        # The write lock is held already, so no other connection can insert 
+        # the sequence record in the meantime.
+        _insert_sequence(connection, prefix)
+        connection.execute(increment)
+    next_number = connection.execute(
+                    select([_sequence_table.c.next_number]).\
+                        where(_sequence_table.c.prefix == prefix)).scalar()
+    return next_number - count
+
+def _session_holds_sqlite_write_lock(session):
+    '''Check whether the session's SQLite connection has begun writing, and so
+    holds the database's write lock.
+    
+    Args:
+    :param session: The SQLAlchemny session in use. 
+    :type session: Session object (the class created by the call to  
+        :func:`sessionmaker` in :mod:`sqlasession`).
+    
+    Returns:
+    :return: True if the session holds the write lock.
+    :rtype: Boolean
+    '''
+    # The sqlite3 module only begins a transaction before a statement that 
+    # writes, so a transaction that is in progress holds the write lock.
+    return session.connection().connection.in_transaction
+
+def _ensure_sequence(engine, prefix):
+    '''Make sure that the sequence record for a prefix exists.
+    
+    Another client may insert the record at the same time, in which case its 
+    record is used.
+    
+    Args:
+    :param engine: The SQLAlchemy engine in use.
+    :type engine: sqlalchemy.engine.Engine
+    :param prefix: The purchase order number prefix.
+    :type prefix: String
+    '''
+    with engine.connect() as connection:
+        exists = connection.execute(
+                    select([_sequence_table.c.prefix]).\
+                        where(_sequence_table.c.prefix == prefix)).scalar()
+    if exists is None:
+        try:
+            with engine.begin() as connection:
+                _insert_sequence(connection, prefix)
+        except IntegrityError:
+            pass
+
+def _allocate_with_row_lock(connection, prefix, count):
+    '''Allocate numbers from a prefix's sequence, locking its record with 
+    SELECT ... FOR UPDATE.
+    
+    Args:
+    :param connection: The connection to the database, in a transaction.
+    :type connection: sqlalchemy.engine.Connection
+    :param prefix: The purchase order number prefix.
+    :type prefix: String
+    :param count: The number of numbers to allocate.
+    :type count: Integer
+    
+    Returns:
+    :return: The first allocated number.
+    :rtype: Integer
+    '''
+    first_number = connection.execute(
+                    select([_sequence_table.c.next_number]).\
+                        where(_sequence_table.c.prefix == prefix).\
+                        with_for_update()).scalar()
+    connection.execute(update(_sequence_table).\
+                        where(_sequence_table.c.prefix == prefix).\
+                        values(next_number=first_number + count))
+    return first_number
+
+def _remove_used_order_numbers(session, order_numbers):
+    '''Remove the order numbers that are used by purchase orders already.
+    
+    The sequence of a prefix carries on from the highest number used with the
+    prefix when the sequence is created, but a number can still be used 
+    already, e.g., if it was entered by hand, or if it also starts with a 
+    longer prefix, such as "PO1" for the prefix "PO".
+    
+    Args:
+    :param session: The SQLAlchemny session in use. 
+    :type session: Session object (the class created by the call to  
+        :func:`sessionmaker` in :mod:`sqlasession`).
+    :param order_numbers: The allocated order numbers.
+    :type order_numbers: List of strings
+    
+    Returns:
+    :return: The allocated order numbers that are not used, in order.
+    :rtype: List of strings
+    '''
+    po_table = PurchaseOrder.__table__
+    used_order_numbers = set(
+                    order_number for (order_number,) in session.execute(
+                        select([po_table.c.order_number]).\
+                            where(po_table.c.order_number.in_(order_numbers))))
+    for order_number in order_numbers:
+        if order_number in used_order_numbers:
+            logging.debug(("Skipping order number {}, which is used "
+                           "already.").format(order_number))
+    return [order_number for order_number in order_numbers 
+            if order_number not in used_order_numbers]
+
+def allocate_order_numbers(session, prefix, count=1):
+    '''Allocate one or more purchase order numbers.
+    
+    The numbers are consecutive, unless a number is used by a purchase order 
+    already, in which case it is skipped. Each allocation costs one locked 
+    read and one update of the prefix's sequence record, and one indexed 
+    lookup of the allocated numbers, regardless of the number of purchase 
+    orders.
+    
+    The allocation is committed straight away in its own transaction, so that
+    the sequence record, or SQLite's database write lock, is not held while 
+    the purchase order is being edited. Numbers allocated to purchase orders 
+    that are discarded are skipped. With SQLite, the transaction begins with 
+    BEGIN IMMEDIATE, unless the session has already begun writing, in which 
+    case the allocation is part of the session's transaction, since another 
+    connection would wait for the session's write lock.
+    
+    Args:
+    :param session: The SQLAlchemny session in use. 
+    :type session: Session object (the class created by the call to  
+        :func:`sessionmaker` in :mod:`sqlasession`).
+    :param prefix: The purchase order number prefix.
+    :type prefix: String
+    :param count: The number of numbers to allocate.
+    :type count: Integer
+    
+    Returns:
+    :return: The allocated order numbers, in the form <Prefix>XXXXX.
+    :rtype: List of strings
+    
+    Raises:
+    :raises: ValueError if count is less than one.
+    '''
+    if count < 1:
+        raise ValueError("At least one order number must be allocated.")
+    bind = session.get_bind()
+    order_numbers = []
+    while len(order_numbers) < count:
+        num_required = count - len(order_numbers)
+        if bind.dialect.name == "sqlite":
+            if _session_holds_sqlite_write_lock(session):
+                first_number = _allocate_sqlite(session.connection(), prefix,
+                                                num_required)
+            else:
+                with bind.begin() as connection:
+                    # Take the write lock before reading, so that the 
+                    # allocation cannot fail part way with a deadlock.
+                    connection.execute("BEGIN IMMEDIATE")
+                    first_number = _allocate_sqlite(connection, prefix, 
+                                                    num_required)
+        else:
+            _ensure_sequence(bind, prefix)
+            with bind.begin() as connection:
+                first_number = _allocate_with_row_lock(connection, prefix, 
+                                                       num_required)
+        order_numbers.extend(_remove_used_order_numbers(
+                        session,
+                        [format_order_number(prefix, number) for number in 
+                         range(first_number, first_number + num_required)]))
+    return order_numbers
+
+
+class OrderNumberBlock(object):
+    '''Hands out purchase order numbers from blocks that are allocated in one 
+    go, for creating many purchase orders at once.
+    '''
+    
+    def __init__(self, session, prefix, block_size):
+        '''Initialise the OrderNumberBlock object.
+        
+        Args:
+        :param session: The SQLAlchemny session in use. 
+        :type session: Session object (the class created by the call to  
+            :func:`sessionmaker` in :mod:`sqlasession`).
+        :param prefix: The purchase order number prefix.
+        :type prefix: String
+        :param block_size: The number of numbers allocated at a time.
+        :type block_size: Integer
+        '''
+        self.session = session
+        self.prefix = prefix
+        self.block_size = block_size
+        self._order_numbers = deque()
+        
+    def next_order_number(self):
+        '''Get the next order number, allocating a new block if required.
+        
+        Returns:
+        :return: The order number, in the form <Prefix>XXXXX.
+        :rtype: String
+        '''
+        if not self._order_numbers:
+            self._order_numbers.extend(allocate_order_numbers(self.session,
+                                                              self.prefix,
+                                                              self.block_size))
+        return self._order_numbers.popleft()
+
+
+def _stress_test_worker(database_filename, num_allocations, block_size):
+    '''Allocate order numbers from a separate process.
+    
+    Used by the stress test below. It is defined at module level so that it 
+    can be started by multiprocessing on Windows.
+    '''
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    engine = create_engine("sqlite:///{}".format(database_filename),
+                           connect_args={"timeout": 60})
+    session = sessionmaker(bind=engine)()
+    order_numbers = []
+    if block_size == 1:
+        for i in range(num_allocations):
+            order_numbers.extend(allocate_order_numbers(session, "TST"))
+            session.commit()
+    else:
+        block = OrderNumberBlock(session, "TST", block_size)
+        for i in range(num_allocations):
+            order_numbers.append(block.next_order_number())
+            session.commit()
+    session.close()
+    return order_numbers
+
+if __name__ == '__main__':
+    # Stress test the allocation from several processes sharing a SQLite 
+    # database, and check that the allocation time does not depend on the 
+    # number of purchase orders.
+    import datetime
+    import multiprocessing
+    import os
+    import tempfile
+    import time
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlabase import Base
+    # Import the remaining database class definitions so that SQL Alchemy 
+    # knows what they are.
+    from product import Product
+    from project import Project
+    from purchaseorderproduct import PurchaseOrderProduct
+    from supplier import Supplier
+    from userconfig import UserConfig
+    
+    _NUM_PROCESSES = 8
+    _NUM_ALLOCATIONS_PER_PROCESS = 200
+    
+    database_filename = os.path.join(tempfile.mkdtemp(), "ordernumbers.db")
+    engine = create_engine("sqlite:///{}".format(database_filename))
+    Base.metadata.create_all(engine)
+    print("Testing that {} processes allocate unique, consecutive "
+          "numbers...".format(_NUM_PROCESSES))
+    pool = multiprocessing.Pool(_NUM_PROCESSES)
+    # Half the processes allocate one number at a time, and half allocate 
+    # blocks of ten.
+    results = pool.starmap(_stress_test_worker, 
+                           [(database_filename, 
+                             _NUM_ALLOCATIONS_PER_PROCESS, 
+                             1 if i % 2 == 0 else 10) 
+                            for i in range(_NUM_PROCESSES)])
+    pool.close()
+    pool.join()
+    order_numbers = [number for result in results for number in result]
+    total_allocations = _NUM_PROCESSES * _NUM_ALLOCATIONS_PER_PROCESS
+    assert len(order_numbers) == total_allocations
+    assert len(set(order_numbers)) == total_allocations
+    assert sorted(order_numbers) == [format_order_number("TST", number) for 
+                                     number in range(1, total_allocations + 1)]
+    print("Pass")
+    
+    print("Testing that order numbers that are used already are skipped...")
+    session = sessionmaker(bind=engine)()
+    next_number = total_allocations + 1
+    for number in (next_number, next_number + 2):
+        session.execute(PurchaseOrder.__table__.insert().values(
+                            order_number=format_order_number("TST", number),
+                            order_date=datetime.date(2016, 1, 1),
+                            delivery_address="Address",
+                            delivery_date=datetime.date(2016, 1, 1),
+                            payment_terms="Pay in 30 days",
+                            order_status="Placed",
+                            total_excluding_tax=0,
+                            total_tax=0,
+                            total_including_tax=0,
+                            supplier_id=1,
+                            user_config_id=1))
+    assert allocate_order_numbers(session, "TST", 2) == \
+           [format_order_number("TST", next_number + 1),
+            format_order_number("TST", next_number + 3)]
+    session.rollback()
+    session.close()
+    print("Pass")
+    
+    print("Purchase orders | Time per allocation (ms)")
+    session = sessionmaker(bind=engine)()
+    num_purchase_orders = 0
+    for target in (0, 10000, 100000):
+        if target > num_purchase_orders:
+            engine.execute(PurchaseOrder.__table__.insert(),
+                           [{"order_number": format_order_number("OLD", i),
+                             "order_date": datetime.date(2016, 1, 1),
+                             "delivery_address": "Address",
+                             "delivery_date": datetime.date(2016, 1, 1),
+                             "payment_terms": "Pay in 30 days",
+                             "order_status": "Placed",
+                             "total_excluding_tax": 0,
+                             "total_tax": 0,
+                             "total_including_tax": 0,
+                             "supplier_id": 1,
+                             "user_config_id": 1} for i in 
+                            range(num_purchase_orders, target)])
+        num_purchase_orders = target
+        start = time.perf_counter()
+        for i in range(100):
+            allocate_order_numbers(session, "TST")
+            session.commit()
+        print("{:15d} | {:.3f}".format(num_purchase_orders,
+                                       (time.perf_counter() - start) * 10))
+    session.close()
@@ -0,0 +1,240 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable
+
+
+# The resolution that images are downsampled to, in dots per inch. 300 dpi is
+# enough for office printers and keeps large logo files from bloating the PDFs.
+DEFAULT_PRINT_DPI = 300
+
+# The number of decoded images kept. The PDFs only use the company logo and 
+# the signature, so this allows for a few changes to the user config.
+_MAX_CACHED_IMAGES = 16
+
+
+class ImageCache(object):
+    '''A cache of decoded images, shared by all of the PDFs built by the 
+    process.
+    
+    The images are keyed by their path, modification time and size, so an 
+    image that is replaced on disk is decoded again. Each image can also be 
+    downsampled to the print resolution of the box that it is drawn in. The 
+    cache may be used from several threads, e.g., by PDF export workers.
+    '''
+    
+    def __init__(self, max_images=_MAX_CACHED_IMAGES):
+        self._max_images = max_images
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        
+    def get_image_reader(self, filename, max_width=None, max_height=None, 
+                         dpi=DEFAULT_PRINT_DPI):
+        '''Get the decoded image of a file.
+        
+        Args:
+        :param filename: The image filename.
+        :type filename: String
+        :param max_width: The width of the box that the image is drawn in, in 
+            points, or None to keep the image's full resolution.
+        :type max_width: Float
+        :param max_height: The height of the box that the image is drawn in, 
+            in points, or None to keep the image's full resolution.
+        :type max_height: Float
+        :param dpi: The print resolution to downsample the image to, in dots 
+            per inch, or None to keep the image's full resolution.
+        :type dpi: Integer
+        
+        Returns:
+        :return: The decoded image.
+        :rtype: reportlab.lib.utils.ImageReader
+        
+        Raises:
+        :raises: OSError if the image file cannot be read.
+        '''
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        if max_width is None or max_height is None:
+            dpi = None
+        key = (path, stat.st_mtime_ns, stat.st_size, max_width, max_height, 
+               dpi)
+        with self._lock:
+            image_reader = self._images.get(key)
+            if image_reader is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image_reader
+        # Decode outside of the lock, so that other threads are not held up. 
+        # At worst, two threads decode the same image once each.
+        image_reader = _decode_image(path, max_width, max_height, dpi)
+        with self._lock:
+            self.misses += 1
+            self._images[key] = image_reader
+            while len(self._images) > self._max_images:
+                self._images.popitem(last=False)
+        return image_reader
+    
+    def clear(self):
+        '''Discard all of the cached images.
+        '''
+        with self._lock:
+            self._images.clear()
+
+
+class CachedImage(Flowable):
+    '''A flowable that draws a cached image, scaled proportionally to fit a 
+    box. This is the counterpart of reportlab's Image flowable with 
+    kind="proportional", without opening and decoding the file for every 
+    PDF.
+    '''
+    
+    def __init__(self, image_reader, width, height, hAlign="CENTER"):
+        super().__init__()
+        self.image_reader = image_reader
+        image_width, image_height = image_reader.getSize()
+        factor = min(width / image_width, height / image_height)
+        self.drawWidth = image_width * factor
+        self.drawHeight = image_height * factor
+        self.hAlign = hAlign
+        
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+    
+    def draw(self):
+        self.canv.drawImage(self.image_reader, 
+                            0, 
+                            0, 
+                            self.drawWidth, 
+                            self.drawHeight, 
+                            mask="auto")
+
+
+def _decode_image(path, max_width, max_height, dpi):
+    '''Decode an image file, downsampling it if it has more pixels than are 
+    needed to print it in a box at the given resolution.
+    '''
+    try:
+        from PIL import Image as PilImage
+    except ImportError:
+        # Without Pillow, reportlab can still embed JPEG files as they are.
+        return ImageReader(path)
+    pil_image = PilImage.open(path)
+    pil_image.load()
+    if dpi is not None:
+        # The image is scaled proportionally to fit the box, so the box 
+        # dimension that limits the scale also limits the pixels needed.
+        scale = min(max_width / 72 * dpi / pil_image.size[0], 
+                    max_height / 72 * dpi / pil_image.size[1])
+        if scale < 1.0:
+            pil_image = pil_image.resize(
+                            (max(1, math.ceil(pil_image.size[0] * scale)),
+                             max(1, math.ceil(pil_image.size[1] * scale))),
+                            PilImage.LANCZOS)
+    return ImageReader(pil_image)
+
+# The image cache used by the PDF reports.
+image_cache = ImageCache()
+
+def get_cached_image(filename, width, height, dpi=DEFAULT_PRINT_DPI):
+    '''Get a flowable that draws an image file from the image cache, scaled 
+    proportionally to fit a box and downsampled to the print resolution.
+    
+    Args:
+    :param filename: The image filename.
+    :type filename: String
+    :param width: The width of the box, in points.
+    :type width: Float
+    :param height: The height of the box, in points.
+    :type height: Float
+    :param dpi: The print resolution, in dots per inch, or None to keep the 
+        image's full resolution.
+    :type dpi: Integer
+    
+    Returns:
+    :return: The image flowable.
+    :rtype: CachedImage
+    '''
+    image_reader = image_cache.get_image_reader(filename, 
+                                                max_width=width, 
+                                                max_height=height, 
+                                                dpi=dpi)
+    return CachedImage(image_reader, width, height)
+
+if __name__ == '__main__':
+    # Benchmark drawing a large logo on many PDFs, decoding it every time as 
+    # reportlab's Image flowable does, and with the image cache.
+    import tempfile
+    import time
+    from PIL import Image as PilImage
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.pdfgen.canvas import Canvas
+    from reportlab.platypus import Image
+    
+    _NUM_PDFS = 200
+    
+    def build_pdfs(temp_dir, make_flowable):
+        total_size = 0
+        start = time.perf_counter()
+        for i in range(_NUM_PDFS):
+            filename = os.path.join(temp_dir, "{}.pdf".format(i))
+            canvas = Canvas(filename, pagesize=A4)
+            flowable = make_flowable()
+            flowable.wrapOn(canvas, A4[0], A4[1])
+            flowable.drawOn(canvas, cm, A4[1] - 4*cm)
+            canvas.save()
+            total_size += os.path.getsize(filename)
+        return time.perf_counter() - start, total_size / _NUM_PDFS
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        logo_filename = os.path.join(temp_dir, "logo.png")
+        PilImage.new("RGB", (3000, 1000), (200, 30, 30)).save(logo_filename)
+        width, height = A4[0]/2, 3*cm
+        results = [("Image flowable", 
+                    build_pdfs(temp_dir, 
+                               lambda: Image(logo_filename, 
+                                             width=width, 
+                                             height=height, 
+                                             kind="proportional"))),
+                   ("Cached, full resolution", 
+                    build_pdfs(temp_dir, 
+                               lambda: get_cached_image(logo_filename, 
+                                                        width, 
+                                                        height, 
+                                                        dpi=None))),
+                   ("Cached, {} dpi".format(DEFAULT_PRINT_DPI), 
+                    build_pdfs(temp_dir, 
+                               lambda: get_cached_image(logo_filename, 
+                                                        width, 
+                                                        height)))]
+    print("{} PDFs with a 3000 x 1000 pixel logo".format(_NUM_PDFS))
+    print("Method                  | Time (s) | Mean PDF size (kB)")
+    for method, (elapsed, mean_size) in results:
+        print("{:23s} | {:8.2f} | {:18.1f}".format(method, 
+                                                   elapsed, 
+                                                   mean_size / 1024))
+    print("Cache hits: {}, misses: {}".format(image_cache.hits, 
+                                              image_cache.misses))
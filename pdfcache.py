@@ -0,0 +1,246 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+
+# The directory of the render cache, next to the config file.
+DEFAULT_CACHE_DIR = "pdfcache"
+
+
+def make_cache_key(*parts):
+    '''Make a render cache key from everything that a PDF depends on.
+    
+    Args:
+    :param parts: The values that the PDF depends on. They must be JSON 
+        serialisable, or convertible to strings that identify them.
+    :type parts: Any
+    
+    Returns:
+    :return: The SHA-256 hex digest of the parts.
+    :rtype: String
+    '''
+    encoded_parts = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(encoded_parts.encode("utf-8")).hexdigest()
+
+
+class PdfRenderCache(object):
+    '''An on-disk cache of rendered PDFs, so that exporting a PDF that has 
+    not changed since it was last exported copies the cached file instead of
+    building it again.
+    
+    Each PDF is stored under its cache key, see :func:`make_cache_key`. The 
+    modification time of a cached file records when it was last used, and 
+    the least recently used files are removed when the cache grows beyond 
+    its size limit. The cache may be used from several threads, e.g., by PDF 
+    export workers.
+    '''
+    
+    def __init__(self, cache_dir, max_bytes):
+        '''Initialise the PdfRenderCache object.
+        
+        Args:
+        :param cache_dir: The cache directory. It is created if required.
+        :type cache_dir: String
+        :param max_bytes: The total size of the cached files that is kept.
+        :type max_bytes: Integer
+        '''
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        
+    def _get_cached_filename(self, key):
+        return os.path.join(self.cache_dir, key + ".pdf")
+    
+    def fetch(self, key, filename):
+        '''Copy a cached PDF to a file, if the PDF is in the cache.
+        
+        Args:
+        :param key: The cache key.
+        :type key: String
+        :param filename: The file to copy the cached PDF to.
+        :type filename: String
+        
+        Returns:
+        :return: True if the PDF was in the cache and was copied, False if 
+            it must be built.
+        :rtype: Boolean
+        
+        Raises:
+        :raises: OSError if the cached PDF cannot be copied to the file.
+        '''
+        cached_filename = self._get_cached_filename(key)
+        with self._lock:
+            try:
+                # Mark the file as recently used.
+                os.utime(cached_filename)
+            except FileNotFoundError:
+                self.misses += 1
+                return False
+            self.hits += 1
+            shutil.copyfile(cached_filename, filename)
+        return True
+        
+    def store(self, key, filename):
+        '''Add a newly built PDF to the cache, removing the least recently 
+        used PDFs if the cache is too large.
+        
+        Args:
+        :param key: The cache key.
+        :type key: String
+        :param filename: The PDF file.
+        :type filename: String
+        
+        Raises:
+        :raises: OSError if the PDF cannot be copied to the cache.
+        '''
+        file_handle, temp_filename = tempfile.mkstemp(suffix=".tmp", 
+                                                      dir=self.cache_dir)
+        os.close(file_handle)
+        try:
+            shutil.copyfile(filename, temp_filename)
+            with self._lock:
+                os.replace(temp_filename, self._get_cached_filename(key))
+                self._evict()
+        finally:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+                
+    def _evict(self):
+        entries = []
+        total_bytes = 0
+        with os.scandir(self.cache_dir) as scan:
+            for entry in scan:
+                if entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_bytes += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.debug("Could not remove {}: {}".format(path, e))
+                continue
+            total_bytes -= size
+            self.evictions += 1
+            
+    def clear(self):
+        '''Remove all of the cached PDFs.
+        '''
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pdf"):
+                    os.remove(os.path.join(self.cache_dir, name))
+    
+    def get_stats(self):
+        '''Get the cache statistics.
+        
+        Returns:
+        :return: The hits, misses and evictions so far.
+        :rtype: Dictionary
+        '''
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions}
+        
+    def log_summary(self):
+        '''Log the cache statistics.
+        '''
+        logging.info(("PDF render cache: {hits} hits, {misses} misses, "
+                      "{evictions} evictions").format(**self.get_stats()))
+
+
+# The render cache used by the application, created on first use.
+render_cache = None
+
+def get_render_cache(app_config):
+    '''Get the render cache used by the application.
+    
+    Args:
+    :param app_config: The application configuration in use.
+    :type app_confg: appconfig.ConfigFile
+    
+    Returns:
+    :return: The render cache, or None if it is disabled in the config.
+    :rtype: PdfRenderCache
+    '''
+    global render_cache
+    max_bytes = app_config.pdf.get_render_cache_size()
+    if max_bytes == 0:
+        return None
+    if render_cache is None:
+        render_cache = PdfRenderCache(DEFAULT_CACHE_DIR, max_bytes)
+    render_cache.max_bytes = max_bytes
+    return render_cache
+
+if __name__ == '__main__':
+    # Check the hit, miss and eviction behaviour with small fake PDFs.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = PdfRenderCache(os.path.join(temp_dir, "cache"), 3500)
+        source = os.path.join(temp_dir, "source.pdf")
+        target = os.path.join(temp_dir, "target.pdf")
+        print("Testing that an unknown key is a miss...")
+        key_a = make_cache_key("PO000001", [["PN1", "R 1.00"]], 1)
+        assert not cache.fetch(key_a, target)
+        assert cache.get_stats()["misses"] == 1
+        print("Pass")
+        print("Testing that a stored PDF is a hit and is copied...")
+        with open(source, "wb") as f:
+            f.write(b"A" * 1000)
+        cache.store(key_a, source)
+        assert cache.fetch(key_a, target)
+        with open(target, "rb") as f:
+            assert f.read() == b"A" * 1000
+        print("Pass")
+        print("Testing that a changed user config version changes the key...")
+        assert make_cache_key("PO000001", [["PN1", "R 1.00"]], 2) != key_a
+        print("Pass")
+        print("Testing that the least recently used PDF is evicted...")
+        keys = [key_a]
+        for i in range(1, 3):
+            key = make_cache_key("PO{:06d}".format(i))
+            cache.store(key, source)
+            keys.append(key)
+        # Make the last uses distinguishable: key_a was used most recently, 
+        # and keys[1] least recently.
+        for i, key in enumerate([keys[1], keys[2], key_a]):
+            os.utime(cache._get_cached_filename(key), 
+                     (1000000000 + i, 1000000000 + i))
+        assert cache.get_stats()["evictions"] == 0
+        cache.store(make_cache_key("PO000003"), source)
+        assert cache.get_stats()["evictions"] == 1
+        assert cache.fetch(key_a, target)
+        assert cache.fetch(keys[2], target)
+        assert not cache.fetch(keys[1], target)
+        print("Pass")
+        cache.log_summary()
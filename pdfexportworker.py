@@ -0,0 +1,372 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import logging
+import os
+import threading
+from PyQt4.QtCore import *
+from PyQt4.QtGui import *
+from messagebox import execute_critical_msg_box
+
+
+class PdfExportCancelled(Exception):
+    '''Raised inside a PDF build to abandon it when the user cancels the 
+    export.
+    '''
+    pass
+
+
+class ReportDataExportCancelled(Exception):
+    '''Raised inside a report data export to abandon it when the user cancels
+    the export.
+    '''
+    pass
+
+
+def _remove_partial_file(filename):
+    '''Remove a file that was only partly written, if it exists.
+    '''
+    try:
+        if os.path.exists(filename):
+            os.remove(filename)
+    except OSError as e:
+        logging.debug("Could not remove {}: {}".format(filename, e))
+
+
+class PdfExportWorker(QRunnable):
+    '''Builds a PDF report on a thread pool thread.
+    
+    The report, e.g., a pdfreports.PoPdf, must be created on the GUI thread 
+    from plain data, i.e., the PoPdf*Details or ReportPdf*Details objects, so
+    that the build does not touch the models, the session or any widgets. 
+    
+    The worker reports through the signals of its signals object, which 
+    belongs to the GUI thread, so the connected slots run on the GUI thread:
+    - progress(int): The page that is being laid out.
+    - finished(QString): The PDF was written to the filename.
+    - cancelled(): The build was abandoned and the partial file removed.
+    - failed(QString, QString): The build failed. The arguments are a 
+      message for the user and the error.
+    
+    If a render cache and key are given, a PDF in the cache is copied to the
+    filename instead of being built, and a built PDF is added to the cache.
+    '''
+    
+    def __init__(self, pdf_report, render_cache=None, cache_key=None):
+        '''Initialise the PdfExportWorker object.
+        
+        Args:
+        :param pdf_report: The report to build. It must have a filename 
+            attribute, a pdf attribute that is the reportlab document 
+            template, and a build method.
+        :type pdf_report: pdfreports.PoPdf or pdfreports.ReportPdf
+        :param render_cache: The render cache, or None.
+        :type render_cache: pdfcache.PdfRenderCache
+        :param cache_key: The render cache key of the report, or None.
+        :type cache_key: String
+        '''
+        super().__init__()
+        self.pdf_report = pdf_report
+        self.render_cache = render_cache
+        self.cache_key = cache_key
+        self.signals = QObject()
+        self._cancel_requested = threading.Event()
+        
+    def cancel(self):
+        '''Request that the build be abandoned. This may be called from any 
+        thread. The build stops at the next page or flowable.
+        '''
+        self._cancel_requested.set()
+        
+    def _check_cancelled(self):
+        if self._cancel_requested.is_set():
+            raise PdfExportCancelled()
+        
+    def _on_page(self, page_number):
+        self._check_cancelled()
+        self.signals.emit(SIGNAL("progress(int)"), page_number)
+        
+    def _on_progress(self, progress_type, value):
+        self._check_cancelled()
+        
+    def run(self):
+        '''Build the PDF. Refer to QRunnable.run.
+        '''
+        filename = self.pdf_report.filename
+        self.pdf_report.pdf.setPageCallBack(self._on_page)
+        self.pdf_report.pdf.setProgressCallBack(self._on_progress)
+        try:
+            self._check_cancelled()
+            if self._fetch_from_cache(filename):
+                self.signals.emit(SIGNAL("finished(QString)"), filename)
+                return
+            self.pdf_report.build()
+        except PdfExportCancelled:
+            _remove_partial_file(filename)
+            self.signals.emit(SIGNAL("cancelled()"))
+        except PermissionError as e:
+            self.signals.emit(SIGNAL("failed(QString,QString)"),
+                              ("Could not open the PDF file. Make sure that it "
+                               "is not open and then try again."),
+                              str(e))
+        except Exception as e:
+            logging.exception("PDF export of {} failed".format(filename))
+            _remove_partial_file(filename)
+            self.signals.emit(SIGNAL("failed(QString,QString)"),
+                              "The PDF file could not be created.",
+                              str(e))
+        else:
+            self._store_in_cache(filename)
+            self.signals.emit(SIGNAL("finished(QString)"), filename)
+            
+    def _fetch_from_cache(self, filename):
+        if self.render_cache is None or self.cache_key is None:
+            return False
+        return self.render_cache.fetch(self.cache_key, filename)
+    
+    def _store_in_cache(self, filename):
+        if self.render_cache is None or self.cache_key is None:
+            return
+        try:
+            self.render_cache.store(self.cache_key, filename)
+        except OSError as e:
+            # The PDF was exported, so only the next export is affected.
+            logging.warning("Could not cache {}: {}".format(filename, e))
+
+
+class ReportDataExportWorker(QRunnable):
+    '''Streams a report to a CSV or JSON Lines file on a thread pool thread.
+    
+    The session of the GUI thread cannot be used on another thread, so the 
+    worker runs the report's query in its own session. Refer to 
+    :func:`reportexport.export_report`. The worker reports through the same 
+    signals as PdfExportWorker, except that progress(int) is the number of 
+    rows written so far.
+    '''
+    
+    def __init__(self, report_engine, filename, app_config):
+        '''Initialise the ReportDataExportWorker object.
+        
+        Args:
+        :param report_engine: The report to export. Only its parameters are 
+            used, not its session.
+        :type report_engine: reportengine.ReportEngine
+        :param filename: The filename, ending in .csv or .jsonl.
+        :type filename: String
+        :param app_config: The application configuration in use.
+        :type app_confg: appconfig.ConfigFile
+        '''
+        super().__init__()
+        self.report_type = report_engine.report_type
+        self.additional_data = report_engine.additional_data
+        self.start_date = report_engine.start_date
+        self.end_date = report_engine.end_date
+        self.filename = filename
+        self.app_config = app_config
+        self.signals = QObject()
+        self._cancel_requested = threading.Event()
+        
+    def cancel(self):
+        '''Request that the export be abandoned. This may be called from any 
+        thread. The export stops after the current batch of rows.
+        '''
+        self._cancel_requested.set()
+        
+    def _on_progress(self, num_rows):
+        if self._cancel_requested.is_set():
+            raise ReportDataExportCancelled()
+        self.signals.emit(SIGNAL("progress(int)"), num_rows)
+        
+    def run(self):
+        '''Export the report. Refer to QRunnable.run.
+        '''
+        from reportengine import ReportEngine
+        from reportexport import export_report
+        from sqlasession import session_scope
+        filename = self.filename
+        try:
+            with session_scope() as session:
+                report_engine = ReportEngine(session, 
+                                             self.report_type, 
+                                             self.additional_data, 
+                                             self.start_date, 
+                                             self.end_date)
+                num_rows = export_report(report_engine, filename, 
+                                         self.app_config, 
+                                         progress=self._on_progress)
+        except ReportDataExportCancelled:
+            _remove_partial_file(filename)
+            self.signals.emit(SIGNAL("cancelled()"))
+        except PermissionError as e:
+            self.signals.emit(SIGNAL("failed(QString,QString)"),
+                              ("Could not open the file. Make sure that it "
+                               "is not open and then try again."),
+                              str(e))
+        except Exception as e:
+            logging.exception("Report export to {} failed".format(filename))
+            _remove_partial_file(filename)
+            self.signals.emit(SIGNAL("failed(QString,QString)"),
+                              ("The report could not be exported to "
+                               "{}.").format(filename),
+                              str(e))
+        else:
+            logging.info("Exported {} report rows to {}".format(num_rows, 
+                                                                 filename))
+            self.signals.emit(SIGNAL("finished(QString)"), filename)
+
+
+class BackgroundExport(QObject):
+    '''Runs an export worker, e.g., a PdfExportWorker, on the global thread 
+    pool, showing its progress in a dialog that allows the user to cancel the
+    export.
+    
+    Keep a reference to the export until it is done, e.g., in an attribute of
+    the window that started it. The done() signal is emitted when the export 
+    finishes, is cancelled or fails.
+    '''
+    
+    def __init__(self, worker, title, label_text, progress_format, 
+                 parent=None):
+        '''Initialise the BackgroundExport object.
+        
+        Args:
+        :param worker: The worker. It must have a cancel method and a signals
+            object with the signals described in PdfExportWorker.
+        :type worker: QRunnable
+        :param title: The title of the progress dialog and of any error 
+            message box.
+        :type title: String
+        :param label_text: The text shown until the first progress signal.
+        :type label_text: String
+        :param progress_format: The format of the text shown on a progress 
+            signal, with one replacement field for its argument.
+        :type progress_format: String
+        :param parent: The window that started the export.
+        :type parent: QWidget
+        '''
+        super().__init__(parent)
+        self.title = title
+        self.worker = worker
+        self.progress_format = progress_format
+        self.progress_dialog = QProgressDialog(label_text, "Cancel", 0, 0, 
+                                               parent)
+        self.progress_dialog.setWindowTitle(title)
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        # Only show the dialog if the export takes a while.
+        self.progress_dialog.setMinimumDuration(500)
+        self.connect(self.progress_dialog, SIGNAL("canceled()"), 
+                     self.worker.cancel)
+        self.connect(self.worker.signals, SIGNAL("progress(int)"),
+                     self._progress)
+        self.connect(self.worker.signals, SIGNAL("finished(QString)"),
+                     self._finished)
+        self.connect(self.worker.signals, SIGNAL("cancelled()"),
+                     self._cancelled)
+        self.connect(self.worker.signals, SIGNAL("failed(QString,QString)"),
+                     self._failed)
+        
+    def start(self):
+        '''Start the export.
+        '''
+        self.progress_dialog.show()
+        QThreadPool.globalInstance().start(self.worker)
+        
+    def _progress(self, value):
+        self.progress_dialog.setLabelText(self.progress_format.format(value))
+        
+    def _finished(self, filename):
+        logging.debug("Exported {}".format(filename))
+        self._done()
+        
+    def _cancelled(self):
+        self._done()
+        
+    def _failed(self, message, error):
+        self._done()
+        execute_critical_msg_box(self.title, message, QMessageBox.Ok, 
+                                 info_text=error)
+        
+    def _done(self):
+        # Disconnect first, since closing the dialog emits canceled().
+        self.disconnect(self.progress_dialog, SIGNAL("canceled()"), 
+                        self.worker.cancel)
+        self.progress_dialog.close()
+        self.emit(SIGNAL("done()"))
+
+
+class PdfExport(BackgroundExport):
+    '''Builds a PDF on the global thread pool. Refer to BackgroundExport.
+    '''
+    
+    def __init__(self, pdf_report, title, parent=None, render_cache=None, 
+                 cache_key=None):
+        '''Initialise the PdfExport object.
+        
+        Args:
+        :param pdf_report: The report to build. Refer to PdfExportWorker.
+        :type pdf_report: pdfreports.PoPdf or pdfreports.ReportPdf
+        :param title: The title of the progress dialog and of any error 
+            message box.
+        :type title: String
+        :param parent: The window that started the export.
+        :type parent: QWidget
+        :param render_cache: The render cache, or None. Refer to 
+            PdfExportWorker.
+        :type render_cache: pdfcache.PdfRenderCache
+        :param cache_key: The render cache key of the report, or None.
+        :type cache_key: String
+        '''
+        super().__init__(PdfExportWorker(pdf_report, 
+                                         render_cache=render_cache, 
+                                         cache_key=cache_key),
+                         title,
+                         "Preparing the PDF...",
+                         "Laying out page {}...",
+                         parent=parent)
+
+
+class ReportDataExport(BackgroundExport):
+    '''Streams a report to a CSV or JSON Lines file on the global thread pool.
+    Refer to BackgroundExport.
+    '''
+    
+    def __init__(self, report_engine, filename, app_config, title, 
+                 parent=None):
+        '''Initialise the ReportDataExport object.
+        
+        Args:
+        :param report_engine: The report to export. Refer to 
+            ReportDataExportWorker.
+        :type report_engine: reportengine.ReportEngine
+        :param filename: The filename, ending in .csv or .jsonl.
+        :type filename: String
+        :param app_config: The application configuration in use.
+        :type app_confg: appconfig.ConfigFile
+        :param title: The title of the progress dialog and of any error 
+            message box.
+        :type title: String
+        :param parent: The window that started the export.
+        :type parent: QWidget
+        '''
+        super().__init__(ReportDataExportWorker(report_engine, filename, 
+                                                app_config),
+                         title,
+                         "Exporting the report...",
+                         "Exported {} rows...",
+                         parent=parent)
@@ -19,8 +19,11 @@ Contact: paulosvnleal@gmail.com
 
 import os
 import datetime
+import threading
+from pdfcache import make_cache_key
 from PyQt4.QtGui import QMessageBox
-from reportlab.platypus import Image, SimpleDocTemplate, Spacer, Table
+from reportlab.platypus import (Flowable, PageBreak, SimpleDocTemplate, Spacer,
+                                Table)
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import cm
 from reportlab.lib import colors
@@ -29,43 +32,114 @@ from reportlab.lib.pagesizes import A4, landscape
 from datavalidation import (validate_num_address_lines, 
                             DATA_VAL_ERROR_MSG_BOX_TITLE)
 from messagebox import execute_warning_msg_box
+from pdfassets import DEFAULT_PRINT_DPI, get_cached_image
 
 _LEFT_RIGHT_MARGIN_WIDTH = cm*2
 _TOP_BOTTOM_MARGIN_WIDTH = cm
 
 class PoPdfPageXofYCanvas(Canvas):
     '''
-    Subclass of the Canvas class that saves page states and allows the 
-    "Page X of Y" string to be printed in the footer of the page once the  
-    document has been built.
-    Straight copy from a recipe on ActiveState website:
-    http://code.activestate.com/recipes/576832/
+    Subclass of the Canvas class that prints the "Page X of Y" string in the 
+    footer of each page.
+    
+    The total number of pages is only known when the document is saved, so 
+    each page refers to a form XObject that is defined in save, once the 
+    total is known. Each page is written out as soon as it is finished, and 
+    only the number of pages is kept, unlike the recipe that this replaces, 
+    which kept a copy of the canvas state of every page until the document 
+    was saved.
     '''
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._saved_page_states = []
+        self._num_pages = 0
         
     def showPage(self):
-        self._saved_page_states.append(dict(self.__dict__))
-        self._startPage()
+        self._num_pages += 1
+        self.doForm(self._get_page_number_form_name(self._num_pages))
+        super().showPage()
         
     def save(self):
         """
-        Add "Page X of Y" string to the footer of each page.
+        Define the "Page X of Y" string of each page.
         """
-        num_pages = len(self._saved_page_states)
-        for state in self._saved_page_states:
-            self.__dict__.update(state)
-            self.draw_page_number(num_pages)
-            Canvas.showPage(self)
-        Canvas.save(self)
-        
-    def draw_page_number(self, page_count):
+        for page_number in range(1, self._num_pages + 1):
+            self.beginForm(self._get_page_number_form_name(page_number))
+            self.draw_page_number(page_number, self._num_pages)
+            self.endForm()
+        super().save()
+        
+    def _get_page_number_form_name(self, page_number):
+        return "pageNumber{}".format(page_number)
+        
+    def draw_page_number(self, page_number, page_count):
         self.setFont("Helvetica", 8)
         self.drawRightString(A4[0] - _LEFT_RIGHT_MARGIN_WIDTH, 
                              _TOP_BOTTOM_MARGIN_WIDTH,
-            "Page %d of %d" % (self._pageNumber, page_count))
+            "Page %d of %d" % (page_number, page_count))
+
+
+class _SharedFormFlowable(Flowable):
+    '''
+    A flowable that draws a table that is laid out once and shared by all of 
+    the PDFs built by the process, e.g., the letterhead of the company, which
+    is the same on every purchase order. Each PDF draws the table into a form
+    XObject, so that its content is embedded once however many times it is 
+    drawn.
+    '''
+    
+    def __init__(self, shared_table, form_name):
+        super().__init__()
+        self.shared_table = shared_table
+        self.form_name = form_name
+        
+    def wrap(self, availWidth, availHeight):
+        self._avail = (availWidth, availHeight)
+        self.width, self.height = self.shared_table.wrap(availWidth, 
+                                                         availHeight)
+        return self.width, self.height
+    
+    def draw(self):
+        if not self.canv.hasForm(self.form_name):
+            self.canv.beginForm(self.form_name, 
+                                lowerx=0, 
+                                lowery=0,
+                                upperx=self.width,
+                                uppery=self.height)
+            self.shared_table.drawOn(self.canv, 0, 0, *self._avail)
+            self.canv.endForm()
+        self.canv.doForm(self.form_name)
+
+
+class _SharedTable(object):
+    '''
+    A table shared by the PDFs built by the process. Laying out and drawing a 
+    table changes its attributes, so the PDFs take turns, since they may be 
+    built on different threads.
+    '''
+    
+    def __init__(self, table):
+        self.table = table
+        self._lock = threading.Lock()
+        self._sizes = {}
+        
+    def wrap(self, availWidth, availHeight):
+        with self._lock:
+            key = (availWidth, availHeight)
+            if key not in self._sizes:
+                self._sizes[key] = self.table.wrap(availWidth, availHeight)
+            return self._sizes[key]
+    
+    def drawOn(self, canvas, x, y, availWidth, availHeight):
+        with self._lock:
+            self.table.wrap(availWidth, availHeight)
+            self.table.drawOn(canvas, x, y)
+
+
+# The letterheads laid out so far, keyed by everything that they show. 
+_letterhead_cache = {}
+_letterhead_cache_lock = threading.Lock()
+_MAX_CACHED_LETTERHEADS = 16
 
 
 class PoPdfCompanyDetails(object):
@@ -220,10 +294,14 @@ class PoPdf(object):
     
     _GAP = Spacer(cm, 0.3*cm)
     _ITEMS_ON_FIRST_PAGE = 23
+    # Increase this when the layout changes, so that PDFs rendered by an 
+    # earlier version are not served from the render cache.
+    _LAYOUT_VERSION = 1
     
     def __init__(self, filename, company_details, order_details, 
                  supplier_details, delivery_details, line_item_details,
-                 notes, signature_details, show_all_grids=False):
+                 notes, signature_details, show_all_grids=False,
+                 page_compression=True, image_dpi=DEFAULT_PRINT_DPI):
         if filename is None:
             raise ValueError("The filename parameter is invalid.")
         self.filename = filename
@@ -247,14 +325,54 @@ class PoPdf(object):
             raise ValueError("The signature_details parameter is invalid.")
         self.signature_details = signature_details
         self.show_all_grids = show_all_grids
+        self.image_dpi = image_dpi
         self.pdf = SimpleDocTemplate(self.filename,
                                      leftMargin=_LEFT_RIGHT_MARGIN_WIDTH,
                                      rightMargin=_LEFT_RIGHT_MARGIN_WIDTH,
                                      topMargin=_TOP_BOTTOM_MARGIN_WIDTH,
-                                     bottomMargin=_TOP_BOTTOM_MARGIN_WIDTH)
+                                     bottomMargin=_TOP_BOTTOM_MARGIN_WIDTH,
+                                     pageCompression=int(page_compression))
+        self.page_compression = page_compression
         self.story = []
         self.stylesheet = getSampleStyleSheet()
         
+    def get_fingerprint(self, *extra_parts):
+        '''Get a render cache key for the content of the PDF. 
+        
+        The key covers all of the details shown on the PDF, the options that
+        affect its output and the modification times of the images, so any 
+        change to them gives a different key.
+        
+        Args:
+        :param extra_parts: Anything else that the PDF depends on, e.g., the
+            user config version.
+        :type extra_parts: Any
+        
+        Returns:
+        :return: The render cache key. Refer to pdfcache.make_cache_key.
+        :rtype: String
+        '''
+        image_mtimes = []
+        for image_filename in (self.company_details.logo_filename,
+                               self.signature_details.signature_filename):
+            if image_filename and os.path.exists(image_filename):
+                image_mtimes.append(os.stat(image_filename).st_mtime_ns)
+            else:
+                image_mtimes.append(None)
+        return make_cache_key(self._LAYOUT_VERSION,
+                              vars(self.company_details),
+                              vars(self.order_details),
+                              vars(self.supplier_details),
+                              vars(self.delivery_details),
+                              vars(self.line_item_details),
+                              self.notes,
+                              vars(self.signature_details),
+                              self.show_all_grids,
+                              self.page_compression,
+                              self.image_dpi,
+                              image_mtimes,
+                              extra_parts)
+        
     def build(self):
         self._build_letterhead_section()
         self.story.append(self._GAP)
@@ -269,16 +387,48 @@ class PoPdf(object):
         self.finalise()
         
     def _build_letterhead_section(self):
+        self.story.append(self._get_letterhead())
+        
+    def _get_letterhead(self):
+        '''Get the letterhead from the letterhead cache, laying it out if 
+        this company's letterhead is not in the cache yet.
+        
+        The letterhead only depends on the company details, so it is shared 
+        by every purchase order until the user config changes. The logo 
+        file's modification time is part of the key, so that a replaced logo 
+        is shown.
+        '''
+        logo_filename = self.company_details.logo_filename
+        logo_mtime = None
+        if logo_filename is not None:
+            logo_mtime = os.stat(logo_filename).st_mtime_ns
+        key = (self.company_details.name, 
+               logo_filename, 
+               logo_mtime, 
+               self.pdf.width,
+               self.show_all_grids,
+               self.image_dpi)
+        with _letterhead_cache_lock:
+            shared_table = _letterhead_cache.get(key)
+            if shared_table is None:
+                shared_table = _SharedTable(self._make_letterhead_table())
+                if len(_letterhead_cache) >= _MAX_CACHED_LETTERHEADS:
+                    _letterhead_cache.clear()
+                _letterhead_cache[key] = shared_table
+        return _SharedFormFlowable(shared_table, "poLetterhead")
+        
+    def _make_letterhead_table(self):
         table_data = []
         if self.company_details.logo_filename is None:
             table_data.append([self.company_details.name, 
                                "", 
                                "PURCHASE ORDER"])
         else:
-            table_data.append([Image(self.company_details.logo_filename, 
-                                     width=self.pdf.width/2, 
-                                     height=3*cm, 
-                                     kind="proportional"), 
+            table_data.append([get_cached_image(
+                                        self.company_details.logo_filename, 
+                                        self.pdf.width/2, 
+                                        3*cm,
+                                        dpi=self.image_dpi), 
                                "",
                                "PURCHASE ORDER"])
         col_widths = (self.pdf.width * 0.5,
@@ -291,7 +441,7 @@ class PoPdf(object):
                         ("FONTSIZE", (0,0), (-1,0), 16),
                         ("VALIGN",   (-1,0), (-1,0), "MIDDLE")])
         self._show_grid_if_required(table)
-        self.story.append(table)
+        return table
         
     def _get_address_line(self, index):
         if len(self.company_details.address_lines) > index:
@@ -569,10 +719,11 @@ class PoPdf(object):
                                Spacer(cm, 1.5*cm)])
         else:
             table_data.append(["Authorised By:",
-                               Image(self.signature_details.signature_filename,
-                                     width=self.pdf.width/2,
-                                     height=1.5*cm,
-                                     kind="proportional")])
+                               get_cached_image(
+                                    self.signature_details.signature_filename,
+                                    self.pdf.width/2,
+                                    1.5*cm,
+                                    dpi=self.image_dpi)])
         table_data.append(["",
                            "Signature"])
         table_data.append(["",
@@ -595,10 +746,17 @@ class PoPdf(object):
         
     def add_footer_text(self, canvas, doc):
         canvas.saveState()
+        # The company name is the same on every page, so it is drawn once 
+        # into a form XObject that each page refers to.
+        if not canvas.hasForm("poFooterCompanyName"):
+            canvas.beginForm("poFooterCompanyName")
+            canvas.setFont("Helvetica", 8)
+            canvas.drawString(_LEFT_RIGHT_MARGIN_WIDTH, 
+                              _TOP_BOTTOM_MARGIN_WIDTH,
+                              self.company_details.name)
+            canvas.endForm()
+        canvas.doForm("poFooterCompanyName")
         canvas.setFont("Helvetica", 8)
-        canvas.drawString(_LEFT_RIGHT_MARGIN_WIDTH, 
-                          _TOP_BOTTOM_MARGIN_WIDTH,
-                          self.company_details.name)
         canvas.drawCentredString(A4[0]/2,
                                  _TOP_BOTTOM_MARGIN_WIDTH,
                                  "Purchase Order " + \
@@ -616,44 +774,6 @@ class PoPdf(object):
             table.setStyle([("GRID", (0,0), (-1,-1), 0.5, colors.black)])
 
 
-class ReportPdfPageXofYCanvas(Canvas):
-    '''
-    Subclass of the Canvas class that saves page states and allows the 
-    "Page X of Y" string to be printed in the footer of the page once the  
-    document has been built.
-    Straight copy from a recipe on ActiveState website:
-    http://code.activestate.com/recipes/576832/
-    '''
-    
-    _LEFT_RIGHT_MARGIN_WIDTH = cm
-    _TOP_BOTTOM_MARGIN_WIDTH = cm
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._saved_page_states = []
-        
-    def showPage(self):
-        self._saved_page_states.append(dict(self.__dict__))
-        self._startPage()
-        
-    def save(self):
-        """
-        Add "Page X of Y" string to the footer of each page.
-        """
-        num_pages = len(self._saved_page_states)
-        for state in self._saved_page_states:
-            self.__dict__.update(state)
-            self.draw_page_number(num_pages)
-            Canvas.showPage(self)
-        Canvas.save(self)
-        
-    def draw_page_number(self, page_count):
-        self.setFont("Helvetica", 8)
-        self.drawRightString(landscape(A4)[0] - self._LEFT_RIGHT_MARGIN_WIDTH,
-                             landscape(A4)[1] - self._TOP_BOTTOM_MARGIN_WIDTH,
-            "Page %d of %d" % (self._pageNumber, page_count))
-
-
 class ReportPdfSingleLineItemDetail(object):
     '''
     A class containing all of the information that is displayed on the PDF of 
@@ -679,12 +799,64 @@ class ReportPdfSingleLineItemDetail(object):
 class ReportPdfLineItemDetails(object):
     '''
     A class containing all of the information about the report line items. 
-    This includes the total value.
+    This includes the total value and, optionally, the line prices as 
+    numbers, which are used to show the totals carried forward from page to 
+    page.
     '''
     
-    def __init__(self, line_items, total_value):
+    def __init__(self, line_items, total_value, line_prices=None, 
+                 currency_format="R {:,.2f}"):
         self.line_items = line_items
         self.total_value = total_value
+        if line_prices is not None and len(line_prices) != len(line_items):
+            raise ValueError("The line_prices parameter is invalid.")
+        self.line_prices = line_prices
+        self.currency_format = currency_format
+
+
+class _ReportPageTable(Flowable):
+    '''
+    A flowable that holds the line items of one page of a report, and only 
+    creates the reportlab Table for them while the page is laid out and 
+    drawn. This keeps one Table in memory at a time, however long the report.
+    '''
+    
+    def __init__(self, report, start, end, brought_forward, carried_forward):
+        super().__init__()
+        self.report = report
+        self.start = start
+        self.end = end
+        self.brought_forward = brought_forward
+        self.carried_forward = carried_forward
+        self._table = None
+        
+    def _get_table(self):
+        if self._table is None:
+            self._table = self.report._make_page_table(self.start, 
+                                                       self.end,
+                                                       self.brought_forward,
+                                                       self.carried_forward)
+        return self._table
+    
+    def wrap(self, availWidth, availHeight):
+        self.width, self.height = self._get_table().wrap(availWidth, 
+                                                         availHeight)
+        return self.width, self.height
+    
+    def split(self, availWidth, availHeight):
+        '''Split the page's table if it does not fit after all, e.g., if the 
+        row heights were underestimated by ReportPdf._paginate. The rows that
+        do not fit flow onto the next page under a copy of the heading row, 
+        rather than the build failing with a LayoutError.
+        '''
+        table = self._get_table()
+        table.repeatRows = 1
+        self._table = None
+        return table.split(availWidth, availHeight)
+    
+    def draw(self):
+        self._get_table().drawOn(self.canv, 0, 0)
+        self._table = None
 
 
 class ReportPdf(object):
@@ -695,7 +867,8 @@ class ReportPdf(object):
     
     def __init__(self, filename, report_type, report_filter, start_date, 
                  end_date, line_item_details, company_name, 
-                 show_all_grids=False):
+                 show_all_grids=False, page_compression=True, 
+                 image_dpi=DEFAULT_PRINT_DPI):
         if filename is None:
             raise ValueError("The filename parameter is invalid.")
         self.filename = filename
@@ -714,7 +887,8 @@ class ReportPdf(object):
                                      leftMargin=self._LEFT_RIGHT_MARGIN_WIDTH,
                                      rightMargin=self._LEFT_RIGHT_MARGIN_WIDTH,
                                      topMargin=2.5*self._TOP_BOTTOM_MARGIN_WIDTH,
-                                     bottomMargin=self._TOP_BOTTOM_MARGIN_WIDTH)
+                                     bottomMargin=self._TOP_BOTTOM_MARGIN_WIDTH,
+                                     pageCompression=int(page_compression))
         self.story = []
         self.stylesheet = getSampleStyleSheet()
         
@@ -722,46 +896,128 @@ class ReportPdf(object):
         self._build_line_item_table()
         self.finalise()
         
+    _COLUMN_TITLES = ["Order No.",
+                      "Order Date",
+                      "Status",
+                      "Project",
+                      "Supplier",
+                      "Part No.", 
+                      "Description", 
+                      "Unit Price", 
+                      "Discount",
+                      "Quantity",
+                      "Total Price"]
+    
+    _COLUMN_WIDTH_FRACTIONS = (0.06, 0.08, 0.06, 0.1, 0.1, 0.1, 0.2, 0.09, 
+                               0.06, 0.06, 0.09)
+    
     def _build_line_item_table(self):
-        table_data = []
-        table_data.append(["Order No.",
-                           "Order Date",
-                           "Status",
-                           "Project",
-                           "Supplier",
-                           "Part No.", 
-                           "Description", 
-                           "Unit Price", 
-                           "Discount",
-                           "Quantity",
-                           "Total Price"])
-        for item in self.line_item_details.line_items:
-            table_data.append(item)
-        table_data.append(["",
-                           "",
-                           "",
-                           "",
-                           "",
-                           "",
-                           "",
-                           "",
-                           "",
-                           "Total:",
-                           self.line_item_details.total_value])
-        col_widths = (self.pdf.width * 0.06,
-                      self.pdf.width * 0.08,
-                      self.pdf.width * 0.06,
-                      self.pdf.width * 0.1,
-                      self.pdf.width * 0.1,
-                      self.pdf.width * 0.1,
-                      self.pdf.width * 0.2,
-                      self.pdf.width * 0.09,
-                      self.pdf.width * 0.06,
-                      self.pdf.width * 0.06,
-                      self.pdf.width * 0.09)
+        '''Split the line items into pages and add a table for each page to 
+        the story.
+        
+        Laying out a single table for all of the line items and letting 
+        reportlab split it over the pages takes time and memory that grow 
+        faster than the number of line items. Instead, the line items are 
+        split into page-sized tables here, using the height of each row, and 
+        each table is only created while its page is drawn. Every page but 
+        the last ends with the total carried forward, which the next page 
+        starts with. Because the number of pages is known before the document 
+        is built, the "Page X of Y" string is drawn with the page header.
+        '''
+        line_items = self.line_item_details.line_items
+        line_prices = self.line_item_details.line_prices
+        pages = self._paginate(line_items)
+        self._num_pages = len(pages)
+        running_total = None
+        for page_number, (start, end) in enumerate(pages):
+            brought_forward = running_total
+            carried_forward = None
+            if line_prices is not None:
+                running_total = (running_total or 0) + \
+                                sum(line_prices[start:end])
+                if page_number < len(pages) - 1:
+                    carried_forward = running_total
+            if page_number > 0:
+                self.story.append(PageBreak())
+            self.story.append(_ReportPageTable(self, 
+                                               start, 
+                                               end, 
+                                               brought_forward,
+                                               carried_forward))
+    
+    def _paginate(self, line_items):
+        '''Split the line items into pages.
+        
+        Returns:
+        :return: The start and end index of the line items on each page.
+        :rtype: List of (Integer, Integer) tuples
+        '''
+        # The height of a row, measured with sample tables that have the same
+        # style, and the height added by each further line of text in a cell.
+        two_row_height = self._make_table([["X"] * 11, 
+                                           ["X"] * 11]).wrap(
+                                                        self.pdf.width,
+                                                        self.pdf.height)[1]
+        taller_two_row_height = self._make_table([["X"] * 11, 
+                                                  ["X\nX"] * 11]).wrap(
+                                                        self.pdf.width, 
+                                                        self.pdf.height)[1]
+        single_line_height = two_row_height / 2
+        line_height = taller_two_row_height - two_row_height
+        # The frame's top and bottom padding is 6 points each, and a point is 
+        # kept spare for rounding. Reserve the heading row, the brought 
+        # forward row and the carried forward or total row on every page. If
+        # this is not enough, the page's table is split. Refer to 
+        # _ReportPageTable.split.
+        available_height = self.pdf.height - 13 - 3*single_line_height
+        pages = []
+        start = 0
+        used_height = 0
+        for index, item in enumerate(line_items):
+            num_lines = max(str(value).count("\n") + 1 for value in item)
+            row_height = single_line_height + (num_lines - 1)*line_height
+            if used_height + row_height > available_height and index > start:
+                pages.append((start, index))
+                start = index
+                used_height = 0
+            used_height += row_height
+        pages.append((start, len(line_items)))
+        return pages
+    
+    def _format_value(self, value):
+        return self.line_item_details.currency_format.format(value)
+    
+    def _make_page_table(self, start, end, brought_forward, carried_forward):
+        '''Create the table of one page of line items.
+        '''
+        table_data = [self._COLUMN_TITLES]
+        if brought_forward is not None:
+            table_data.append(["", "", "", "", "", "", "", "", "",
+                               "B/F:",
+                               self._format_value(brought_forward)])
+        table_data.extend(self.line_item_details.line_items[start:end])
+        if end < len(self.line_item_details.line_items):
+            if carried_forward is not None:
+                table_data.append(["", "", "", "", "", "", "", "", "",
+                                   "C/F:",
+                                   self._format_value(carried_forward)])
+            else:
+                table_data.append(["", "", "", "", "", "", "", "", "", "", ""])
+        else:
+            table_data.append(["", "", "", "", "", "", "", "", "",
+                               "Total:",
+                               self.line_item_details.total_value])
+        table = self._make_table(table_data)
+        if brought_forward is not None:
+            table.setStyle([("FONT", (-2,1), (-1,1), "Helvetica-Bold"),
+                            ("LINEBELOW", (0,1), (-1,1), 0.5, colors.black)])
+        return table
+    
+    def _make_table(self, table_data):
+        col_widths = [self.pdf.width * fraction 
+                      for fraction in self._COLUMN_WIDTH_FRACTIONS]
         table = Table(table_data, 
                       colWidths=col_widths,
-                      repeatRows=1, 
                       hAlign="LEFT")
         table.setStyle([("FONT", (0,0), (-1,0), "Helvetica-Bold"),
                         ("FONT", (-2,-1), (-1,-1), "Helvetica-Bold"),
@@ -780,7 +1036,6 @@ class ReportPdf(object):
                         ("LINEAFTER", (8,0), (8,-2), 0.5, colors.black),
                         ("LINEAFTER", (9,0), (9,-2), 0.5, colors.black),
                         ("LINEAFTER", (10,0), (10,-2), 0.5, colors.black),
-                        ("LINEBELOW", (0,"splitlast"), (-1,"splitlast"), 0.5, colors.black),
                         ("ALIGN", (1,0), (1,-1),  "CENTER"),
                         ("ALIGN", (2,0), (2,-1),  "CENTER"),
                         ("ALIGN", (7,0), (7,-1),  "RIGHT"),
@@ -789,7 +1044,7 @@ class ReportPdf(object):
                         ("ALIGN", (10,0), (10,-1),  "RIGHT"),
                         ("TOPPADDING", (0,0), (-1,-1), 0),
                         ("BOTTOMPADDING", (0,0), (-1,-1), 0)])
-        self.story.append(table)
+        return table
         
     def _make_landscape_and_add_header(self, canvas, doc):
         canvas.saveState()
@@ -807,10 +1062,108 @@ class ReportPdf(object):
         canvas.drawString(self._LEFT_RIGHT_MARGIN_WIDTH, 
                           landscape(A4)[1] - self._TOP_BOTTOM_MARGIN_WIDTH - 2*self._HALF_CM,
                           "Start Date: " + str(self.start_date) + "  End Date: " + str(self.end_date))
+        canvas.drawRightString(landscape(A4)[0] - self._LEFT_RIGHT_MARGIN_WIDTH,
+                               landscape(A4)[1] - self._TOP_BOTTOM_MARGIN_WIDTH,
+                               "Page %d of %d" % (doc.page, self._num_pages))
         canvas.restoreState()
         
     def finalise(self):
         self.pdf.build(self.story, 
                        onFirstPage=self._make_landscape_and_add_header,
-                       onLaterPages=self._make_landscape_and_add_header,
-                       canvasmaker=ReportPdfPageXofYCanvas)
\ No newline at end of file
+                       onLaterPages=self._make_landscape_and_add_header)
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+    import tracemalloc
+    from decimal import Decimal
+    
+    class _SnapshotPageXofYCanvas(Canvas):
+        '''The ActiveState recipe that PoPdfPageXofYCanvas replaced, for 
+        comparison.
+        '''
+        
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._saved_page_states = []
+            
+        def showPage(self):
+            self._saved_page_states.append(dict(self.__dict__))
+            self._startPage()
+            
+        def save(self):
+            num_pages = len(self._saved_page_states)
+            for state in self._saved_page_states:
+                self.__dict__.update(state)
+                self.setFont("Helvetica", 8)
+                self.drawRightString(A4[0] - _LEFT_RIGHT_MARGIN_WIDTH, 
+                                     _TOP_BOTTOM_MARGIN_WIDTH,
+                    "Page %d of %d" % (self._pageNumber, num_pages))
+                Canvas.showPage(self)
+            Canvas.save(self)
+    
+    # Benchmark the peak memory of the "Page X of Y" canvases against the 
+    # number of pages. The snapshot recipe keeps the content of every page 
+    # until the document is saved. What remains for PoPdfPageXofYCanvas is 
+    # reportlab's own record of the pages, which it keeps until the 
+    # document is written.
+    print("Pages | Snapshot canvas peak (MB) | Form canvas peak (MB)")
+    for num_pages in (10, 100, 1000):
+        peaks = []
+        for canvas_class in (_SnapshotPageXofYCanvas, PoPdfPageXofYCanvas):
+            with tempfile.TemporaryDirectory() as temp_dir:
+                tracemalloc.start()
+                canvas = canvas_class(os.path.join(temp_dir, "canvas.pdf"), 
+                                      pagesize=A4)
+                for page in range(num_pages):
+                    canvas.setFont("Helvetica", 8)
+                    for line in range(60):
+                        canvas.drawString(_LEFT_RIGHT_MARGIN_WIDTH, 
+                                          A4[1] - (line + 2)*12, 
+                                          "Line item {} on page {}".format(
+                                                                line, page))
+                    canvas.showPage()
+                canvas.save()
+                peaks.append(tracemalloc.get_traced_memory()[1] / 2**20)
+                tracemalloc.stop()
+        print("{:5d} | {:25.1f} | {:21.1f}".format(num_pages, *peaks))
+    
+    # Benchmark the report PDF against the number of line items. The peak 
+    # memory traced while the PDF is built should not grow with the number of
+    # line items, beyond the line items themselves.
+    print("Line items | Pages | Build (s) | Peak build memory (MB)")
+    for num_line_items in (1000, 10000, 100000):
+        line_items = [["PO{:06d}".format(i // 10),
+                       "2016-01-01",
+                       "Placed",
+                       "P00000",
+                       "Supplier 0",
+                       "PN0-{}".format(i % 20),
+                       "Product",
+                       "R 123.45",
+                       "5%",
+                       "1",
+                       "R 117.28"] for i in range(num_line_items)]
+        line_prices = [Decimal("117.2775")] * num_line_items
+        total_value = "R {:,.2f}".format(sum(line_prices))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report = ReportPdf(os.path.join(temp_dir, "report.pdf"),
+                               "Items by Supplier",
+                               "Supplier 0",
+                               "2016-01-01",
+                               "2016-12-31",
+                               ReportPdfLineItemDetails(
+                                                    line_items, 
+                                                    total_value,
+                                                    line_prices=line_prices),
+                               "Acme Explosives (Pty) Ltd")
+            tracemalloc.start()
+            start = time.perf_counter()
+            report.build()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print("{:10d} | {:5d} | {:9.2f} | {:21.1f}".format(num_line_items,
+                                                           report._num_pages,
+                                                           elapsed,
+                                                           peak / 2**20))
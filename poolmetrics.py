@@ -0,0 +1,197 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import logging
+import threading
+import time
+from sqlalchemy import event
+
+
+class PoolMetrics(object):
+    '''Counters of the connection pool activity of an engine, e.g., to size 
+    the pool from the peak number of connections in use.
+    
+    The counters are updated by pool event listeners, and are protected by a 
+    lock since sessions may use the engine from several threads.
+    '''
+    
+    def __init__(self, engine):
+        '''Initialise the PoolMetrics object and start listening to the 
+        engine's pool events.
+        
+        Args:
+        :param engine: The engine whose pool is measured.
+        :type engine: sqlalchemy.engine.Engine
+        '''
+        self._engine = engine
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.total_hold_time = 0.0
+        self.max_hold_time = 0.0
+        # The checkout times of the checked out connections, by the id of 
+        # their connection record. The record's info dictionary is not used,
+        # since invalidating a connection clears it.
+        self._checkout_times = {}
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+        
+    def _on_checkout(self, dbapi_connection, connection_record, 
+                     connection_proxy):
+        checkout_time = time.perf_counter()
+        with self._lock:
+            self._checkout_times[id(connection_record)] = checkout_time
+            self.checkouts += 1
+            self.checked_out += 1
+            if self.checked_out > self.peak_checked_out:
+                self.peak_checked_out = self.checked_out
+        
+    def _on_checkin(self, dbapi_connection, connection_record):
+        checkin_time = time.perf_counter()
+        with self._lock:
+            self.checkins += 1
+            self.checked_out -= 1
+            checkout_time = self._checkout_times.pop(id(connection_record), 
+                                                     None)
+            if checkout_time is not None:
+                hold_time = checkin_time - checkout_time
+                self.total_hold_time += hold_time
+                if hold_time > self.max_hold_time:
+                    self.max_hold_time = hold_time
+            
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+            
+    def get_summary(self):
+        '''Get a summary of the pool activity, e.g., for logging.
+        
+        Returns:
+        :return: The summary.
+        :rtype: String
+        '''
+        with self._lock:
+            if self.checkins:
+                mean_hold_time = self.total_hold_time / self.checkins
+            else:
+                mean_hold_time = 0.0
+            return ("Connection pool: {} connects, {} checkouts, {} checkins, "
+                    "{} invalidations, {} checked out (peak {}), hold time "
+                    "mean {:.1f} ms, max {:.1f} ms. {}").format(
+                                            self.connects,
+                                            self.checkouts,
+                                            self.checkins,
+                                            self.invalidations,
+                                            self.checked_out,
+                                            self.peak_checked_out,
+                                            mean_hold_time * 1000,
+                                            self.max_hold_time * 1000,
+                                            self._engine.pool.status())
+    
+    def log_summary(self):
+        '''Log the summary of the pool activity at debug level.
+        '''
+        logging.debug(self.get_summary())
+
+if __name__ == '__main__':
+    # Drive many concurrent sessions through an engine with the default MySQL 
+    # pool options from settings.cfg. A SQLite database file stands in for 
+    # the MySQL server, using the same QueuePool as the MySQL engine.
+    import os
+    import shutil
+    import tempfile
+    from sqlalchemy import create_engine
+    from sqlalchemy.exc import TimeoutError
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import QueuePool
+    
+    pool_options = {"pool_size": 5,
+                    "max_overflow": 10,
+                    "pool_timeout": 30,
+                    "pool_recycle": 3600,
+                    "pool_pre_ping": True}
+    num_sessions = 50
+    transactions_per_session = 40
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(temp_dir, "loadtest.db")
+        engine = create_engine("sqlite:///{}".format(filename),
+                               poolclass=QueuePool,
+                               connect_args={"check_same_thread": False,
+                                             "timeout": 30},
+                               **pool_options)
+        engine.execute("CREATE TABLE purchase_order (id INTEGER PRIMARY KEY, "
+                       "order_number VARCHAR(20))")
+        metrics = PoolMetrics(engine)
+        Session = sessionmaker(bind=engine)
+        timeouts = []
+        def run_session(session_index):
+            for i in range(transactions_per_session):
+                session = Session()
+                try:
+                    session.execute("SELECT COUNT(*) FROM purchase_order")
+                    session.execute("INSERT INTO purchase_order "
+                                    "(order_number) VALUES (:order_number)",
+                                    {"order_number": "PO{}-{}".format(
+                                                        session_index, i)})
+                    session.commit()
+                except TimeoutError:
+                    session.rollback()
+                    timeouts.append(session_index)
+                finally:
+                    session.close()
+        threads = [threading.Thread(target=run_session, args=(i,))
+                   for i in range(num_sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        num_transactions = num_sessions * transactions_per_session
+        print(("{} sessions ran {} transactions in {:.2f} s "
+               "({:,.0f} transactions/s), {} pool timeouts.").format(
+                                        num_sessions,
+                                        num_transactions,
+                                        elapsed,
+                                        num_transactions / elapsed,
+                                        len(timeouts)))
+        print(metrics.get_summary())
+        print("Testing that every checkout was checked in...")
+        assert metrics.checked_out == 0
+        assert metrics.checkouts == metrics.checkins
+        print("Pass")
+        print("Testing that the pool did not exceed its size plus overflow...")
+        assert metrics.peak_checked_out <= pool_options["pool_size"] + \
+                                           pool_options["max_overflow"]
+        print("Pass")
+        engine.dispose()
+    finally:
+        shutil.rmtree(temp_dir)
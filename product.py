@@ -17,7 +17,7 @@ this program. If not, see <http://www.gnu.org/licenses/>.
 Contact: paulosvnleal@gmail.com
 '''
 
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Column, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import Integer, Boolean
 from sqlabase import Base
@@ -29,6 +29,11 @@ class Product(Base):
     '''
     __tablename__ = "product"
     
+    # Secondary indexes. Existing databases get them from the schema 
+    # migrations. The index also serves the lookups on supplier_id alone.
+    __table_args__ = (Index("ix_product_supplier_id_part_number", 
+                            "supplier_id", "part_number"),)
+    
     # Columns
     id = Column(Integer, primary_key=True, autoincrement=True,
                 nullable=False)
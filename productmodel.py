@@ -20,18 +20,21 @@ Contact: paulosvnleal@gmail.com
 from decimal import Decimal
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
-from conversions import (monetary_int_to_decimal, monetary_decimal_to_int,
+from conversions import (get_money, monetary_int_to_decimal, 
+                         monetary_decimal_to_int,
                          monetary_float_to_int, percentage_int_to_decimal, 
                          percentage_decimal_to_int)
 from datavalidation import (TextFieldValidator, warn_about_changing_used_data, 
                             show_error_rows_with_default_values,
                             DecimalFieldValidator, 
                             show_error_rows_with_zero_prices)
+from incrementalmodel import IncrementalTableModel
 from product import Product
 from purchaseorderproduct import PurchaseOrderProduct
+from usageindex import UsageIndex
 
 
-class ProductModel(QAbstractTableModel):
+class ProductModel(IncrementalTableModel):
     '''Data model for the product table.
     '''
 
@@ -51,8 +54,9 @@ class ProductModel(QAbstractTableModel):
     def __init__(self, app_config, session, supplier_id, parent=None):
         '''Initialise the ProductModel object.
         
-        Loads a local products list (self.products) with the result of a query
-        for all products with the specified supplier ID.
+        The products with the specified supplier ID are loaded from the 
+        database a page at a time. Refer to 
+        :class:`incrementalmodel.IncrementalTableModel`.
         
         Args:
         :param session: The SQLAlchemny session in use. 
@@ -64,19 +68,27 @@ class ProductModel(QAbstractTableModel):
         :param parent: The model's parent.
         :type parent: QObject
         '''
-        super().__init__(parent=parent)
-        self.session = session
-        self.app_config = app_config
+        # The supplier ID is required by _base_query, which is called by the 
+        # parent's initialiser.
         self.supplier_id = supplier_id
-        with self.session.no_autoflush:
-            self.products = self.session.query(Product).\
-                            filter(Product.supplier_id == self.supplier_id).\
-                            all()
-     
-    def rowCount(self, index=QModelIndex()):
-        '''Refer to QAbstractItemModel.rowCount.
+        super().__init__(session, Product, parent=parent)
+        self.app_config = app_config
+        # The products referenced in purchase orders, loaded when first 
+        # required.
+        self._usage_index = UsageIndex(self.session, 
+                                       PurchaseOrderProduct.product_id)
+        
+    @property
+    def products(self):
+        '''The products loaded so far.
+        '''
+        return self._rows
+    
+    def _base_query(self):
+        '''Refer to IncrementalTableModel._base_query.
         '''
-        return len(self.products) 
+        return self.session.query(Product).\
+                    filter(Product.supplier_id == self.supplier_id)
 
     def columnCount(self, index=QModelIndex()):
         '''Refer to QAbstractItemModel.columnCount.
@@ -97,10 +109,8 @@ class ProductModel(QAbstractTableModel):
             elif column == self.PRODUCT_DESCRIPTION_COLUMN:
                 return product.product_description
             elif column == self.CURRENT_PRICE_COLUMN:
-                converted_value = monetary_int_to_decimal(
-                                                    product.current_price, 
-                                                    self.app_config)
-                return "R {:,.2f}".format(converted_value)
+                return get_money(self.app_config).format_int(
+                                                    product.current_price)
             elif column == self.CURRENT_DISCOUNT_COLUMN:
                 converted_value = percentage_int_to_decimal(
                                                     product.current_discount)
@@ -301,12 +311,7 @@ class ProductModel(QAbstractTableModel):
             otherwise.
         :rtype: Boolean 
         '''
-        with self.session.no_autoflush:
-            if self.session.query(PurchaseOrderProduct).\
-                filter(PurchaseOrderProduct.product_id == product_id).\
-                count() > 0:
-                return True
-            return False
+        return self._usage_index.is_used(product_id)
     
     def _is_part_number_valid(self, part_number, check_unique=True):
         '''Determines if a product part number is valid.
@@ -332,10 +337,14 @@ class ProductModel(QAbstractTableModel):
         :return: True if the part number is valid. False otherwise.
         :rtype: Boolean 
         '''
+        if check_unique:
+            part_numbers = self._get_column_values(Product.part_number)
+        else:
+            part_numbers = [p.part_number for p in self.products]
         validator = TextFieldValidator(
                                     "product part number",
                                     part_number,
-                                    [p.part_number for p in self.products],
+                                    part_numbers,
                                     self._PART_NUMBER_DEFAULT,
                                     check_unique=check_unique)
         return validator.field_is_valid()
@@ -421,10 +430,14 @@ class ProductModel(QAbstractTableModel):
         :return: True if the product description is valid. False otherwise.
         :rtype: Boolean
         '''
+        if check_unique:
+            descriptions = self._get_column_values(Product.product_description)
+        else:
+            descriptions = [p.product_description for p in self.products]
         validator = TextFieldValidator(
                                 "product description",
                                 product_description,
-                                [p.product_description for p in self.products],
+                                descriptions,
                                 self._PRODUCT_DESCRIPTON_DEFAULT,
                                 check_unique=check_unique)
         return validator.field_is_valid()
@@ -526,7 +539,7 @@ class ProductModel(QAbstractTableModel):
                         supplier_id=self.supplier_id,
                         archived=False)
         self.session.add(new_product)
-        self.products.append(new_product)
+        self._append_new_row(new_product)
         self.endInsertRows()
         return True
     
@@ -644,6 +657,8 @@ class ProductModel(QAbstractTableModel):
         :rtype: Boolean
         '''
         allowed = True
+        # New products are added after the last product in the database.
+        self.fetch_all()
         if self.rowCount() == 0:
             return allowed
         row = self.rowCount() - 1
@@ -25,7 +25,7 @@ from PyQt4.QtGui import *
 import ui_productsdialog
 from sqlasession import session_scope
 from productmodel import ProductModel
-from suppliermodel import SupplierModel
+from referencedata import get_reference_data
 from customdelegates import PercentageEditDelegate
 
 
@@ -77,49 +77,33 @@ class ProductsDialog(QDialog, ui_productsdialog.Ui_productsDialog):
         # Note that the call to the clear function will result in a call to the  
         # on_supplierComboBox_currentIndexChanged function.
         self.supplierComboBox.clear()
-        supplier_model = SupplierModel(self.app_config, self.session)
-        supplier_list = supplier_model.get_supplier_list()
+        reference_data = get_reference_data(self.session)
+        supplier_list = reference_data.suppliers.names()
         if len(supplier_list) > 0:
             for supplier in supplier_list:
                 self.supplierComboBox.addItem(supplier)
         # Set the current index of the combo box after calling this function.
 
     def update_supplier_info(self):
-        supplier_model = SupplierModel(self.app_config, self.session)
+        # The combo box lists the suppliers in the same order as the reference
+        # data.
+        suppliers = get_reference_data(self.session).suppliers.records()
         supplier_row = self.supplierComboBox.currentIndex()
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.ADDRESS_COLUMN)
-        self.supplierAddressLabel.setText(
-                                    supplier_model.data(supplier_model_index))
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.CONTACT_PERSON_NAME_COLUMN)
-        self.supplierContactLabel.setText(
-                                    supplier_model.data(supplier_model_index))
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.PHONE_NUMBER_COLUMN)
-        self.supplierPhoneLabel.setText(
-                                    supplier_model.data(supplier_model_index))
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.FAX_NUMBER_COLUMN)
-        self.supplierFaxLabel.setText(
-                                    supplier_model.data(supplier_model_index))
-        supplier_model_index = supplier_model.createIndex(
-                                    supplier_row,
-                                    SupplierModel.EMAIL_ADDRESS_COLUMN)
-        self.supplierEmailLabel.setText(supplier_model.data(
-                                                        supplier_model_index))
+        if supplier_row < 0 or supplier_row >= len(suppliers):
+            return
+        supplier = suppliers[supplier_row]
+        self.supplierAddressLabel.setText(supplier.address)
+        self.supplierContactLabel.setText(supplier.contact_person_name)
+        self.supplierPhoneLabel.setText(supplier.phone_number)
+        self.supplierFaxLabel.setText(supplier.fax_number)
+        self.supplierEmailLabel.setText(supplier.email_address)
 
     @pyqtSignature("const QString&")
     def on_supplierComboBox_currentIndexChanged(self, text):
         if self.model:
             del self.model
-        supplier_model = SupplierModel(self.app_config, self.session)
-        self.supplier_id = supplier_model.\
-            get_supplier_id_from_company_name(text)
+        reference_data = get_reference_data(self.session)
+        self.supplier_id = reference_data.suppliers.get_by_name(text).id
         self.model = ProductModel(self.app_config, self.session, 
                                   self.supplier_id)
         self.tableView.setModel(self.model)
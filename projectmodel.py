@@ -19,13 +19,15 @@ Contact: paulosvnleal@gmail.com
 
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
+from incrementalmodel import IncrementalTableModel
 from project import Project
 from purchaseorder import PurchaseOrder
 from datavalidation import (TextFieldValidator, warn_about_changing_used_data,
                             show_error_rows_with_default_values)
+from usageindex import UsageIndex
 
 
-class ProjectModel(QAbstractTableModel):
+class ProjectModel(IncrementalTableModel):
     '''Data model for the project table.
     '''
 
@@ -43,8 +45,8 @@ class ProjectModel(QAbstractTableModel):
     def __init__(self, session, parent=None):
         '''Initialise the ProjectModel object.
         
-        Loads a local projects list (self.projects) with the result of a query
-        for all projects in the database.
+        The projects are loaded from the database a page at a time. Refer to 
+        :class:`incrementalmodel.IncrementalTableModel`.
         
         Args:
         :param session: The SQLAlchemny session in use. 
@@ -53,15 +55,17 @@ class ProjectModel(QAbstractTableModel):
         :param parent: The model's parent.
         :type parent: QObject
         '''
-        super().__init__(parent=parent)
-        self.session = session
-        with self.session.no_autoflush:
-            self.projects = self.session.query(Project).all()
-        
-    def rowCount(self, index=QModelIndex()):
-        '''Refer to QAbstractItemModel.rowCount.
+        super().__init__(session, Project, parent=parent)
+        # The projects referenced in purchase orders, loaded when first 
+        # required.
+        self._usage_index = UsageIndex(self.session, 
+                                       PurchaseOrder.project_id)
+        
+    @property
+    def projects(self):
+        '''The projects loaded so far.
         '''
-        return len(self.projects) 
+        return self._rows
 
     def columnCount(self, index=QModelIndex()):
         '''Refer to QAbstractItemModel.columnCount.
@@ -233,11 +237,7 @@ class ProjectModel(QAbstractTableModel):
             otherwise.
         :rtype: Boolean
         '''
-        with self.session.no_autoflush:
-            if self.session.query(PurchaseOrder).\
-                filter(PurchaseOrder.project_id == project_id).count() > 0:
-                return True
-            return False
+        return self._usage_index.is_used(project_id)
                 
     def _is_project_code_valid(self, code, check_unique=True):
         '''Determines if a project code is valid.
@@ -263,10 +263,14 @@ class ProjectModel(QAbstractTableModel):
         :return: True if the code is valid. False otherwise.
         :rtype: Boolean 
         '''
+        if check_unique:
+            codes = self._get_column_values(Project.code)
+        else:
+            codes = [p.code for p in self.projects]
         validator = TextFieldValidator(
                                 "project code",
                                 code,
-                                [p.code for p in self.projects],
+                                codes,
                                 self._CODE_DEFAULT,
                                 check_unique=check_unique)
         return validator.field_is_valid()
@@ -344,10 +348,14 @@ class ProjectModel(QAbstractTableModel):
         :return: True if the description is valid. False otherwise.
         :rtype: Boolean 
         '''
+        if check_unique:
+            descriptions = self._get_column_values(Project.description)
+        else:
+            descriptions = [p.description for p in self.projects]
         validator = TextFieldValidator(
                                 "project description",
                                 description,
-                                [p.description for p in self.projects],
+                                descriptions,
                                 self._DESCRIPTION_DEFAULT,
                                 check_unique=check_unique)
         return validator.field_is_valid()
@@ -364,7 +372,7 @@ class ProjectModel(QAbstractTableModel):
                               description=self._DESCRIPTION_DEFAULT,
                               completed=False)
         self.session.add(new_project)
-        self.projects.append(new_project)
+        self._append_new_row(new_project)
         self.endInsertRows()
         return True
         
@@ -376,10 +384,7 @@ class ProjectModel(QAbstractTableModel):
             database.
         :rtype: List of strings
         '''
-        project_code_list = []
-        for project in self.projects:
-            project_code_list.append(project.code)
-        return project_code_list
+        return self._get_column_values(Project.code)
 
     def is_save_allowed(self):
         '''Perform any necessary validation before saving the data.
@@ -466,6 +471,8 @@ class ProjectModel(QAbstractTableModel):
         :rtype: Boolean
         '''
         allowed = True
+        # New projects are added after the last project in the database.
+        self.fetch_all()
         if self.rowCount() == 0:
             return allowed
         row = self.rowCount() - 1
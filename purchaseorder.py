@@ -17,7 +17,7 @@ this program. If not, see <http://www.gnu.org/licenses/>.
 Contact: paulosvnleal@gmail.com
 '''
 
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Column, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import Integer, Date, Text, Enum
 from sqlabase import Base
@@ -48,6 +48,16 @@ class PurchaseOrder(Base):
     '''
     __tablename__ = "purchase_order"
     
+    # Secondary indexes. Existing databases get them from the schema 
+    # migrations. The order number index is not unique, because existing 
+    # databases may contain duplicate order numbers.
+    __table_args__ = (Index("ix_purchase_order_supplier_id_order_date", 
+                            "supplier_id", "order_date"),
+                      Index("ix_purchase_order_project_id_order_date", 
+                            "project_id", "order_date"),
+                      Index("ix_purchase_order_order_date", "order_date"),
+                      Index("ix_purchase_order_order_number", "order_number"))
+    
     # Columns
     id = Column(Integer, primary_key=True, autoincrement=True,
                 nullable=False)
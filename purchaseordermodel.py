@@ -22,10 +22,16 @@ import logging
 from decimal import Decimal
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
-from conversions import (monetary_int_to_decimal, monetary_decimal_to_int,
+from sqlalchemy.orm import joinedload
+from conversions import (get_money, monetary_decimal_to_int,
                          percentage_int_to_decimal)
+from dbfieldsizes import ORDER_NUMBER_STRING_LENGTH
+from incrementalmodel import IncrementalTableModel
+from ordernumbers import allocate_order_numbers
 from project import Project
 from purchaseorder import PurchaseOrder
+from referencedata import get_reference_data
+from rowcache import RowDisplayCache
 from supplier import Supplier
 from userconfigmodel import UserConfigReader
 
@@ -38,12 +44,12 @@ class PrerequisitesError(Exception):
 
 
 class PurchaseOrderNumberError(Exception):
-    '''Exception raised if the calculated order number has been used before. 
+    '''Exception raised if the calculated order number cannot be used. 
     '''
     pass
 
 
-class PurchaseOrderModel(QAbstractTableModel):
+class PurchaseOrderModel(IncrementalTableModel):
     '''Data model for the purchase order table.
     '''
 
@@ -66,8 +72,8 @@ class PurchaseOrderModel(QAbstractTableModel):
     def __init__(self, app_config, session, parent=None):
         '''Initialise the PurchaseOrderModel object.
         
-        Loads a local purchase orders list (self.purchase_orders) with the 
-        result of a query for all purchase orders.
+        The purchase orders are loaded from the database a page at a time. 
+        Refer to :class:`incrementalmodel.IncrementalTableModel`.
         
         Args:
         :param session: The SQLAlchemny session in use. 
@@ -76,22 +82,41 @@ class PurchaseOrderModel(QAbstractTableModel):
         :param parent: The model's parent.
         :type parent: QObject
         '''
-        super().__init__(parent=parent)
-        self.session = session
+        super().__init__(session, PurchaseOrder, parent=parent)
         self.app_config = app_config
-        with self.session.no_autoflush:
-            self.purchase_orders = self.session.query(PurchaseOrder).all()
+        # The display values of the loaded rows, which are formatted once and 
+        # reused for painting and sorting until the row changes.
+        self._display_cache = RowDisplayCache(self, self._format_row)
+        
+    @property
+    def purchase_orders(self):
+        '''The purchase orders loaded so far.
+        '''
+        return self._rows
+    
+    def _apply_loader_options(self, query):
+        '''Refer to IncrementalTableModel._apply_loader_options.
+        
+        The project, supplier and user config of each purchase order are read 
+        by :meth:`data`. They are joined into the query that loads each page, 
+        instead of being lazy loaded one row at a time, e.g., when a sort 
+        proxy model sorts on the project or supplier column.
+        '''
+        return query.options(joinedload(PurchaseOrder.project),
+                             joinedload(PurchaseOrder.supplier),
+                             joinedload(PurchaseOrder.user_config))
         
     def do_pre_commit_processing(self):
         '''Perform any processing required before a commit.
         '''
         pass
-        
-    def rowCount(self, index=QModelIndex()):
-        '''Refer to QAbstractItemModel.rowCount.
+    
+    def refresh_display(self):
+        '''Format all of the loaded rows again, e.g., after a rollback or after
+        the related projects or suppliers have been edited.
         '''
-        return len(self.purchase_orders)
-
+        self._display_cache.refresh()
+        
     def columnCount(self, index=QModelIndex()):
         '''Refer to QAbstractItemModel.columnCount.
         '''
@@ -105,56 +130,13 @@ class PurchaseOrderModel(QAbstractTableModel):
             return None
         order = self.purchase_orders[index.row()]
         column = index.column()
-        if role == Qt.DisplayRole or role == Qt.EditRole:
-            if column == self.ORDER_NUMBER_COLUMN:
-                return order.order_number
-            elif column == self.ORDER_DATE_COLUMN:
-                date = QDate(order.order_date.year,
-                             order.order_date.month,
-                             order.order_date.day)
-                return date
-            elif column == self.DELIVERY_ADDRESS_COLUMN:
-                return order.delivery_address
-            elif column == self.DELIVERY_ADDRESS_GPS_COORDINATES_COLUMN:
-                return order.delivery_address_gps_coordinates
-            elif column == self.DELIVERY_DATE_COLUMN:
-                date = QDate(order.delivery_date.year,
-                             order.delivery_date.month,
-                             order.delivery_date.day)
-                return datetime
-            elif column == self.PAYMENT_TERMS_COLUMN:
-                return order.payment_terms
-            elif column == self.ORDER_STATUS_COLUMN:
-                return order.order_status
-            elif column == self.NOTES_COLUMN:
-                return order.notes
-            elif column == self.TAX_RATE_COLUMN:
-                # Display tax rate as % with two digits and no decimal point.
-                # The tax rate is in the referenced user config record. 
-                return "{:2.0%}".format(percentage_int_to_decimal(
-                                                order.user_config.tax_rate))
-            elif column == self.TOTAL_EXCLUDING_TAX_COLUMN:
-                # Display totals with two decimal places and comma separators.
-                converted_value = monetary_int_to_decimal(
-                                                    order.total_excluding_tax, 
-                                                    self.app_config)
-                return "R {:,.2f}".format(converted_value)
-            elif column == self.TOTAL_TAX_COLUMN:
-                converted_value = monetary_int_to_decimal(
-                                                    order.total_tax, 
-                                                    self.app_config)
-                return "R {:,.2f}".format(converted_value)
-            elif column == self.TOTAL_INCLUDING_TAX_COLUMN:
-                converted_value = monetary_int_to_decimal(
-                                                    order.total_including_tax, 
-                                                    self.app_config)
-                return "R {:,.2f}".format(converted_value)
-            elif column == self.PROJECT_CODE_COLUMN:
-                return order.project.code
-            elif column == self.SUPPLIER_COMPANY_NAME_COLUMN:
-                return order.supplier.company_name
+        if role == Qt.DisplayRole:
+            if 0 <= column < self.PURCHASE_ORDER_NUM_COLUMNS:
+                return self._display_cache.get(index.row())[column]
             else:
                 return None
+        elif role == Qt.EditRole:
+            return self._get_value(order, column)
         elif role == Qt.TextAlignmentRole:
             if column == self.TAX_RATE_COLUMN:
                 return Qt.AlignHCenter | Qt.AlignVCenter
@@ -167,6 +149,77 @@ class PurchaseOrderModel(QAbstractTableModel):
         else:
             return None
         
+    def _get_value(self, order, column):
+        '''Get the value of a column of a purchase order, for display or 
+        editing.
+        
+        Args:
+        :param order: The purchase order.
+        :type order: purchaseorder.PurchaseOrder
+        :param column: The column.
+        :type column: Integer
+        
+        Returns:
+        :return: The value of the column.
+        '''
+        if column == self.ORDER_NUMBER_COLUMN:
+            return order.order_number
+        elif column == self.ORDER_DATE_COLUMN:
+            date = QDate(order.order_date.year,
+                         order.order_date.month,
+                         order.order_date.day)
+            return date
+        elif column == self.DELIVERY_ADDRESS_COLUMN:
+            return order.delivery_address
+        elif column == self.DELIVERY_ADDRESS_GPS_COORDINATES_COLUMN:
+            return order.delivery_address_gps_coordinates
+        elif column == self.DELIVERY_DATE_COLUMN:
+            date = QDate(order.delivery_date.year,
+                         order.delivery_date.month,
+                         order.delivery_date.day)
+            return datetime
+        elif column == self.PAYMENT_TERMS_COLUMN:
+            return order.payment_terms
+        elif column == self.ORDER_STATUS_COLUMN:
+            return order.order_status
+        elif column == self.NOTES_COLUMN:
+            return order.notes
+        elif column == self.TAX_RATE_COLUMN:
+            # Display tax rate as % with two digits and no decimal point.
+            # The tax rate is in the referenced user config record. 
+            return "{:2.0%}".format(percentage_int_to_decimal(
+                                            order.user_config.tax_rate))
+        elif column == self.TOTAL_EXCLUDING_TAX_COLUMN:
+            # Display totals with the currency symbol and comma separators.
+            return get_money(self.app_config).format_int(
+                                                order.total_excluding_tax)
+        elif column == self.TOTAL_TAX_COLUMN:
+            return get_money(self.app_config).format_int(order.total_tax)
+        elif column == self.TOTAL_INCLUDING_TAX_COLUMN:
+            return get_money(self.app_config).format_int(
+                                                order.total_including_tax)
+        elif column == self.PROJECT_CODE_COLUMN:
+            return order.project.code
+        elif column == self.SUPPLIER_COMPANY_NAME_COLUMN:
+            return order.supplier.company_name
+        else:
+            return None
+        
+    def _format_row(self, row):
+        '''Format the display values of a row, for the display cache.
+        
+        Args:
+        :param row: The row.
+        :type row: Integer
+        
+        Returns:
+        :return: The value of each column. Refer to :meth:`_get_value`.
+        :rtype: List
+        '''
+        order = self.purchase_orders[row]
+        return [self._get_value(order, column) 
+                for column in range(self.PURCHASE_ORDER_NUM_COLUMNS)]
+        
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         '''Refer to QAbstractItemModel.headerData.
         '''
@@ -359,10 +412,13 @@ class PurchaseOrderModel(QAbstractTableModel):
         row = index.row()
         if project_code != \
                         self.purchase_orders[row].project.code:
+            # Look the project up in the reference data, so that the query 
+            # only needs to check the session's identity map.
+            project_id = get_reference_data(self.session).projects.\
+                            get_by_name(project_code).id
             with self.session.no_autoflush:
                 self.purchase_orders[row].project = \
-                    self.session.query(Project).\
-                    filter(Project.code == project_code).one()
+                    self.session.query(Project).get(project_id)
                 # Emit the data changed signal.
                 self.emit(SIGNAL("dataChanged(QModelIndex,QModelIndex)"),
                           index, index)
@@ -383,10 +439,13 @@ class PurchaseOrderModel(QAbstractTableModel):
         '''
         row = index.row()
         if company_name != self.purchase_orders[row].supplier.company_name:
+            # Look the supplier up in the reference data, so that the query 
+            # only needs to check the session's identity map.
+            supplier_id = get_reference_data(self.session).suppliers.\
+                            get_by_name(company_name).id
             with self.session.no_autoflush:
                 self.purchase_orders[row].supplier = \
-                    self.session.query(Supplier).\
-                    filter(Supplier.company_name == company_name).one()
+                    self.session.query(Supplier).get(supplier_id)
                 # Emit the data changed signal.
                 self.emit(SIGNAL("dataChanged(QModelIndex,QModelIndex)"),
                           index, index)
@@ -455,32 +514,29 @@ class PurchaseOrderModel(QAbstractTableModel):
         each time a new purchase order is created. The purchase order number
         does not correlate to the purchase order primary key.
         
-        The <Prefix> comes from the application settings file.
+        The <Prefix> comes from the application settings file. The number is 
+        allocated from the prefix's sequence in the database, which is safe 
+        when several clients share the database, and numbers that are used 
+        already are skipped. Refer to :mod:`ordernumbers`.
         
         Returns:
         :return: The order number in the form <Prefix>XXXXX.
         :rtype: String
         
         Raises:
-        :raises: PurchaseOrderNumberError if it is found that the calculated
-            purchase order number has been used before.
+        :raises: PurchaseOrderNumberError if the allocated purchase order 
+            number does not fit in the order number column.
         '''
         with self.session.no_autoflush:
-            result = self.session.query(PurchaseOrder).count()
-        if result == 0:
-            new_order_number_int = 1
-        else:
-            new_order_number_int = result + 1
-        new_order_number = "{}{:05d}".format(
-                                self.app_config.purchaseorder.number_prefix,
-                                new_order_number_int)
-        # Make sure that the purchase order number has not been used before.
-        if self.session.query(PurchaseOrder).\
-            filter(PurchaseOrder.order_number == new_order_number).\
-            count() != 0:
+            new_order_number = allocate_order_numbers(
+                                self.session,
+                                self.app_config.purchaseorder.number_prefix)[0]
+        if len(new_order_number) > ORDER_NUMBER_STRING_LENGTH:
             raise PurchaseOrderNumberError(
-                            ("The calculated order number ({}) "
-                             "has been used before.").format(new_order_number))
+                            ("The allocated order number ({}) is longer than "
+                             "{} characters.").format(
+                                                new_order_number,
+                                                ORDER_NUMBER_STRING_LENGTH))
         return new_order_number
     
     def insertRows(self, position, rows=1, index=QModelIndex()):
@@ -512,7 +568,7 @@ class PurchaseOrderModel(QAbstractTableModel):
                     total_excluding_tax=0,
                     total_tax=0,
                     total_including_tax=0,
-                    user_config_id=user_config.db_record.id)
+                    user_config_id=user_config.record_id)
         with self.session.no_autoflush:
             if self.session.query(Supplier).count() != 0:
                 new_po.supplier = self.session.query(Supplier).\
@@ -529,7 +585,7 @@ class PurchaseOrderModel(QAbstractTableModel):
                                     "The purchase order model requires at "
                                     "least one project. But none were found.")
         self.session.add(new_po)
-        self.purchase_orders.append(new_po)
+        self._append_new_row(new_po)
         self.endInsertRows()
         return True
     
@@ -545,7 +601,91 @@ class PurchaseOrderModel(QAbstractTableModel):
         :return: The requested purchase order object.
         :rtype: sqlasession.PurchaseOrder
         '''
+        self.fetch_to_row(row)
         if (0 <= row < self.rowCount()):
             return self.purchase_orders[row]
     
-    
\ No newline at end of file
+
+if __name__ == '__main__':
+    # Check the number of SQL statements issued to load the purchase orders, 
+    # read their display columns and sort them by supplier, using an in-memory 
+    # SQLite database. The number must not depend on the number of purchase 
+    # orders other than through the number of pages.
+    import sys
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from sqlabase import Base
+    # Import the remaining database class definitions so that SQL Alchemy 
+    # knows what they are.
+    from product import Product
+    from purchaseorderproduct import PurchaseOrderProduct
+    from userconfig import UserConfig
+    
+    _NUM_PURCHASE_ORDERS = 50000
+    _NUM_SUPPLIERS = 50
+    _NUM_PROJECTS = 20
+    
+    app = QApplication(sys.argv)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    engine.execute(UserConfig.__table__.insert(),
+                   [{"created_date_time": datetime.datetime.now(),
+                     "company_physical_address": "Address",
+                     "company_postal_address": "Address",
+                     "company_phone_number": "012 345 6789",
+                     "company_signatory_name": "Signatory",
+                     "default_payment_terms": "Pay in 30 days",
+                     "default_order_status": "Draft",
+                     "tax_rate": 14}])
+    engine.execute(Supplier.__table__.insert(),
+                   [{"company_name": "Supplier {:02d}".format(i),
+                     "address": "Address",
+                     "archived": False} for i in range(_NUM_SUPPLIERS)])
+    engine.execute(Project.__table__.insert(),
+                   [{"code": "P{:05d}".format(i),
+                     "description": "Project {}".format(i),
+                     "completed": False} for i in range(_NUM_PROJECTS)])
+    engine.execute(PurchaseOrder.__table__.insert(),
+                   [{"order_number": "PO{:06d}".format(i),
+                     "order_date": datetime.date(2016, 1, 1),
+                     "delivery_address": "Address",
+                     "delivery_date": datetime.date(2016, 1, 1),
+                     "payment_terms": "Pay in 30 days",
+                     "order_status": "Placed",
+                     "total_excluding_tax": 0,
+                     "total_tax": 0,
+                     "total_including_tax": 0,
+                     "project_id": (i % _NUM_PROJECTS) + 1,
+                     "supplier_id": ((i * 7) % _NUM_SUPPLIERS) + 1,
+                     "user_config_id": 1} for i in range(_NUM_PURCHASE_ORDERS)])
+    
+    statement_count = [0]
+    def count_statement(conn, cursor, statement, parameters, context, 
+                        executemany):
+        statement_count[0] += 1
+    event.listen(engine, "before_cursor_execute", count_statement)
+    
+    session = sessionmaker(bind=engine)()
+    model = PurchaseOrderModel(None, session)
+    model.fetch_all()
+    num_pages = (_NUM_PURCHASE_ORDERS // model.PAGE_SIZE) + 1
+    print("Testing that loading {} purchase orders issues one statement per "
+          "page plus one count...".format(_NUM_PURCHASE_ORDERS))
+    assert statement_count[0] == num_pages + 1, statement_count[0]
+    print("Pass")
+    print("Testing that reading the project, supplier and tax rate columns "
+          "issues no statements...")
+    statement_count[0] = 0
+    for row in range(model.rowCount()):
+        for column in (model.PROJECT_CODE_COLUMN, 
+                       model.SUPPLIER_COMPANY_NAME_COLUMN,
+                       model.TAX_RATE_COLUMN):
+            model.data(model.index(row, column))
+    assert statement_count[0] == 0, statement_count[0]
+    print("Pass")
+    print("Testing that sorting by supplier issues no statements...")
+    proxy_model = QSortFilterProxyModel()
+    proxy_model.setSourceModel(model)
+    proxy_model.sort(model.SUPPLIER_COMPANY_NAME_COLUMN)
+    assert statement_count[0] == 0, statement_count[0]
+    print("Pass")
@@ -0,0 +1,44 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+from sqlalchemy import Column, String
+from sqlalchemy.types import Integer
+from sqlabase import Base
+from dbfieldsizes import ORDER_NUMBER_STRING_LENGTH
+
+
+class PurchaseOrderNumberSequence(Base):
+    '''SQLAlchemy class used to map to the purchase_order_number_sequence table
+    in the database.
+    
+    There is one record per purchase order number prefix, holding the next 
+    number to be allocated with that prefix. Refer to :mod:`ordernumbers`.
+    '''
+    __tablename__ = "purchase_order_number_sequence"
+    
+    # Columns
+    prefix = Column(String(ORDER_NUMBER_STRING_LENGTH), primary_key=True, 
+                    nullable=False)
+    
+    next_number = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return ("<PurchaseOrderNumberSequence(prefix='%s',"
+                "next_number='%s')>") % (self.prefix, 
+                                         str(self.next_number))
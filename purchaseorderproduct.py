@@ -17,7 +17,7 @@ this program. If not, see <http://www.gnu.org/licenses/>.
 Contact: paulosvnleal@gmail.com
 '''
 
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import Numeric, Integer
 from sqlabase import Base
@@ -29,6 +29,16 @@ class PurchaseOrderProduct(Base):
     '''
     __tablename__ = "purchase_order_product"
     
+    # Secondary indexes. Existing databases get them from the schema 
+    # migrations. The unique index also serves the lookups on 
+    # purchase_order_id alone.
+    __table_args__ = (Index(
+                        "ux_purchase_order_product_purchase_order_id_product_id",
+                        "purchase_order_id", "product_id", 
+                        unique=True),
+                      Index("ix_purchase_order_product_product_id", 
+                            "product_id"))
+    
     # Columns
     id = Column(Integer, primary_key=True, autoincrement=True,
                 nullable=False)
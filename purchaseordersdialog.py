@@ -32,6 +32,9 @@ class PurchaseOrdersDialog(QDialog,
         self.session = session
         self.app_config = app_config
         self.model = PurchaseOrderModel(self.app_config, self.session)
+        # Default to the last purchase order loaded. The rows after it are only
+        # loaded as the table is scrolled, and selecting one of them would 
+        # load every page up to it.
         self.selected_row = self.model.rowCount() - 1
         self.buttonBox.connect(self.buttonBox, SIGNAL("accepted()"), 
                                self.accepted)
@@ -0,0 +1,335 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from product import Product
+from project import Project
+from supplier import Supplier
+
+
+# The key of the reference data in the session's info dictionary.
+_SESSION_INFO_KEY = "podb_reference_data"
+
+
+class ReferenceTable(object):
+    '''A read-only, in-memory copy of a small table that the user interface 
+    refers to often, e.g., the suppliers listed in a combo box. 
+    
+    The table is loaded with a single query the first time it is used. After 
+    that, the rows written or deleted each time the session flushes are 
+    updated in place, so that the lookups do not require a query. If the 
+    session is rolled back, the table is discarded and loaded again when it 
+    is next used.
+    
+    The rows are held as named tuples of the column values, rather than as 
+    mapped objects, so that reading them after a commit does not cause the 
+    session to refresh them. Bulk updates that bypass the session's unit of 
+    work are not seen until the table is invalidated.
+    '''
+    
+    def __init__(self, session, mapped_class, name_column=None):
+        '''Initialise the ReferenceTable object.
+        
+        Args:
+        :param session: The SQLAlchemny session in use. 
+        :type session: Session object (the class created by the call to  
+            :func:`sessionmaker` in :mod:`sqlasession`).
+        :param mapped_class: The class mapped to the table, e.g., Supplier.
+        :type mapped_class: Class derived from sqlabase.Base
+        :param name_column: The unique column used to look up rows by name, 
+            e.g., Supplier.company_name, or None if rows are not looked up by
+            name.
+        :type name_column: sqlalchemy.orm.attributes.InstrumentedAttribute
+        '''
+        self.session = session
+        self._mapped_class = mapped_class
+        self._name_key = name_column.key if name_column is not None else None
+        self._keys = [attribute.key for attribute in 
+                      inspect(mapped_class).column_attrs]
+        self._record_type = namedtuple(mapped_class.__name__ + "Record", 
+                                       self._keys)
+        self._records_by_id = None
+        self._sorted_records = None
+        self._records_by_name = None
+        
+    def _load(self):
+        '''Load all the rows of the table from the database.
+        
+        Objects that have not been flushed yet are not included. They are 
+        added when the session flushes them.
+        '''
+        columns = [getattr(self._mapped_class, key) for key in self._keys]
+        with self.session.no_autoflush:
+            query = self.session.query(*columns)
+            self._records_by_id = {}
+            for values in query:
+                record = self._record_type(*values)
+                self._records_by_id[record.id] = record
+        self._sorted_records = None
+        self._records_by_name = None
+    
+    def _get_records_by_id(self):
+        '''Get the dictionary of records keyed by primary key, loading it if 
+        required.
+        '''
+        if self._records_by_id is None:
+            self._load()
+        return self._records_by_id
+        
+    def invalidate(self):
+        '''Discard the loaded rows, so that they are loaded again when next 
+        used.
+        '''
+        self._records_by_id = None
+        self._sorted_records = None
+        self._records_by_name = None
+    
+    def records(self):
+        '''Get all the rows of the table.
+        
+        Returns:
+        :return: The rows, in primary key order, which is the order in which 
+            the table models list them.
+        :rtype: List of named tuples with a field per column
+        '''
+        if self._sorted_records is None:
+            records_by_id = self._get_records_by_id()
+            self._sorted_records = [records_by_id[record_id] for record_id in 
+                                    sorted(records_by_id)]
+        return self._sorted_records
+    
+    def names(self):
+        '''Get the names of all the rows of the table, e.g., for populating a
+        combo box.
+        
+        Returns:
+        :return: The names, in primary key order.
+        :rtype: List of strings
+        '''
+        return [getattr(record, self._name_key) for record in self.records()]
+    
+    def count(self):
+        '''Get the number of rows in the table.
+        
+        Returns:
+        :return: The number of rows.
+        :rtype: Integer
+        '''
+        return len(self._get_records_by_id())
+    
+    def get(self, record_id):
+        '''Look up a row by primary key.
+        
+        Args:
+        :param record_id: The primary key of the row.
+        :type record_id: Integer
+        
+        Returns:
+        :return: The row, or None if there is no row with the primary key.
+        :rtype: Named tuple with a field per column
+        '''
+        return self._get_records_by_id().get(record_id)
+    
+    def get_by_name(self, name):
+        '''Look up a row by name.
+        
+        Args:
+        :param name: The name of the row, e.g., the company name of a supplier.
+        :type name: String
+        
+        Returns:
+        :return: The row, or None if there is no row with the name.
+        :rtype: Named tuple with a field per column
+        '''
+        if self._records_by_name is None:
+            self._records_by_name = {getattr(record, self._name_key): record
+                                     for record in self.records()}
+        return self._records_by_name.get(name)
+    
+    def _update_from_flush(self, written_objects, deleted_objects):
+        '''Update the rows written and deleted by a flush.
+        
+        Args:
+        :param written_objects: The new and changed objects in the flush.
+        :type written_objects: Iterable of mapped objects
+        :param deleted_objects: The deleted objects in the flush.
+        :type deleted_objects: Iterable of mapped objects
+        '''
+        if self._records_by_id is None:
+            return
+        changed = False
+        for obj in written_objects:
+            if isinstance(obj, self._mapped_class):
+                record = self._record_type(*[getattr(obj, key) 
+                                             for key in self._keys])
+                self._records_by_id[record.id] = record
+                changed = True
+        for obj in deleted_objects:
+            if isinstance(obj, self._mapped_class):
+                self._records_by_id.pop(obj.id, None)
+                changed = True
+        if changed:
+            self._sorted_records = None
+            self._records_by_name = None
+
+
+class ReferenceData(object):
+    '''The reference data of a session: the suppliers, projects and products.
+    
+    Use :func:`get_reference_data` to get the instance that belongs to a 
+    session, rather than creating one.
+    '''
+    
+    def __init__(self, session):
+        '''Initialise the ReferenceData object.
+        
+        Args:
+        :param session: The SQLAlchemny session in use. 
+        :type session: Session object (the class created by the call to  
+            :func:`sessionmaker` in :mod:`sqlasession`).
+        '''
+        self.suppliers = ReferenceTable(session, Supplier, 
+                                        Supplier.company_name)
+        self.projects = ReferenceTable(session, Project, Project.code)
+        self.products = ReferenceTable(session, Product)
+        self._tables = (self.suppliers, self.projects, self.products)
+        
+    def get_products_for_supplier(self, supplier_id):
+        '''Get the products of a supplier.
+        
+        Args:
+        :param supplier_id: The primary key of the supplier.
+        :type supplier_id: Integer
+        
+        Returns:
+        :return: The supplier's products, in primary key order.
+        :rtype: List of named tuples with a field per column
+        '''
+        return [product for product in self.products.records() 
+                if product.supplier_id == supplier_id]
+        
+    def invalidate(self):
+        '''Discard the loaded rows of all the tables.
+        '''
+        for table in self._tables:
+            table.invalidate()
+            
+            
+def get_reference_data(session):
+    '''Get the reference data of a session, creating it if required.
+    
+    Args:
+    :param session: The SQLAlchemny session in use. 
+    :type session: Session object (the class created by the call to  
+        :func:`sessionmaker` in :mod:`sqlasession`).
+    
+    Returns:
+    :return: The session's reference data.
+    :rtype: ReferenceData
+    '''
+    reference_data = session.info.get(_SESSION_INFO_KEY)
+    if reference_data is None:
+        reference_data = ReferenceData(session)
+        session.info[_SESSION_INFO_KEY] = reference_data
+    return reference_data
+
+
+@event.listens_for(Session, "after_flush")
+def _update_reference_data(session, flush_context):
+    '''Update the reference data of a session after it is flushed.
+    
+    The primary keys of the flushed objects have been set by the time this is
+    called, and the session's new, dirty and deleted collections still hold 
+    the flushed objects.
+    '''
+    reference_data = session.info.get(_SESSION_INFO_KEY)
+    if reference_data:
+        written_objects = list(session.new) + list(session.dirty)
+        deleted_objects = list(session.deleted)
+        for table in reference_data._tables:
+            table._update_from_flush(written_objects, deleted_objects)
+            
+@event.listens_for(Session, "after_rollback")
+def _invalidate_reference_data(session):
+    '''Discard the reference data of a session after it is rolled back, since
+    rows that were flushed in the transaction no longer exist.
+    '''
+    reference_data = session.info.get(_SESSION_INFO_KEY)
+    if reference_data:
+        reference_data.invalidate()
+
+if __name__ == '__main__':
+    # Check that the reference data is loaded once and then follows the 
+    # session's flushes and rollbacks, using an in-memory SQLite database.
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlabase import Base
+    from purchaseorder import PurchaseOrder
+    from purchaseorderproduct import PurchaseOrderProduct
+    from userconfig import UserConfig
+    
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    suppliers = [Supplier(company_name="Supplier {}".format(i), 
+                          address="Address", 
+                          archived=False) for i in range(3)]
+    session.add_all(suppliers)
+    session.commit()
+    statements = []
+    event.listen(engine, "before_cursor_execute", 
+                 lambda *args: statements.append(args[2]))
+    reference_data = get_reference_data(session)
+    print("Testing that the suppliers are loaded with a single query...")
+    assert reference_data.suppliers.names() == ["Supplier 0", "Supplier 1", 
+                                                "Supplier 2"]
+    assert reference_data.suppliers.get_by_name("Supplier 1").id == \
+        suppliers[1].id
+    assert len(statements) == 1
+    print("Pass")
+    print("Testing that the same reference data is returned for the session...")
+    assert get_reference_data(session) is reference_data
+    print("Pass")
+    print("Testing that flushed changes are applied without a query...")
+    session.add(Supplier(company_name="Supplier 3", address="Address", 
+                         archived=False))
+    session.flush()
+    del statements[:]
+    assert reference_data.suppliers.count() == 4
+    assert reference_data.suppliers.get_by_name("Supplier 3") is not None
+    assert len(statements) == 0
+    session.commit()
+    session.delete(session.query(Supplier).
+                   filter(Supplier.company_name == "Supplier 3").one())
+    renamed_supplier = session.query(Supplier).get(suppliers[0].id)
+    renamed_supplier.company_name = "Renamed Supplier"
+    session.flush()
+    del statements[:]
+    assert reference_data.suppliers.names() == ["Renamed Supplier", 
+                                                "Supplier 1", "Supplier 2"]
+    assert reference_data.suppliers.get_by_name("Supplier 0") is None
+    assert len(statements) == 0
+    print("Pass")
+    print("Testing that a rollback discards the flushed changes...")
+    session.rollback()
+    assert reference_data.suppliers.names() == ["Supplier 0", "Supplier 1", 
+                                                "Supplier 2", "Supplier 3"]
+    print("Pass")
@@ -0,0 +1,339 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+from conversions import get_money, percentage_int_to_decimal
+from lineitemtotals import (LINE_PRICE_EXPRESSION, line_price_sum_to_decimal, 
+                            sum_line_prices)
+from product import Product
+from project import Project
+from purchaseorder import PurchaseOrder
+from purchaseorderproduct import PurchaseOrderProduct
+from supplier import Supplier
+
+
+# Only two reports supported for now.
+REPORT_TYPE_NONE = -1
+REPORT_TYPE_ITEMS_BY_PROJECT = 0
+REPORT_TYPE_ITEMS_BY_SUPPLIER = 1
+
+# The columns of a report row.
+REPORT_NUM_COLUMNS = 11
+(ORDER_NUMBER_COLUMN,
+ ORDER_DATE_COLUMN,
+ ORDER_STATUS_COLUMN,
+ PROJECT_CODE_COLUMN,
+ SUPPLIER_COMPANY_NAME_COLUMN,
+ PART_NUMBER_COLUMN,
+ DESCRIPTION_COLUMN,
+ UNIT_PRICE_COLUMN,
+ DISCOUNT_COLUMN,
+ QUANTITY_COLUMN,
+ LINE_PRICE_COLUMN) = range(REPORT_NUM_COLUMNS)
+
+REPORT_COLUMN_TITLES = ["Order No.",
+                        "Order Date",
+                        "Status",
+                        "Project",
+                        "Supplier",
+                        "Part No.",
+                        "Description",
+                        "Unit Price",
+                        "Discount",
+                        "Quantity",
+                        "Total Price"]
+
+
+class ReportEngine(object):
+    '''The query and the rows of a line item report, without any dependency 
+    on Qt.
+    
+    Each row is a tuple of the raw column values, in the order of the 
+    *_COLUMN constants: the order number, order date (datetime.date), order 
+    status, project code (None if the purchase order has no project), 
+    supplier company name, part number, product description, unit price and 
+    discount (as stored in the database), quantity and line price (as 
+    calculated by :data:`lineitemtotals.LINE_PRICE_EXPRESSION`). Rows can be 
+    pickled, e.g., to send them to a worker process, and are converted to 
+    display strings with :func:`format_row`.
+    '''
+
+    def __init__(self, session, report_type, additional_data, start_date, 
+                 end_date):
+        '''Initialise the ReportEngine object.
+        
+        Args:
+        :param session: The SQLAlchemny session in use. 
+        :type session: Session object (the class created by the call to  
+            :func:`sessionmaker` in :mod:`sqlasession`).
+        :param report_type: The type of report. One of 
+            REPORT_TYPE_ITEMS_BY_PROJECT or REPORT_TYPE_ITEMS_BY_SUPPLIER.  
+        :type report_type: Integer
+        :param additional_data: The project code if report type is
+            REPORT_TYPE_ITEMS_BY_PROJECT, or the supplier company name is 
+            REPORT_TYPE_ITEMS_BY_SUPPLIER.
+        :type additional_data: String
+        :param start_date: The start date of the date range.
+        :type start_date: datetime.date
+        :param end_date: The end date of the date range.
+        :type end_date: datetime.date
+        
+        Raises:
+        :raises: ValueError if the report type is not one of the recognised
+            report types.
+        '''
+        if report_type == REPORT_TYPE_ITEMS_BY_PROJECT:
+            filter_criterion = Project.code == additional_data
+        elif report_type == REPORT_TYPE_ITEMS_BY_SUPPLIER:
+            filter_criterion = Supplier.company_name == additional_data
+        else:
+            raise ValueError("The report_type parameter is invalid.")
+        self.session = session
+        self.report_type = report_type
+        self.additional_data = additional_data
+        self.start_date = start_date
+        self.end_date = end_date
+        # The project is outer joined because it is optional on a purchase
+        # order. The filtered query, without columns or sorting, is kept so 
+        # that the report total can be calculated by the database.
+        self._filtered_query = session.query(PurchaseOrderProduct).\
+                                join(PurchaseOrderProduct.purchase_order).\
+                                outerjoin(PurchaseOrder.project).\
+                                join(PurchaseOrder.supplier).\
+                                join(PurchaseOrderProduct.product).\
+                                filter(filter_criterion).\
+                                filter(PurchaseOrder.order_date >= start_date).\
+                                filter(PurchaseOrder.order_date <= end_date)
+
+    def row_query(self):
+        '''Get the query that selects the report rows.
+        
+        Only the report columns are selected, so no ORM objects are created 
+        for the rows. The query is not executed, so that callers can choose 
+        how to fetch the rows, e.g., all at once or in batches.
+        
+        Returns:
+        :return: The query, sorted by purchase order and line item.
+        :rtype: sqlalchemy.orm.query.Query
+        '''
+        return self._filtered_query.\
+                    with_entities(PurchaseOrder.order_number,
+                                  PurchaseOrder.order_date,
+                                  PurchaseOrder.order_status,
+                                  Project.code,
+                                  Supplier.company_name,
+                                  Product.part_number,
+                                  Product.product_description,
+                                  PurchaseOrderProduct.unit_price,
+                                  PurchaseOrderProduct.discount,
+                                  PurchaseOrderProduct.quantity,
+                                  LINE_PRICE_EXPRESSION).\
+                    order_by(PurchaseOrderProduct.purchase_order_id,
+                             PurchaseOrderProduct.id)
+    
+    def load_rows(self):
+        '''Load all of the report rows.
+        
+        Returns:
+        :return: The report rows.
+        :rtype: List of tuples
+        '''
+        return [tuple(row) for row in self.row_query()]
+
+    def calculate_total_int(self):
+        '''Calculate the total value of the report line items (excluding tax).
+        
+        Returns:
+        :return: The sum of the line prices in minor units multiplied by 100.
+        :rtype: Integer
+        '''
+        return sum_line_prices(self._filtered_query)
+
+    def calculate_total_value(self, app_config):
+        '''Calculate the total value of the report line items (excluding tax).
+        
+        The total is summed by the database as an integer, and converted to 
+        decimal once.
+        
+        Args:
+        :param app_config: The application configuration in use.
+        :type app_confg: appconfig.ConfigFile
+        
+        Returns:
+        :return: The total value of the report line items.
+        :rtype: Decimal
+        '''
+        return line_price_sum_to_decimal(self.calculate_total_int(), 
+                                         app_config)
+
+
+def format_column(row, column, app_config):
+    '''Convert a single column of a report row to its display string.
+    
+    Args:
+    :param row: The report row. Refer to :class:`ReportEngine`.
+    :type row: Tuple
+    :param column: The column, one of the *_COLUMN constants.
+    :type column: Integer
+    :param app_config: The application configuration in use.
+    :type app_confg: appconfig.ConfigFile
+    
+    Returns:
+    :return: The display string.
+    :rtype: String
+    '''
+    value = row[column]
+    if column == ORDER_DATE_COLUMN:
+        return value.strftime("%Y-%m-%d")
+    elif column == PROJECT_CODE_COLUMN:
+        return value or ""
+    elif column == UNIT_PRICE_COLUMN:
+        return get_money(app_config).format_int(value)
+    elif column == DISCOUNT_COLUMN:
+        return "{:2.0%}".format(percentage_int_to_decimal(value))
+    elif column == QUANTITY_COLUMN:
+        return str(value)
+    elif column == LINE_PRICE_COLUMN:
+        return get_money(app_config).format_scaled_int(int(value))
+    return value
+
+def format_row(row, app_config):
+    '''Convert a report row to its display strings.
+    
+    Args:
+    :param row: The report row. Refer to :class:`ReportEngine`.
+    :type row: Tuple
+    :param app_config: The application configuration in use.
+    :type app_confg: appconfig.ConfigFile
+    
+    Returns:
+    :return: The order number, order date, order status, project code, 
+        supplier company name, part number, description, unit price, 
+        discount, quantity, and line price.
+    :rtype: List containing eleven Strings 
+    '''
+    return [format_column(row, column, app_config) 
+            for column in range(REPORT_NUM_COLUMNS)]
+
+if __name__ == '__main__':
+    # Benchmark the report loading time against the number of line items, using 
+    # an in-memory SQLite database.
+    import datetime
+    import time
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from appconfig import ConfigFile
+    from sqlabase import Base
+    from userconfig import UserConfig
+    
+    _NUM_PROJECTS = 10
+    _NUM_SUPPLIERS = 10
+    _NUM_PRODUCTS_PER_SUPPLIER = 20
+    _NUM_LINE_ITEMS_PER_ORDER = 10
+    
+    def populate_database(session, num_line_items):
+        '''Populate the benchmark database with the required number of line 
+        items, spread evenly over the projects and suppliers.
+        '''
+        user_config = UserConfig(created_date_time=datetime.datetime.now(),
+                                 company_physical_address="Address",
+                                 company_postal_address="Address",
+                                 company_phone_number="012 345 6789",
+                                 company_signatory_name="Signatory",
+                                 default_payment_terms="Pay in 30 days",
+                                 default_order_status="Draft",
+                                 tax_rate=14)
+        session.add(user_config)
+        projects = [Project(code="P{:05d}".format(i), 
+                            description="Project {}".format(i), 
+                            completed=False) for i in range(_NUM_PROJECTS)]
+        session.add_all(projects)
+        suppliers = []
+        for i in range(_NUM_SUPPLIERS):
+            supplier = Supplier(company_name="Supplier {}".format(i),
+                                address="Address",
+                                archived=False)
+            supplier.product = [Product(part_number="PN{}-{}".format(i, j),
+                                        product_description="Product",
+                                        current_price=12345,
+                                        current_discount=5,
+                                        archived=False) 
+                                for j in range(_NUM_PRODUCTS_PER_SUPPLIER)]
+            suppliers.append(supplier)
+        session.add_all(suppliers)
+        num_orders = num_line_items // _NUM_LINE_ITEMS_PER_ORDER
+        start_date = datetime.date(2016, 1, 1)
+        for i in range(num_orders):
+            supplier = suppliers[i % _NUM_SUPPLIERS]
+            order_date = start_date + datetime.timedelta(days=i % 365)
+            po = PurchaseOrder(order_number="PO{:06d}".format(i),
+                               order_date=order_date,
+                               delivery_address="Address",
+                               delivery_date=order_date,
+                               payment_terms="Pay in 30 days",
+                               order_status="Placed",
+                               total_excluding_tax=0,
+                               total_tax=0,
+                               total_including_tax=0,
+                               project=projects[i % _NUM_PROJECTS],
+                               supplier=supplier,
+                               user_config=user_config)
+            for j in range(_NUM_LINE_ITEMS_PER_ORDER):
+                product = supplier.product[j % _NUM_PRODUCTS_PER_SUPPLIER]
+                po.products.append(PurchaseOrderProduct(product=product,
+                                                        unit_price=12345,
+                                                        discount=5,
+                                                        quantity=j + 1))
+            session.add(po)
+        session.commit()
+    
+    test_app_config = ConfigFile()
+    test_app_config.load()
+    print("Line items | By project (s) | By supplier (s) | Format (s) | "
+          "Report rows")
+    for num_line_items in (1000, 10000, 100000):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        populate_database(session, num_line_items)
+        session.expunge_all()
+        start = time.perf_counter()
+        by_project = ReportEngine(session, 
+                                  REPORT_TYPE_ITEMS_BY_PROJECT, 
+                                  "P00000", 
+                                  datetime.date(2016, 1, 1), 
+                                  datetime.date(2016, 6, 30)).load_rows()
+        by_project_time = time.perf_counter() - start
+        start = time.perf_counter()
+        by_supplier = ReportEngine(session, 
+                                   REPORT_TYPE_ITEMS_BY_SUPPLIER, 
+                                   "Supplier 0", 
+                                   datetime.date(2016, 1, 1), 
+                                   datetime.date(2016, 6, 30)).load_rows()
+        by_supplier_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for row in by_supplier:
+            format_row(row, test_app_config)
+        format_time = time.perf_counter() - start
+        print("{:10d} | {:14.3f} | {:15.3f} | {:10.3f} | {:d}".format(
+                                                        num_line_items,
+                                                        by_project_time,
+                                                        by_supplier_time,
+                                                        format_time,
+                                                        len(by_project)))
+        session.close()
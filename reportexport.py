@@ -0,0 +1,250 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+import reportengine
+from conversions import get_money
+
+
+# The number of rows fetched from the database at a time.
+DEFAULT_BATCH_SIZE = 1000
+
+# The field names used in the JSON Lines export, in column order.
+REPORT_FIELD_NAMES = ["order_number",
+                      "order_date",
+                      "order_status",
+                      "project_code",
+                      "supplier",
+                      "part_number",
+                      "description",
+                      "unit_price",
+                      "discount",
+                      "quantity",
+                      "line_price"]
+
+
+def iter_report_rows(engine, batch_size=DEFAULT_BATCH_SIZE):
+    '''Iterate over the rows of a report without loading them all.
+    
+    The rows are fetched in batches. On MySQL the results are streamed from 
+    a server-side cursor, so the memory used does not depend on the number 
+    of rows.
+    
+    Args:
+    :param engine: The report engine.
+    :type engine: reportengine.ReportEngine
+    :param batch_size: The number of rows fetched at a time.
+    :type batch_size: Integer
+    
+    Returns:
+    :return: The report rows. Refer to :class:`reportengine.ReportEngine`.
+    :rtype: Iterator of tuples
+    '''
+    query = engine.row_query().\
+                execution_options(stream_results=True).\
+                yield_per(batch_size)
+    for row in query:
+        yield tuple(row)
+
+def _convert_row(row, app_config):
+    '''Convert a report row to the values written by the exporters.
+    
+    Unlike the display strings, the monetary values have no currency symbol 
+    or thousands separators, and the discount is a percentage, so that the 
+    exported files can be processed by other programs.
+    '''
+    money = get_money(app_config)
+    return [row[reportengine.ORDER_NUMBER_COLUMN],
+            row[reportengine.ORDER_DATE_COLUMN].isoformat(),
+            row[reportengine.ORDER_STATUS_COLUMN],
+            row[reportengine.PROJECT_CODE_COLUMN] or "",
+            row[reportengine.SUPPLIER_COMPANY_NAME_COLUMN],
+            row[reportengine.PART_NUMBER_COLUMN],
+            row[reportengine.DESCRIPTION_COLUMN],
+            str(money.int_to_decimal(row[reportengine.UNIT_PRICE_COLUMN])),
+            row[reportengine.DISCOUNT_COLUMN],
+            row[reportengine.QUANTITY_COLUMN],
+            str(money.scaled_int_to_decimal(
+                            int(row[reportengine.LINE_PRICE_COLUMN])))]
+
+def export_csv(rows, filename, app_config):
+    '''Write report rows to a CSV file as they are read.
+    
+    Args:
+    :param rows: The report rows, e.g., from :func:`iter_report_rows`.
+    :type rows: Iterable of tuples
+    :param filename: The CSV filename.
+    :type filename: String
+    :param app_config: The application configuration in use.
+    :type app_confg: appconfig.ConfigFile
+    
+    Returns:
+    :return: The number of rows written.
+    :rtype: Integer
+    '''
+    num_rows = 0
+    with open(filename, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(reportengine.REPORT_COLUMN_TITLES)
+        for row in rows:
+            writer.writerow(_convert_row(row, app_config))
+            num_rows += 1
+    return num_rows
+
+def export_jsonl(rows, filename, app_config):
+    '''Write report rows to a JSON Lines file as they are read, one JSON 
+    object per row.
+    
+    Args:
+    :param rows: The report rows, e.g., from :func:`iter_report_rows`.
+    :type rows: Iterable of tuples
+    :param filename: The JSON Lines filename.
+    :type filename: String
+    :param app_config: The application configuration in use.
+    :type app_confg: appconfig.ConfigFile
+    
+    Returns:
+    :return: The number of rows written.
+    :rtype: Integer
+    '''
+    num_rows = 0
+    with open(filename, "w", encoding="utf-8") as jsonl_file:
+        for row in rows:
+            record = dict(zip(REPORT_FIELD_NAMES, 
+                              _convert_row(row, app_config)))
+            jsonl_file.write(json.dumps(record) + "\n")
+            num_rows += 1
+    return num_rows
+
+def _report_progress(rows, progress, interval):
+    '''Pass rows through, calling a progress function every interval rows.
+    '''
+    num_rows = 0
+    for row in rows:
+        yield row
+        num_rows += 1
+        if num_rows % interval == 0:
+            progress(num_rows)
+
+# The exporters, by filename extension.
+EXPORTERS = {".csv": export_csv,
+             ".jsonl": export_jsonl}
+
+def export_report(engine, filename, app_config, 
+                  batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    '''Stream a report to a CSV or JSON Lines file, depending on the filename 
+    extension.
+    
+    Args:
+    :param engine: The report engine.
+    :type engine: reportengine.ReportEngine
+    :param filename: The filename, ending in .csv or .jsonl.
+    :type filename: String
+    :param app_config: The application configuration in use.
+    :type app_confg: appconfig.ConfigFile
+    :param batch_size: The number of rows fetched at a time.
+    :type batch_size: Integer
+    :param progress: Function called with the number of rows written so far
+        after each batch, or None. It may raise an exception to abandon the 
+        export, which leaves a partial file.
+    :type progress: Callable
+    
+    Returns:
+    :return: The number of rows written.
+    :rtype: Integer
+    
+    Raises:
+    :raises: ValueError if the filename extension is not supported.
+    '''
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in EXPORTERS:
+        raise ValueError(("Reports can only be exported to {} files, not "
+                          "'{}'.").format(", ".join(sorted(EXPORTERS)), 
+                                          filename))
+    rows = iter_report_rows(engine, batch_size)
+    if progress is not None:
+        rows = _report_progress(rows, progress, batch_size)
+    return EXPORTERS[extension](rows, filename, app_config)
+
+def _parse_args(argv):
+    import datetime
+    parse_date = lambda value: datetime.datetime.strptime(value, 
+                                                          "%Y-%m-%d").date()
+    parser = argparse.ArgumentParser(
+                    description="Export a line item report to CSV or JSON "
+                                "Lines.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--project", help="report the items of a project code")
+    group.add_argument("--supplier", 
+                       help="report the items of a supplier company name")
+    parser.add_argument("start_date", type=parse_date, 
+                        help="the earliest order date, as YYYY-MM-DD")
+    parser.add_argument("end_date", type=parse_date, 
+                        help="the latest order date, as YYYY-MM-DD")
+    parser.add_argument("filename", help="the .csv or .jsonl file to write")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="the number of rows fetched at a time")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    '''Export a report from the command line.
+    
+    Returns:
+    :return: The exit code.
+    :rtype: Integer
+    '''
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO, 
+                        format="-> %(asctime)s - %(levelname)s - %(message)s")
+    # Importing the config module reads the config file, without Qt.
+    from appconfig import app_config, app_config_ok, app_config_error
+    if not app_config_ok:
+        logging.error("The config file could not be used ({}). Run POdB to "
+                      "fix it.".format(app_config_error or "it was not found"))
+        return 1
+    from sqlasession import session_scope
+    if args.project is not None:
+        report_type = reportengine.REPORT_TYPE_ITEMS_BY_PROJECT
+        additional_data = args.project
+    else:
+        report_type = reportengine.REPORT_TYPE_ITEMS_BY_SUPPLIER
+        additional_data = args.supplier
+    start_time = time.perf_counter()
+    with session_scope() as session:
+        engine = reportengine.ReportEngine(session, 
+                                           report_type, 
+                                           additional_data,
+                                           args.start_date, 
+                                           args.end_date)
+        num_rows = export_report(engine, args.filename, app_config, 
+                                 batch_size=args.batch_size)
+    logging.info("Exported {} rows to {} in {:.1f} s".format(
+                                            num_rows, 
+                                            args.filename,
+                                            time.perf_counter() - start_time))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
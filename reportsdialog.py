@@ -20,18 +20,21 @@ Contact: paulosvnleal@gmail.com
 import sys
 import datetime
 import logging
+import os
 
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
+from conversions import get_money
 from datavalidation import DATA_VAL_ERROR_MSG_BOX_TITLE
 from messagebox import execute_critical_msg_box
+from pdfexportworker import PdfExport, ReportDataExport
 from pdfreports import ReportPdf, ReportPdfLineItemDetails
-from project import Project
 from purchaseorder import PurchaseOrder
+from referencedata import get_reference_data
+from reportexport import EXPORTERS
 from reportmodel import ReportModel
 from sqlasession import session_scope
-from supplier import Supplier
 import ui_reportsdialog
 
 
@@ -46,6 +49,8 @@ class ReportsDialog(QDialog, ui_reportsdialog.Ui_reportsDialog):
         self.app_config = app_config
         self.company_name = company_name
         self.model = None
+        self.pdf_export = None
+        self.data_export = None
         self.donePushButton.connect(self.donePushButton, 
                                     SIGNAL("clicked()"),
                                     self.reject)
@@ -62,7 +67,8 @@ class ReportsDialog(QDialog, ui_reportsdialog.Ui_reportsDialog):
         self.printToolButton.setEnabled(False)
         self.totalLabel.setEnabled(False)
         self.totalResultLabel.setEnabled(False)
-        self.totalResultLabel.setText("R 0.00")
+        self.totalResultLabel.setText(
+                                get_money(self.app_config).format_int(0))
         self._populate_report_type_combo_box()
         self._initialise_start_date()
         self._initialise_end_date()
@@ -119,17 +125,17 @@ class ReportsDialog(QDialog, ui_reportsdialog.Ui_reportsDialog):
             
     def _populate_projects_combo_box(self):
         self.additionalDataComboBox.clear()
-        self.projects = self.session.query(Project).all()
-        for project in self.projects:
-            self.additionalDataComboBox.addItem(project.code)
+        reference_data = get_reference_data(self.session)
+        for project_code in reference_data.projects.names():
+            self.additionalDataComboBox.addItem(project_code)
         self.additionalDataComboBox.setCurrentIndex(0)
         self.additionalDataComboBox.setEnabled(True)
     
     def _populate_suppliers_combo_box(self):
         self.additionalDataComboBox.clear()
-        self.suppliers = self.session.query(Supplier).all()
-        for supplier in self.suppliers:
-            self.additionalDataComboBox.addItem(supplier.company_name)
+        reference_data = get_reference_data(self.session)
+        for company_name in reference_data.suppliers.names():
+            self.additionalDataComboBox.addItem(company_name)
         self.additionalDataComboBox.setCurrentIndex(0)
         self.additionalDataComboBox.setEnabled(True)
     
@@ -187,7 +193,7 @@ class ReportsDialog(QDialog, ui_reportsdialog.Ui_reportsDialog):
             self.totalLabel.setEnabled(True)
             self.totalResultLabel.setEnabled(True)
             self.totalResultLabel.setText(
-                                    "R {:,.2f}".format(
+                                    get_money(self.app_config).format_decimal(
                                             self.model.calculate_total_value()))
             self.clearToolButton.setEnabled(True)
             self.exportToolButton.setEnabled(True)
@@ -197,19 +203,27 @@ class ReportsDialog(QDialog, ui_reportsdialog.Ui_reportsDialog):
         if self.model:
             pdf_filename = QFileDialog.getSaveFileName(
                                         self, 
-                                        caption="Save Report to PDF", 
-                                        filter="*.pdf")
+                                        caption="Export Report", 
+                                        filter=("PDF (*.pdf);;CSV (*.csv);;"
+                                                "JSON Lines (*.jsonl)"))
             if pdf_filename == "":
                 # The file name is empty, which probably means that the user 
                 # pressed Cancel in the file dialog. Just return.
                 return
-            line_items = []
-            for row in range(self.model.rowCount()):
-                line_items.append(self.model.get_row(row))
+            extension = os.path.splitext(pdf_filename)[1].lower()
+            if extension in EXPORTERS:
+                self._export_data(pdf_filename)
+                return
+            line_items = self.model.get_rows()
             total_value = self.model.calculate_total_value()
+            money = get_money(self.app_config)
             line_item_details = ReportPdfLineItemDetails(
                                             line_items,
-                                            "R {:,.2f}".format(total_value))
+                                            money.format_decimal(total_value),
+                                            line_prices=\
+                                                self.model.get_line_prices(),
+                                            currency_format=\
+                                                money.currency_format)
             
             pdf_report = ReportPdf(pdf_filename,
                                    self._report_types[self._current_report],
@@ -217,8 +231,27 @@ class ReportsDialog(QDialog, ui_reportsdialog.Ui_reportsDialog):
                                    str(self._start_date),
                                    str(self._end_date),
                                    line_item_details,
-                                   self.company_name)
-            pdf_report.build()
+                                   self.company_name,
+                                   **self.app_config.pdf.get_pdf_options())
+            # Build the PDF on a worker thread, so that the dialog stays 
+            # responsive while a long report is laid out. The line items above
+            # are plain data, so the build does not touch the model.
+            self.pdf_export = PdfExport(pdf_report, "Export Report", 
+                                        parent=self)
+            self.pdf_export.start()
+
+    def _export_data(self, filename):
+        '''Stream the report rows from the database to a CSV or JSON Lines 
+        file, without using the rows loaded by the model, so that large 
+        reports do not need to be held in memory twice.
+        
+        The export runs on a worker thread with its own session, so that the 
+        dialog stays responsive and the export can be cancelled.
+        '''
+        self.data_export = ReportDataExport(self.model.engine, filename, 
+                                            self.app_config, "Export Report", 
+                                            parent=self)
+        self.data_export.start()
 
     def keyPressEvent(self, e):
         if e.key() == Qt.Key_F12:
@@ -0,0 +1,205 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+from PyQt4.QtCore import *
+
+
+class RowDisplayCache(object):
+    '''Caches the display strings of the rows of a table model.
+    
+    The strings of a row are formatted by the model the first time any column
+    of the row is displayed, and are reused for painting and for sorting 
+    until the row changes. The cache follows the model's own signals: a 
+    dataChanged signal invalidates the rows it covers, inserted and removed 
+    rows shift the cached rows, and a reset or layout change clears the cache.
+    A model whose rows change without these signals, e.g., because a related 
+    object was edited elsewhere or the session was rolled back, must call 
+    :meth:`invalidate` or :meth:`refresh` itself.
+    
+    The cache must be created in the model's initialiser, before any view is 
+    attached, so that it is updated before the views repaint.
+    '''
+    
+    def __init__(self, model, format_row):
+        '''Initialise the RowDisplayCache object.
+        
+        Args:
+        :param model: The model whose rows are cached.
+        :type model: QAbstractItemModel
+        :param format_row: Function that formats a row, given the row number, 
+            as a sequence with one display value per column.
+        :type format_row: Callable
+        '''
+        self._model = model
+        self._format_row = format_row
+        # The display values of each row, or None if the row has not been 
+        # formatted since it last changed. Rows past the end of the list have 
+        # not been formatted.
+        self._rows = []
+        # Number of rows formatted so far, for checking the effectiveness of 
+        # the cache.
+        self.num_formatted = 0
+        model.connect(model, 
+                      SIGNAL("dataChanged(QModelIndex,QModelIndex)"),
+                      self._handle_data_changed)
+        model.connect(model, 
+                      SIGNAL("rowsInserted(QModelIndex,int,int)"),
+                      self._handle_rows_inserted)
+        model.connect(model, 
+                      SIGNAL("rowsRemoved(QModelIndex,int,int)"),
+                      self._handle_rows_removed)
+        model.connect(model, SIGNAL("modelReset()"), self.clear)
+        model.connect(model, SIGNAL("layoutChanged()"), self.clear)
+        
+    def get(self, row):
+        '''Get the display values of a row, formatting the row if required.
+        
+        Args:
+        :param row: The row.
+        :type row: Integer
+        
+        Returns:
+        :return: The display values of the row, one per column.
+        :rtype: Tuple
+        '''
+        try:
+            display = self._rows[row]
+        except IndexError:
+            self._rows.extend([None] * (row + 1 - len(self._rows)))
+            display = None
+        if display is None:
+            display = tuple(self._format_row(row))
+            self._rows[row] = display
+            self.num_formatted += 1
+        return display
+    
+    def invalidate(self, first_row, last_row=None):
+        '''Invalidate the display values of a range of rows.
+        
+        Args:
+        :param first_row: The first row to invalidate.
+        :type first_row: Integer
+        :param last_row: The last row to invalidate, or None to invalidate 
+            only the first row.
+        :type last_row: Integer
+        '''
+        if last_row is None:
+            last_row = first_row
+        for row in range(first_row, min(last_row + 1, len(self._rows))):
+            self._rows[row] = None
+            
+    def clear(self):
+        '''Invalidate the display values of all of the rows.
+        '''
+        self._rows = []
+        
+    def refresh(self):
+        '''Invalidate the display values of all of the rows and have the views
+        repaint them.
+        
+        The model's layout change signals are used rather than dataChanged, so
+        that the refresh is not mistaken for an edit of the model's data.
+        '''
+        self._model.emit(SIGNAL("layoutAboutToBeChanged()"))
+        self.clear()
+        self._model.emit(SIGNAL("layoutChanged()"))
+        
+    def _handle_data_changed(self, top_left_index, bottom_right_index):
+        '''Slot for the dataChanged signal of the model.
+        
+        Args:
+            Refer to QAbstractItemModel.dataChanged.
+        '''
+        if top_left_index.isValid() and bottom_right_index.isValid():
+            self.invalidate(top_left_index.row(), bottom_right_index.row())
+        else:
+            self.clear()
+        
+    def _handle_rows_inserted(self, parent_index, start_item, end_item):
+        '''Slot for the rowsInserted signal of the model.
+        
+        Args:
+            Refer to QAbstractItemModel.rowsInserted.
+        '''
+        if start_item < len(self._rows):
+            self._rows[start_item:start_item] = \
+                                        [None] * (end_item - start_item + 1)
+        
+    def _handle_rows_removed(self, parent_index, start_item, end_item):
+        '''Slot for the rowsRemoved signal of the model.
+        
+        Args:
+            Refer to QAbstractItemModel.rowsRemoved.
+        '''
+        del self._rows[start_item:end_item + 1]
+
+if __name__ == '__main__':
+    # Check that scrolling a large table formats each row once, and that 
+    # changing a row formats only that row again.
+    import time
+    from decimal import Decimal
+    
+    class TestModel(QAbstractTableModel):
+        def __init__(self, num_rows):
+            super().__init__()
+            self.values = list(range(num_rows))
+            self.cache = RowDisplayCache(self, self.format_row)
+        def rowCount(self, index=QModelIndex()):
+            return len(self.values)
+        def columnCount(self, index=QModelIndex()):
+            return 2
+        def data(self, index, role=Qt.DisplayRole):
+            return self.cache.get(index.row())[index.column()]
+        def format_row(self, row):
+            value = self.values[row]
+            return (str(row), "R {:,.2f}".format(Decimal(value) / 100))
+        def set_value(self, row, value):
+            self.values[row] = value
+            index = self.createIndex(row, 0)
+            self.emit(SIGNAL("dataChanged(QModelIndex,QModelIndex)"), 
+                      index, index)
+    
+    num_rows = 100000
+    rows_per_page = 40
+    model = TestModel(num_rows)
+    print("Scrolling through {} rows twice...".format(num_rows))
+    start_time = time.perf_counter()
+    for scroll in range(2):
+        for first_row in range(0, num_rows, rows_per_page):
+            for row in range(first_row, min(first_row + rows_per_page, 
+                                            num_rows)):
+                for column in range(2):
+                    model.data(model.createIndex(row, column))
+    print("Took {:.2f} s".format(time.perf_counter() - start_time))
+    print("Testing that each row was formatted once...")
+    assert model.cache.num_formatted == num_rows
+    print("Pass")
+    print("Testing that changing a row formats only that row again...")
+    model.set_value(5, 12345)
+    assert model.data(model.createIndex(5, 1)) == "R 123.45"
+    assert model.data(model.createIndex(6, 1)) == "R 0.06"
+    assert model.cache.num_formatted == num_rows + 1
+    print("Pass")
+    print("Testing that removing a row shifts the cached rows...")
+    model.beginRemoveRows(QModelIndex(), 0, 0)
+    del model.values[0]
+    model.endRemoveRows()
+    assert model.data(model.createIndex(4, 1)) == "R 123.45"
+    assert model.cache.num_formatted == num_rows + 1
+    print("Pass")
@@ -0,0 +1,300 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import datetime
+import logging
+from sqlalchemy import inspect, select, func
+from sqlabase import Base
+# Import all the database class definitions so that SQL Alchemy knows what they
+# are. (Ignore the "unused import" warnings.)
+from product import Product
+from project import Project
+from purchaseorder import PurchaseOrder
+from purchaseordernumbersequence import PurchaseOrderNumberSequence
+from purchaseorderproduct import PurchaseOrderProduct
+from schemaversion import SchemaVersion
+from supplier import Supplier
+from userconfig import UserConfig
+
+
+class SchemaMigrationError(Exception):
+    '''Exception raised when a schema migration cannot be applied to the 
+    database.
+    '''
+    pass
+
+
+# The secondary indexes added by each migration, by name. The indexes are 
+# declared on the models, so Base.metadata.create_all creates them in a new 
+# database.
+INDEX_SET_1 = ["ix_purchase_order_supplier_id_order_date",
+               "ix_purchase_order_project_id_order_date",
+               "ix_purchase_order_order_date",
+               "ux_purchase_order_product_purchase_order_id_product_id",
+               "ix_purchase_order_product_product_id",
+               "ix_product_supplier_id_part_number"]
+INDEX_SET_2 = ["ix_purchase_order_order_number"]
+_purchase_order_product_table = PurchaseOrderProduct.__table__
+
+
+def _get_indexes(names):
+    '''Get the indexes declared on the models, by name.
+    
+    Args:
+    :param names: The index names.
+    :type names: List of strings
+    
+    Returns:
+    :return: The indexes, in the order of the names.
+    :rtype: List of sqlalchemy.Index
+    '''
+    indexes = {index.name: index for table in Base.metadata.sorted_tables 
+               for index in table.indexes}
+    return [indexes[name] for name in names]
+
+def _create_missing_indexes(connection, indexes):
+    '''Create the indexes that do not exist in the database yet.
+    
+    Args:
+    :param connection: The connection to the database.
+    :type connection: sqlalchemy.engine.Connection
+    :param indexes: The indexes to create.
+    :type indexes: List of sqlalchemy.Index
+    '''
+    inspector = inspect(connection)
+    for index in indexes:
+        existing_names = [existing["name"] for existing in 
+                          inspector.get_indexes(index.table.name)]
+        if index.name not in existing_names:
+            logging.debug("Creating index {}".format(index.name))
+            index.create(bind=connection)
+
+def _find_purchase_orders_with_duplicate_line_items(connection):
+    '''Find the purchase orders on which a product appears more than once.
+    
+    The unique index on (purchase_order_id, product_id) cannot be created 
+    if there are any. The duplicates are not removed automatically, because 
+    doing so would change the purchase order totals.
+    
+    Args:
+    :param connection: The connection to the database.
+    :type connection: sqlalchemy.engine.Connection
+    
+    Returns:
+    :return: The ids of the purchase orders, in ascending order.
+    :rtype: List of integers
+    '''
+    table = _purchase_order_product_table
+    duplicates = connection.execute(
+                    select([table.c.purchase_order_id]).\
+                        group_by(table.c.purchase_order_id, 
+                                 table.c.product_id).\
+                        having(func.count() > 1)).fetchall()
+    return sorted(set(row[0] for row in duplicates))
+
+def _migration_1(connection):
+    '''Add the first set of secondary indexes.
+    
+    If a product appears more than once on a purchase order, the unique index
+    on the line items is skipped with a warning, and the other indexes are 
+    still created.
+    '''
+    indexes = _get_indexes(INDEX_SET_1)
+    po_ids = _find_purchase_orders_with_duplicate_line_items(connection)
+    if po_ids:
+        logging.warning(("The same product appears more than once on the "
+                         "purchase orders with the following ids: {}. The "
+                         "index that prevents duplicate line items was not "
+                         "created.").format(", ".join(str(po_id) for po_id 
+                                                      in po_ids)))
+        indexes = [index for index in indexes if not index.unique]
+    _create_missing_indexes(connection, indexes)
+
+def _migration_2(connection):
+    '''Add the purchase order number sequence table.
+    '''
+    PurchaseOrderNumberSequence.__table__.create(bind=connection, 
+                                                 checkfirst=True)
+
+def _migration_3(connection):
+    '''Add the index on the purchase order number.
+    '''
+    _create_missing_indexes(connection, _get_indexes(INDEX_SET_2))
+
+# The migrations, in the order in which they must be applied. Each entry is the 
+# version number, a description, and the function that applies the migration. 
+# Never change or remove an entry once released; add a new one instead.
+_MIGRATIONS = [
+    (1, "Add secondary indexes for the foreign key and date lookups", 
+     _migration_1),
+    (2, "Add the purchase order number sequence table", 
+     _migration_2),
+    (3, "Add an index on the purchase order number", 
+     _migration_3)
+    ]
+
+# The schema version of a database that is up to date.
+CURRENT_SCHEMA_VERSION = _MIGRATIONS[-1][0]
+
+def get_schema_version(connection):
+    '''Get the version of the database schema.
+    
+    Args:
+    :param connection: The connection to the database.
+    :type connection: sqlalchemy.engine.Connection
+    
+    Returns:
+    :return: The highest migration version applied to the database, or 0 if 
+        none has been applied.
+    :rtype: Integer
+    '''
+    table = SchemaVersion.__table__
+    version = connection.execute(select([func.max(table.c.version)])).scalar()
+    if version is None:
+        return 0
+    return version
+
+def upgrade_schema(engine):
+    '''Apply the migrations that have not been applied to the database yet.
+    
+    The tables, including the schema_version table, are expected to have been 
+    created already by Base.metadata.create_all. Each migration is applied in 
+    its own transaction together with its schema_version record, as far as 
+    the database allows (MySQL commits DDL statements implicitly). The 
+    migrations are written so that they can safely be applied again.
+    
+    Args:
+    :param engine: The SQLAlchemy engine in use.
+    :type engine: sqlalchemy.engine.Engine
+    
+    Returns:
+    :return: The schema version after the upgrade.
+    :rtype: Integer
+    
+    Raises:
+    :raises: SchemaMigrationError if a migration cannot be applied.
+    '''
+    SchemaVersion.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as connection:
+        current_version = get_schema_version(connection)
+    for version, description, migrate in _MIGRATIONS:
+        if version <= current_version:
+            continue
+        logging.debug("Applying schema migration {}: {}".format(version, 
+                                                                description))
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.execute(SchemaVersion.__table__.insert().values(
+                                    version=version,
+                                    description=description,
+                                    applied_date_time=datetime.datetime.now()))
+        current_version = version
+    return current_version
+
+def prepare_schema(engine):
+    '''Make sure that the database schema is up to date, creating it if 
+    required.
+    
+    If the schema_version table shows that the database is up to date, which 
+    is the case on every start-up except the first one after an upgrade, then 
+    nothing else is done. Otherwise the missing tables are created and the 
+    outstanding migrations are applied. This avoids the table reflection done 
+    by Base.metadata.create_all on a normal start-up.
+    
+    Args:
+    :param engine: The SQLAlchemy engine in use.
+    :type engine: sqlalchemy.engine.Engine
+    
+    Returns:
+    :return: The schema version.
+    :rtype: Integer
+    
+    Raises:
+    :raises: SchemaMigrationError if a migration cannot be applied.
+    :raises: sqlalchemy.exc.DBAPIError if the database cannot be used, e.g., 
+        if the connection is lost.
+    '''
+    version = None
+    with engine.connect() as connection:
+        # The schema_version table does not exist in a new database, or in one
+        # created before the table was added.
+        if engine.dialect.has_table(connection, SchemaVersion.__tablename__):
+            version = get_schema_version(connection)
+    if version is not None and version >= CURRENT_SCHEMA_VERSION:
+        return version
+    Base.metadata.create_all(engine)
+    return upgrade_schema(engine)
+
+if __name__ == '__main__':
+    # Apply the migrations to a new and to an existing database, and check that
+    # applying them again does nothing.
+    from sqlalchemy import create_engine
+    logging.basicConfig(level=logging.DEBUG)
+    print("Testing a new database...")
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    assert upgrade_schema(engine) == _MIGRATIONS[-1][0]
+    assert upgrade_schema(engine) == _MIGRATIONS[-1][0]
+    print("Pass")
+    print("Testing an existing database without indexes...")
+    engine = create_engine("sqlite://")
+    for table in Base.metadata.sorted_tables:
+        if table is not SchemaVersion.__table__:
+            indexes = set(table.indexes)
+            table.indexes.clear()
+            table.create(bind=engine)
+            table.indexes.update(indexes)
+    assert upgrade_schema(engine) == _MIGRATIONS[-1][0]
+    index_names = [index["name"] for index in 
+                   inspect(engine).get_indexes("purchase_order_product")]
+    assert "ux_purchase_order_product_purchase_order_id_product_id" in \
+           index_names
+    assert "ix_purchase_order_order_number" in \
+           [index["name"] for index in 
+            inspect(engine).get_indexes("purchase_order")]
+    print("Pass")
+    print("Testing an existing database with duplicate line items...")
+    engine = create_engine("sqlite://")
+    for table in Base.metadata.sorted_tables:
+        if table is not SchemaVersion.__table__:
+            indexes = set(table.indexes)
+            table.indexes.clear()
+            table.create(bind=engine)
+            table.indexes.update(indexes)
+    engine.execute(_purchase_order_product_table.insert(),
+                   [{"purchase_order_id": 1, "product_id": 1, "unit_price": 0,
+                     "discount": 0, "quantity": 1}] * 2)
+    assert upgrade_schema(engine) == _MIGRATIONS[-1][0]
+    index_names = [index["name"] for index in 
+                   inspect(engine).get_indexes("purchase_order_product")]
+    assert "ux_purchase_order_product_purchase_order_id_product_id" not in \
+           index_names
+    assert "ix_purchase_order_product_product_id" in index_names
+    print("Pass")
+    print("Testing that prepare_schema only checks for the schema_version table "
+          "and reads the version of an up to date database...")
+    from sqlalchemy import event
+    engine = create_engine("sqlite://")
+    assert prepare_schema(engine) == CURRENT_SCHEMA_VERSION
+    statements = []
+    event.listen(engine, "before_cursor_execute", 
+                 lambda *args: statements.append(args[2]))
+    assert prepare_schema(engine) == CURRENT_SCHEMA_VERSION
+    assert len(statements) == 2
+    print("Pass")
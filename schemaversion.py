@@ -0,0 +1,50 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+from sqlalchemy import Column, String
+from sqlalchemy.types import Integer, DateTime
+from sqlabase import Base
+from dbfieldsizes import DESCRIPTION_STRING_LENGTH
+
+
+class SchemaVersion(Base):
+    '''SQLAlchemy class used to map to the schema_version table in the 
+    database.
+    
+    Each record is a schema migration that has been applied to the database.
+    Refer to :mod:`schemamigrations`.
+    '''
+    __tablename__ = "schema_version"
+    
+    # Columns
+    id = Column(Integer, primary_key=True, autoincrement=True,
+                nullable=False)
+    
+    version = Column(Integer, nullable=False, unique=True)
+    
+    description = Column(String(DESCRIPTION_STRING_LENGTH), nullable=False)
+    
+    applied_date_time = Column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return ("<SchemaVersion(id='%s',"
+                "version='%s',"
+                "description='%s')>") % (str(self.id), 
+                                         str(self.version), 
+                                         self.description)
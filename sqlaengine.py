@@ -19,44 +19,30 @@ Contact: paulosvnleal@gmail.com
 
 from sqlalchemy import create_engine
 from appconfig import app_config, DatabaseSection
-from dbaccess import create_mysql_database_if_required
-
-
-def _get_engine_string():
-    engine_string = ""
-    if app_config.database.type == DatabaseSection.TYPE_SQLITE:
-        engine_string = r"{}:///{}".format(app_config.database.type, 
-                                           app_config.database.filename)
-    elif app_config.database.type == DatabaseSection.TYPE_MYSQL:
-        engine_string = "{}+{}://{}:{}@{}/{}".format(
-                                           app_config.database.type,
-                                           app_config.database.driver,
-                                           app_config.database.username,
-                                           app_config.database.password,
-                                           app_config.database.host,
-                                           app_config.database.name)
-    else:
-        pass
-    return engine_string
+from poolmetrics import PoolMetrics
+from sqlitepragmas import install_sqlite_pragmas
 
 
+# The connection pool metrics, which are only collected for MySQL.
+pool_metrics = None
 if app_config.database.type == DatabaseSection.TYPE_SQLITE:
-    engine = create_engine(_get_engine_string(), 
+    engine = create_engine(app_config.database.get_engine_string(), 
                            echo=False)
     # Set echo=True in the line above to enable SQLAlchemy logging.
+    # Apply the tuning options in the config file to every connection.
+    install_sqlite_pragmas(engine, app_config.database.get_sqlite_pragmas())
 elif app_config.database.type == DatabaseSection.TYPE_MYSQL:
-    # Including the creation of the MySQL database here, opportunistically!
-    create_mysql_database_if_required(app_config.database.username, 
-                                      app_config.database.password, 
-                                      app_config.database.host, 
-                                      app_config.database.name)
     # The isolation_level setting is set to READ COMMITTED to ensure that 
     # committed changes are read by transactions without having to restart 
-    # the transaction.
-    engine = create_engine(_get_engine_string(),
+    # the transaction. The pool options come from the config file.
+    engine = create_engine(app_config.database.get_engine_string(),
                            isolation_level="READ COMMITTED",
-                           echo=False)
+                           echo=False,
+                           **app_config.database.get_mysql_pool_options())
     # Set echo=True in the line above to enable SQLAlchemy logging.
+    # Count the pool activity, so that the pool options can be tuned from the
+    # debug log.
+    pool_metrics = PoolMetrics(engine)
 else:
     # No other database types catered for.
     pass
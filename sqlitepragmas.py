@@ -0,0 +1,183 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import re
+from sqlalchemy import event
+
+
+# Pragma names and values are interpolated into the PRAGMA statements, since 
+# SQLite does not accept bound parameters in them. Only plain words and 
+# integers are allowed.
+_PRAGMA_TOKEN = re.compile(r"^-?[A-Za-z0-9_]+$")
+
+
+def get_pragma_statements(pragmas):
+    '''Get the statements that apply SQLite pragmas.
+    
+    Args:
+    :param pragmas: The pragma names and values, in the order in which they 
+        must be applied, e.g., from 
+        :meth:`appconfig.DatabaseSection.get_sqlite_pragmas`.
+    :type pragmas: List of (String, String) tuples
+    
+    Returns:
+    :return: The PRAGMA statements.
+    :rtype: List of strings
+    
+    Raises:
+    :raises: ValueError if a pragma name or value is not a plain word or 
+        integer.
+    '''
+    statements = []
+    for name, value in pragmas:
+        for token in (name, str(value)):
+            if not _PRAGMA_TOKEN.match(token):
+                raise ValueError(("Invalid SQLite pragma: "
+                                  "{} = {}.").format(name, value))
+        statements.append("PRAGMA {} = {}".format(name, value))
+    return statements
+
+def install_sqlite_pragmas(engine, pragmas):
+    '''Apply SQLite pragmas to every connection that an engine opens.
+    
+    The pragmas are applied by a connect event listener, so that they also 
+    apply to connections opened after a pooled connection is discarded. The 
+    journal mode is stored in the database file, but the other pragmas only 
+    last for the connection.
+    
+    Args:
+    :param engine: A SQLite engine.
+    :type engine: sqlalchemy.engine.Engine
+    :param pragmas: The pragma names and values, in the order in which they 
+        must be applied.
+    :type pragmas: List of (String, String) tuples
+    
+    Raises:
+    :raises: ValueError if a pragma name or value is not a plain word or 
+        integer.
+    '''
+    statements = get_pragma_statements(pragmas)
+    
+    @event.listens_for(engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+if __name__ == '__main__':
+    # Compare the commit latency and the concurrent read throughput of a 
+    # SQLite database file with different pragma profiles. The last profile 
+    # matches the defaults of the tuning options in settings.cfg.
+    import os
+    import shutil
+    import tempfile
+    import threading
+    import time
+    from sqlalchemy import create_engine
+    
+    profiles = [
+        ("SQLite defaults", []),
+        ("WAL, synchronous full", [("busy_timeout", "5000"),
+                                   ("journal_mode", "wal"),
+                                   ("synchronous", "full")]),
+        ("settings.cfg defaults", [("busy_timeout", "5000"),
+                                   ("journal_mode", "wal"),
+                                   ("synchronous", "normal"),
+                                   ("cache_size", "-16000"),
+                                   ("mmap_size", "268435456"),
+                                   ("temp_store", "memory")])
+        ]
+    num_commits = 500
+    num_readers = 4
+    read_duration = 2.0
+    
+    def measure_commits(engine):
+        latencies = []
+        with engine.connect() as connection:
+            for i in range(num_commits):
+                start = time.perf_counter()
+                with connection.begin():
+                    connection.execute("INSERT INTO line_item (description) "
+                                       "VALUES ('Item {}')".format(i))
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        return (sum(latencies) / len(latencies), 
+                latencies[int(len(latencies) * 0.95)])
+    
+    def measure_concurrent_reads(engine):
+        stop = threading.Event()
+        read_counts = [0] * num_readers
+        def reader(reader_index):
+            with engine.connect() as connection:
+                while not stop.is_set():
+                    connection.execute("SELECT COUNT(*), "
+                                       "MAX(description) "
+                                       "FROM line_item").fetchall()
+                    read_counts[reader_index] += 1
+        def writer():
+            with engine.connect() as connection:
+                i = 0
+                while not stop.is_set():
+                    with connection.begin():
+                        connection.execute("INSERT INTO line_item "
+                                           "(description) VALUES "
+                                           "('Concurrent {}')".format(i))
+                    i += 1
+        threads = [threading.Thread(target=reader, args=(i,)) 
+                   for i in range(num_readers)]
+        threads.append(threading.Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        time.sleep(read_duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return sum(read_counts) / read_duration
+    
+    print("Testing that invalid pragma values are rejected...")
+    try:
+        get_pragma_statements([("journal_mode", "wal; DROP TABLE x")])
+        assert False
+    except ValueError:
+        pass
+    print("Pass")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        for profile_index, (profile_name, pragmas) in enumerate(profiles):
+            filename = os.path.join(temp_dir, 
+                                    "benchmark{}.db".format(profile_index))
+            engine = create_engine("sqlite:///{}".format(filename))
+            install_sqlite_pragmas(engine, pragmas)
+            engine.execute("CREATE TABLE line_item (id INTEGER PRIMARY KEY, "
+                           "description VARCHAR(100))")
+            mean_latency, p95_latency = measure_commits(engine)
+            reads_per_second = measure_concurrent_reads(engine)
+            engine.dispose()
+            print(("{}: mean commit {:.3f} ms, 95th percentile commit "
+                   "{:.3f} ms, {:,.0f} reads/s with {} readers and a "
+                   "writer").format(profile_name, 
+                                    mean_latency * 1000, 
+                                    p95_latency * 1000,
+                                    reads_per_second, 
+                                    num_readers))
+    finally:
+        shutil.rmtree(temp_dir)
@@ -0,0 +1,116 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import logging
+import time
+from contextlib import contextmanager
+from sqlalchemy import select, literal
+from sqlalchemy.exc import DBAPIError
+
+
+class StartupTimer(object):
+    '''Times the phases of the application start-up and logs them at debug 
+    level.
+    '''
+    
+    def __init__(self):
+        '''Initialise the StartupTimer object. The start-up is timed from 
+        here.
+        '''
+        self._start_time = time.perf_counter()
+        self.phases = []
+        
+    @contextmanager
+    def phase(self, name):
+        '''Time a phase of the start-up.
+        
+        Args:
+        :param name: The name of the phase, for the log.
+        :type name: String
+        '''
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            self.phases.append((name, duration))
+            logging.debug("Start-up phase '{}' took {:.1f} ms".format(
+                                                            name, 
+                                                            duration * 1000))
+            
+    def log_summary(self):
+        '''Log the total start-up time, and the time of each phase.
+        '''
+        total = time.perf_counter() - self._start_time
+        phases = ", ".join("{} {:.1f} ms".format(name, duration * 1000)
+                           for name, duration in self.phases)
+        logging.debug("Start-up took {:.1f} ms: {}".format(total * 1000, 
+                                                           phases))
+
+def probe_database(engine):
+    '''Check that the database can be reached, using a connection from the 
+    engine's pool.
+    
+    The probe only reads, so it does not start a write transaction, and the 
+    connection is returned to the pool for the application to use.
+    
+    Args:
+    :param engine: The SQLAlchemy engine in use.
+    :type engine: sqlalchemy.engine.Engine
+    
+    Returns:
+    :return: True if the database answered the probe. False otherwise.
+    :rtype: Boolean
+    '''
+    try:
+        with engine.connect() as connection:
+            return connection.execute(select([literal(1)])).scalar() == 1
+    except DBAPIError as e:
+        logging.debug("Database probe failed: {}".format(e))
+        return False
+
+if __name__ == '__main__':
+    # Time the database phases of the start-up against a SQLite database file,
+    # for the first start-up, which creates the schema, and for a normal one.
+    import os
+    import shutil
+    import tempfile
+    from sqlalchemy import create_engine
+    from schemamigrations import prepare_schema
+    logging.basicConfig(level=logging.DEBUG)
+    temp_dir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(temp_dir, "startup.db")
+        for start_up in ("First start-up", "Normal start-up"):
+            print(start_up)
+            timer = StartupTimer()
+            engine = create_engine("sqlite:///{}".format(filename))
+            with timer.phase("database probe"):
+                assert probe_database(engine)
+            with timer.phase("schema"):
+                prepare_schema(engine)
+            timer.log_summary()
+            engine.dispose()
+        print("Testing that the probe fails for an unreachable database...")
+        engine = create_engine("sqlite:///{}".format(
+                            os.path.join(temp_dir, "missing", "startup.db")))
+        assert not probe_database(engine)
+        print("Pass")
+    finally:
+        shutil.rmtree(temp_dir)
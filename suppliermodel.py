@@ -19,13 +19,15 @@ Contact: paulosvnleal@gmail.com
 
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
+from incrementalmodel import IncrementalTableModel
 from purchaseorder import PurchaseOrder
 from supplier import Supplier
 from datavalidation import (TextFieldValidator, warn_about_changing_used_data,
                             show_error_rows_with_default_values)
+from usageindex import UsageIndex
 
 
-class SupplierModel(QAbstractTableModel):
+class SupplierModel(IncrementalTableModel):
     '''Data model for the supplier table.
     '''
 
@@ -48,8 +50,8 @@ class SupplierModel(QAbstractTableModel):
     def __init__(self, config_file, session, parent=None):
         '''Initialise the SupplierModel object.
         
-        Loads a local suppliers list (self.suppliers) with the result of a 
-        query for all suppliers in the database.
+        The suppliers are loaded from the database a page at a time. Refer to 
+        :class:`incrementalmodel.IncrementalTableModel`.
         
         Args:
         :param app_config: The application configuration settings file object.
@@ -60,16 +62,18 @@ class SupplierModel(QAbstractTableModel):
         :param parent: The model's parent.
         :type parent: QObject
         '''
-        super().__init__(parent=parent)
+        super().__init__(session, Supplier, parent=parent)
         self.app_config = config_file
-        self.session = session
-        with self.session.no_autoflush:
-            self.suppliers = self.session.query(Supplier).all()
-        
-    def rowCount(self, index=QModelIndex()):
-        '''Refer to QAbstractItemModel.rowCount.
+        # The suppliers referenced in purchase orders, loaded when first 
+        # required.
+        self._usage_index = UsageIndex(self.session, 
+                                       PurchaseOrder.supplier_id)
+        
+    @property
+    def suppliers(self):
+        '''The suppliers loaded so far.
         '''
-        return len(self.suppliers) 
+        return self._rows
 
     def columnCount(self, index=QModelIndex()):
         '''Refer to QAbstractItemModel.columnCount.
@@ -263,11 +267,7 @@ class SupplierModel(QAbstractTableModel):
             otherwise.
         :rtype: Boolean
         '''
-        with self.session.no_autoflush:
-            if self.session.query(PurchaseOrder).\
-                filter(PurchaseOrder.supplier_id == supplier_id).count() > 0:
-                return True
-            return False
+        return self._usage_index.is_used(supplier_id)
     
     def _is_company_name_valid(self, company_name, check_unique=True):
         '''Determines if a supplier company name is valid.
@@ -293,10 +293,14 @@ class SupplierModel(QAbstractTableModel):
         :return: True if the company name is valid. False otherwise.
         :rtype: Boolean
         '''
+        if check_unique:
+            company_names = self._get_column_values(Supplier.company_name)
+        else:
+            company_names = [s.company_name for s in self.suppliers]
         validator = TextFieldValidator(
                                     "supplier company name",
                                     company_name,
-                                    [s.company_name for s in self.suppliers],
+                                    company_names,
                                     self._COMPANY_NAME_DEFAULT,
                                     check_unique=check_unique)
         return validator.field_is_valid()
@@ -454,7 +458,7 @@ class SupplierModel(QAbstractTableModel):
                                 address=self._COMPANY_ADDRESS_DEFAULT,
                                 archived=False)
         self.session.add(new_supplier)
-        self.suppliers.append(new_supplier)
+        self._append_new_row(new_supplier)
         self.endInsertRows()
         return True
         
@@ -466,10 +470,7 @@ class SupplierModel(QAbstractTableModel):
             database.
         :rtype: List of strings
         '''
-        supplier_company_name_list = []
-        for supplier in self.suppliers:
-            supplier_company_name_list.append(supplier.company_name)
-        return supplier_company_name_list
+        return self._get_column_values(Supplier.company_name)
     
     def get_supplier_id_from_company_name(self, company_name):
         '''Get the supplier primary key given the company name.
@@ -579,6 +580,8 @@ class SupplierModel(QAbstractTableModel):
         :rtype: Boolean
         '''
         allowed = True
+        # New suppliers are added after the last supplier in the database.
+        self.fetch_all()
         if self.rowCount() == 0:
             return allowed
         row = self.rowCount() - 1
@@ -0,0 +1,157 @@
+'''
+POdB: A purchase order management system for small businesses 
+Copyright (C) 2016  Paulo S. V. N. Leal
+
+This program is free software: you can redistribute it and/or modify it under 
+the terms of the GNU General Public License as published by the Free Software 
+Foundation, either version 3 of the License, or (at your option) any later 
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT 
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS 
+FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with 
+this program. If not, see <http://www.gnu.org/licenses/>.
+
+Contact: paulosvnleal@gmail.com
+'''
+
+import weakref
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+# The usage indexes in existence. They are held weakly so that an index is 
+# discarded together with the model that created it.
+_usage_indexes = weakref.WeakSet()
+
+
+class UsageIndex(object):
+    '''The set of primary keys of the records that are referenced by a foreign
+    key column, e.g., the suppliers that are referenced by purchase orders.
+    
+    The set is loaded with a single query the first time it is used. After 
+    that, it is updated from the objects written each time the session 
+    flushes, so that checking whether a record is used does not require a 
+    query. 
+    
+    Records are not removed from the set when the records referencing them are 
+    deleted or changed. A record may therefore still be considered used after 
+    its last reference is gone, which only results in an unnecessary warning.
+    '''
+    
+    def __init__(self, session, foreign_key_column):
+        '''Initialise the UsageIndex object.
+        
+        Args:
+        :param session: The SQLAlchemny session in use. 
+        :type session: Session object (the class created by the call to  
+            :func:`sessionmaker` in :mod:`sqlasession`).
+        :param foreign_key_column: The referencing column, e.g., 
+            PurchaseOrder.supplier_id.
+        :type foreign_key_column: 
+            sqlalchemy.orm.attributes.InstrumentedAttribute
+        '''
+        self.session = session
+        self._column = foreign_key_column
+        self._mapped_class = foreign_key_column.class_
+        self._used_ids = None
+        _usage_indexes.add(self)
+        
+    def _load(self):
+        '''Load the set of referenced primary keys from the database.
+        '''
+        with self.session.no_autoflush:
+            query = self.session.query(self._column).distinct()
+            self._used_ids = set(value for (value,) in query 
+                                 if value is not None)
+    
+    def is_used(self, record_id):
+        '''Determine if a record is referenced.
+        
+        Args:
+        :param record_id: The primary key of the record.
+        :type record_id: Integer
+        
+        Returns:
+        :return: True if the record is referenced. False otherwise.
+        :rtype: Boolean
+        '''
+        if self._used_ids is None:
+            self._load()
+        return record_id in self._used_ids
+    
+    def _update_from_flushed_objects(self, objects):
+        '''Add the references held by objects that have just been flushed.
+        
+        Args:
+        :param objects: The new and changed objects in the flush.
+        :type objects: Iterable of mapped objects
+        '''
+        if self._used_ids is None:
+            return
+        for obj in objects:
+            if isinstance(obj, self._mapped_class):
+                value = getattr(obj, self._column.key)
+                if value is not None:
+                    self._used_ids.add(value)
+
+
+@event.listens_for(Session, "after_flush")
+def _update_usage_indexes(session, flush_context):
+    '''Update the usage indexes of a session after it is flushed.
+    
+    The foreign key values of the flushed objects have been set by the time 
+    this is called, and the session's new and dirty collections still hold 
+    the flushed objects.
+    '''
+    indexes = [index for index in _usage_indexes if index.session is session]
+    if indexes:
+        flushed_objects = list(session.new) + list(session.dirty)
+        for index in indexes:
+            index._update_from_flushed_objects(flushed_objects)
+
+if __name__ == '__main__':
+    # Check that the index is loaded once and then follows the session's 
+    # flushes, using an in-memory SQLite database.
+    import datetime
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlabase import Base
+    from product import Product
+    from project import Project
+    from purchaseorder import PurchaseOrder
+    from purchaseorderproduct import PurchaseOrderProduct
+    from supplier import Supplier
+    from userconfig import UserConfig
+    
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    suppliers = [Supplier(company_name="Supplier {}".format(i), 
+                          address="Address", 
+                          archived=False) for i in range(2)]
+    session.add_all(suppliers)
+    session.flush()
+    index = UsageIndex(session, PurchaseOrder.supplier_id)
+    print("Testing that unused suppliers are not reported as used...")
+    assert not index.is_used(suppliers[0].id)
+    assert not index.is_used(suppliers[1].id)
+    print("Pass")
+    print("Testing that a flushed purchase order updates the index...")
+    session.add(PurchaseOrder(order_number="PO00001",
+                              order_date=datetime.date.today(),
+                              delivery_address="Address",
+                              delivery_date=datetime.date.today(),
+                              payment_terms="Pay in 30 days",
+                              order_status="Draft",
+                              total_excluding_tax=0,
+                              total_tax=0,
+                              total_including_tax=0,
+                              supplier=suppliers[1],
+                              user_config_id=1))
+    session.flush()
+    assert not index.is_used(suppliers[0].id)
+    assert index.is_used(suppliers[1].id)
+    print("Pass")
@@ -193,13 +193,74 @@ class LocaleSettings(object):
         return str(self.__dict__)
         
 
+class _UserConfigSnapshot(object):
+    '''The settings of a user config record, independent of any session.
+    '''
+    
+    def __init__(self, db_record):
+        '''Initialises the _UserConfigSnapshot object from a database record.
+        
+        Args:
+        :param db_record: The user config database record.
+        :type db_record: userconfig.UserConfig
+        '''
+        self.record_id = db_record.id
+        self.config_date_time = db_record.created_date_time
+        self.company = CompanySettings()
+        self.company.load_from_db_record(db_record)
+        self.purchaseorder = PurchaseOrderSettings()
+        self.purchaseorder.load_from_db_record(db_record)
+        self.locale = LocaleSettings()
+        self.locale.load_from_db_record(db_record)
+
+
+# The snapshot of the latest user config record, shared by all the readers in 
+# the process. It is loaded by the first reader, and invalidated when 
+# UserConfigEditor.save adds a new record. Changes saved by other processes are 
+# not seen until then.
+_latest_snapshot = None
+_latest_snapshot_loaded = False
+
+def _get_latest_snapshot(session):
+    '''Get the snapshot of the latest user config record, loading it if 
+    required.
+    
+    Args:
+    :param session: The SQLAlchemy session in use. 
+    :type session: Session object (the class created by the call to  
+        :func:`sessionmaker` in :mod:`sqlasession`).
+    
+    Returns:
+    :return: The snapshot, or None if there are no user config records.
+    :rtype: _UserConfigSnapshot
+    '''
+    global _latest_snapshot, _latest_snapshot_loaded
+    if not _latest_snapshot_loaded:
+        db_record = session.query(UserConfig).\
+                        order_by(UserConfig.id.desc()).first()
+        if db_record:
+            _latest_snapshot = _UserConfigSnapshot(db_record)
+        else:
+            _latest_snapshot = None
+        _latest_snapshot_loaded = True
+    return _latest_snapshot
+
+def invalidate_user_config_cache():
+    '''Discard the cached snapshot of the latest user config record, so that 
+    the next reader loads it again.
+    '''
+    global _latest_snapshot, _latest_snapshot_loaded
+    _latest_snapshot = None
+    _latest_snapshot_loaded = False
+
+
 class UserConfigReader(object):
     '''A class that provides read-only access to the latest user settings 
     loaded from the database.
     
-    The class should not be instantiated for long, to avoid recent changes from 
-    being missed. Instantiate it just before it is used, i.e., just before the 
-    user config is read.  
+    The latest settings are cached for the whole process, so creating a reader
+    does not normally access the database. The cache is invalidated when 
+    :meth:`UserConfigEditor.save` saves new settings.
     '''
     
     def __init__(self, session):
@@ -207,9 +268,9 @@ class UserConfigReader(object):
         
         The config date and time is initialised to None, and empty instances of
         CompanySettings, PurchaseOrderSettings and LocaleSettings are created.
-        Then the latest UserConfig record is queried from the database, and is
-        used to initialise the config date and time, and the CompanySettings, 
-        PurchaseOrderSettings and LocaleSettings objects.
+        Then they are initialised with copies of the settings from the latest 
+        UserConfig record, which is only queried from the database if it is 
+        not cached yet.
         
         If all of the above works, then the config_valid attribute is set to 
         True. Otherwise it is set to False.
@@ -219,21 +280,31 @@ class UserConfigReader(object):
         :type session: Session object (the class created by the call to  
             :func:`sessionmaker` in :mod:`sqlasession`).
         '''
+        self.session = session
         self.config_date_time = None
         self.company = CompanySettings()
         self.purchaseorder = PurchaseOrderSettings()
         self.locale = LocaleSettings()
         self.config_valid = False
-        self.db_record = None
-        user_configs = session.query(UserConfig).all()
-        if user_configs:
-            self.db_record = user_configs[-1]
-            self.config_date_time = self.db_record.created_date_time
-            self.company.load_from_db_record(self.db_record)
-            self.purchaseorder.load_from_db_record(self.db_record)
-            self.locale.load_from_db_record(self.db_record)
+        self.record_id = None
+        snapshot = _get_latest_snapshot(session)
+        if snapshot:
+            self.record_id = snapshot.record_id
+            self.config_date_time = snapshot.config_date_time
+            self.company = copy(snapshot.company)
+            self.purchaseorder = copy(snapshot.purchaseorder)
+            self.locale = copy(snapshot.locale)
             self.config_valid = True
             
+    @property
+    def db_record(self):
+        '''The latest UserConfig record, loaded into the reader's session, or 
+        None if there is no user config record.
+        '''
+        if self.record_id is None:
+            return None
+        return self.session.query(UserConfig).get(self.record_id)
+            
     
 class UserConfigEditor(UserConfigReader):
     '''A class that provides read access to the latest user settings loaded 
@@ -353,6 +424,7 @@ class UserConfigEditor(UserConfigReader):
             # Commit
             session.add(user_config)
             session.commit()
+            invalidate_user_config_cache()
             self._dirty = False
             
             